@@ -78,6 +78,8 @@ class EconomicSettings:
         "slot_min_bet": 100,                # 最小ベット額
         "slot_max_bet": 10000,              # 最大ベット額
         "slot_house_edge": 0.05,            # 控除率 (5%)
+        "slot_max_spins": 10,               # 連続スピンの最大回数
+        "slot_symbols": ["💎", "⭐", "🍒", "🍋", "🍊", "🍇"],  # リールの絵柄（等確率）
         
         # 配当設定
         "slot_payouts": {
@@ -88,6 +90,7 @@ class EconomicSettings:
             "🍇🍇🍇": 3.0,
             "🔔🔔🔔": 3.0,
             "🍀🍀🍀": 3.0,
+            "three_match": 3.0,             # 上記以外の3つ揃い
             "two_match": 1.5,               # 2つ揃い
         }
     }
@@ -4,11 +4,16 @@ import discord
 from discord.ext import commands
 import os
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import firestore
 import datetime
-import random
 import asyncio
+from shared.kraft_db import get_db, run_db
+from shared.kraft_user_cache import user_cache
+from shared.kraft_user_record import UserRecord
+from shared.kraft_rate_limit import rate_limiter, format_retry_after
+from shared.kraft_slot import spin
+from config.economic_settings import EconomicSettings
+from shared.kraft_ledger import KraftLedger, SYSTEM_CASINO, SYSTEM_MINT
 
 print("🏦 KRAFT中央銀行Bot - 修正版")
 print("=" * 50)
@@ -19,10 +24,7 @@ TOKEN = os.getenv("DISCORD_TOKEN_CENTRAL_BANK_BOT")
 ADMIN_USER_IDS = os.getenv("ADMIN_USER_IDS", "").split(",")
 
 # Firebase初期化
-if not firebase_admin._apps:
-    cred = credentials.Certificate("config/firebase_credentials.json")
-    firebase_admin.initialize_app(cred)
-db = firestore.client()
+db = get_db()
 
 print(f"Token: {'OK' if TOKEN else 'NG'}")
 print(f"Admin IDs: {ADMIN_USER_IDS}")
@@ -30,6 +32,10 @@ print(f"Admin IDs: {ADMIN_USER_IDS}")
 # グローバル変数
 start_time = datetime.datetime.now()
 
+# 送金設定
+TRANSFER_MAX_ATTEMPTS = 5          # 送金トランザクションの最大試行回数
+TRANSFER_REQUEST_TTL_HOURS = 24    # 送金リクエスト記録（二重実行防止）の保持時間
+
 # Intents設定
 intents = discord.Intents.default()
 intents.guilds = True
@@ -48,23 +54,16 @@ async def balance_cmd(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
     
     user_id = str(interaction.user.id)
-    user_ref = db.collection("users").document(user_id)
-    user_doc = user_ref.get()
+    record = await user_cache.fetch(user_id)
     
-    if user_doc.exists:
-        balance = user_doc.to_dict().get("balance", 0)
-    else:
-        # 新規ユーザー初期化
-        user_data = {
-            "user_id": user_id,
-            "balance": 1000,
-            "level": 1,
-            "xp": 0,
-            "created_at": firestore.SERVER_TIMESTAMP
-        }
-        user_ref.set(user_data)
-        balance = 1000
-        print(f"新規ユーザー作成: {user_id}")
+    if record is None:
+        # 新規ユーザー初期化（キャッシュ後に作成されていた場合は上書きせずに読み直す）
+        record = UserRecord.new(user_id)
+        if await user_cache.create(record):
+            print(f"新規ユーザー作成: {user_id}")
+        else:
+            record = await user_cache.fetch(user_id) or record
+    balance = record.balance
     
     embed = discord.Embed(
         title="💰 残高確認",
@@ -76,9 +75,73 @@ async def balance_cmd(interaction: discord.Interaction):
     await interaction.followup.send(embed=embed, ephemeral=True)
     print(f"残高確認成功: {balance} KR")
 
+@firestore.transactional
+def apply_transfer(transaction, request_ref, sender_ref, recipient_ref, amount):
+    """送金処理（残高確認・送金・取引ログ・リクエスト記録を1トランザクションで確定）"""
+    # 3ドキュメントを1回の読み取りで取得
+    docs = {doc.reference.path: doc for doc in transaction.get_all([request_ref, sender_ref, recipient_ref])}
+    request_doc = docs[request_ref.path]
+    sender_doc = docs[sender_ref.path]
+    recipient_doc = docs[recipient_ref.path]
+    
+    # 同一インタラクションの再実行は記録済みの結果を返す
+    if request_doc.exists:
+        result = request_doc.to_dict().get("result", {})
+        result["duplicate"] = True
+        return result
+    
+    if not sender_doc.exists:
+        return {"success": False, "balance": None}
+    
+    sender_balance = sender_doc.to_dict().get("balance", 0)
+    if sender_balance < amount:
+        return {"success": False, "balance": sender_balance}
+    
+    # 送金者の残高を減額
+    transaction.update(sender_ref, {"balance": sender_balance - amount})
+    
+    # 受取人の残高を増額
+    if recipient_doc.exists:
+        recipient_balance = recipient_doc.to_dict().get("balance", 0)
+        transaction.update(recipient_ref, {"balance": recipient_balance + amount})
+    else:
+        # 新規ユーザーの場合（共通の既定値で作成）
+        recipient = UserRecord.new(recipient_ref.id)
+        recipient.balance += amount
+        transaction.set(recipient_ref, recipient.changes())
+    
+    # 台帳仕訳
+    KraftLedger.post_transfer(transaction, sender_ref.id, recipient_ref.id, amount, "transfer", txid=request_ref.id, db=db)
+    
+    # 取引ログ
+    transaction.set(db.collection("transactions").document(), {
+        "type": "transfer",
+        "from_user": sender_ref.id,
+        "to_user": recipient_ref.id,
+        "amount": amount,
+        "request_id": request_ref.id,
+        "timestamp": firestore.SERVER_TIMESTAMP
+    })
+    
+    # リクエスト記録（expires_at にFirestore TTLポリシーを設定して自動削除）
+    result = {"success": True, "balance": sender_balance - amount}
+    transaction.set(request_ref, {
+        "result": result,
+        "created_at": firestore.SERVER_TIMESTAMP,
+        "expires_at": datetime.datetime.utcnow() + datetime.timedelta(hours=TRANSFER_REQUEST_TTL_HOURS)
+    })
+    
+    return dict(result, duplicate=False)
+
 @bot.tree.command(name="送金", description="他のユーザーにKRを送金します")
 async def transfer_cmd(interaction: discord.Interaction, recipient: discord.Member, 金額: int):
     print(f"[送金] {interaction.user.name} → {recipient.name}: {金額}KR")
+    # 頻度制限（Firestoreへアクセスする前にメモリ内で判定）
+    allowed, retry_after = rate_limiter.acquire(str(interaction.user.id), "transfer")
+    if not allowed:
+        await interaction.response.send_message(f"⏳ 取引が集中しています。{format_retry_after(retry_after)}後にもう一度お試しください。", ephemeral=True)
+        return
+    
     await interaction.response.defer()
     
     if recipient.id == interaction.user.id:
@@ -96,54 +159,29 @@ async def transfer_cmd(interaction: discord.Interaction, recipient: discord.Memb
     sender_id = str(interaction.user.id)
     recipient_id = str(recipient.id)
     
-    # 送金者の残高確認
     sender_ref = db.collection("users").document(sender_id)
-    sender_doc = sender_ref.get()
+    recipient_ref = db.collection("users").document(recipient_id)
     
-    if not sender_doc.exists:
-        await interaction.followup.send("残高が不足しています。")
+    # インタラクションIDを冪等キーとして送金を1トランザクションで実行
+    request_ref = db.collection("transfer_requests").document(f"transfer_{interaction.id}")
+    try:
+        result = await run_db(apply_transfer, db.transaction(max_attempts=TRANSFER_MAX_ATTEMPTS), request_ref, sender_ref, recipient_ref, 金額)
+        user_cache.invalidate(sender_id)
+        user_cache.invalidate(recipient_id)
+    except ValueError as e:
+        print(f"送金トランザクション失敗: {e}")
+        await interaction.followup.send("送金が混み合っています。しばらくしてから再度お試しください。")
         return
     
-    sender_balance = sender_doc.to_dict().get("balance", 0)
-    if sender_balance < 金額:
-        await interaction.followup.send(f"残高が不足しています。現在の残高: {sender_balance:,} KR")
+    if not result["success"]:
+        if result["balance"] is None:
+            await interaction.followup.send("残高が不足しています。")
+        else:
+            await interaction.followup.send(f"残高が不足しています。現在の残高: {result['balance']:,} KR")
         return
     
-    # 送金処理（トランザクション）
-    batch = db.batch()
-    
-    # 送金者の残高を減額
-    batch.update(sender_ref, {"balance": sender_balance - 金額})
-    
-    # 受取人の残高を増額
-    recipient_ref = db.collection("users").document(recipient_id)
-    recipient_doc = recipient_ref.get()
-    
-    if recipient_doc.exists:
-        recipient_balance = recipient_doc.to_dict().get("balance", 0)
-        batch.update(recipient_ref, {"balance": recipient_balance + 金額})
-    else:
-        # 新規ユーザーの場合
-        batch.set(recipient_ref, {
-            "user_id": recipient_id,
-            "balance": 1000 + 金額,
-            "level": 1,
-            "xp": 0,
-            "created_at": firestore.SERVER_TIMESTAMP
-        })
-    
-    # 取引ログ
-    transaction_data = {
-        "type": "transfer",
-        "from_user": sender_id,
-        "to_user": recipient_id,
-        "amount": 金額,
-        "timestamp": firestore.SERVER_TIMESTAMP
-    }
-    batch.set(db.collection("transactions").document(), transaction_data)
-    
-    # バッチ実行
-    batch.commit()
+    if result["duplicate"]:
+        print(f"送金リクエスト重複: {request_ref.id}")
     
     # 送金者への確認メッセージ
     embed = discord.Embed(
@@ -151,7 +189,7 @@ async def transfer_cmd(interaction: discord.Interaction, recipient: discord.Memb
         description=f"{recipient.mention} に **{金額:,} KR** を送金しました",
         color=discord.Color.green()
     )
-    embed.add_field(name="送金後残高", value=f"{sender_balance - 金額:,} KR")
+    embed.add_field(name="送金後残高", value=f"{result['balance']:,} KR")
     embed.set_footer(text="KRAFT中央銀行")
     
     await interaction.followup.send(embed=embed)
@@ -168,58 +206,81 @@ async def transfer_cmd(interaction: discord.Interaction, recipient: discord.Memb
     
     print(f"送金成功: {金額} KR")
 
-@bot.tree.command(name="スロット", description="スロットマシンで遊びます（100-10,000 KR）")
-async def slot_cmd(interaction: discord.Interaction, 金額: int):
-    print(f"[スロット] {interaction.user.name}: {金額}KR")
+@firestore.transactional
+def apply_slot_result(transaction, user_ref, bet, win_amount):
+    """スロット精算（ベット額以上の残高がある場合のみ、差額をアトミックに加減算して台帳に記録）"""
+    user_doc = user_ref.get(transaction=transaction)
+    if not user_doc.exists:
+        return {"success": False, "balance": None}
+    
+    balance = user_doc.to_dict().get("balance", 0)
+    if balance < bet:
+        return {"success": False, "balance": balance}
+    
+    transaction.update(user_ref, {"balance": firestore.Increment(win_amount - bet)})
+    KraftLedger.post(transaction, user_ref.id, win_amount - bet, SYSTEM_CASINO, "slot", db=db)
+    return {"success": True, "balance": balance}
+
+@bot.tree.command(name="スロット", description="スロットマシンで遊びます（100-10,000 KR・回数指定で連続スピン）")
+async def slot_cmd(interaction: discord.Interaction, 金額: int, 回数: int = 1):
+    print(f"[スロット] {interaction.user.name}: {金額}KR × {回数}回")
+    # 頻度制限（Firestoreへアクセスする前にメモリ内で判定）
+    allowed, retry_after = rate_limiter.acquire(str(interaction.user.id), "slot")
+    if not allowed:
+        await interaction.response.send_message(f"⏳ 取引が集中しています。{format_retry_after(retry_after)}後にもう一度お試しください。", ephemeral=True)
+        return
+    
     await interaction.response.defer()
     
-    if 金額 < 100 or 金額 > 10000:
-        await interaction.followup.send("ベット額は100〜10,000 KRの間で指定してください。")
+    settings = EconomicSettings.GAMBLING_SETTINGS
+    if 金額 < settings["slot_min_bet"] or 金額 > settings["slot_max_bet"]:
+        await interaction.followup.send(f"ベット額は{settings['slot_min_bet']:,}〜{settings['slot_max_bet']:,} KRの間で指定してください。")
+        return
+    
+    if 回数 < 1 or 回数 > settings["slot_max_spins"]:
+        await interaction.followup.send(f"回数は1〜{settings['slot_max_spins']}回の間で指定してください。")
         return
         
     user_id = str(interaction.user.id)
     user_ref = db.collection("users").document(user_id)
-    user_doc = user_ref.get()
     
-    if not user_doc.exists:
-        await interaction.followup.send("残高が不足しています。")
-        return
-    
-    balance = user_doc.to_dict().get("balance", 0)
-    if balance < 金額:
-        await interaction.followup.send(f"残高が不足しています。現在の残高: {balance:,} KR")
+    # スロット結果（全スピンを1回で抽選し、残高確認と精算は合計額で1トランザクション）
+    spin_result = spin(金額, 回数)
+    total_bet = spin_result["total_bet"]
+    win_amount = spin_result["total_win"]
+    
+    # 残高確認・精算
+    settlement = await run_db(apply_slot_result, db.transaction(), user_ref, total_bet, win_amount)
+    user_cache.invalidate(user_id)
+    if not settlement["success"]:
+        if settlement["balance"] is None:
+            await interaction.followup.send("残高が不足しています。")
+        else:
+            await interaction.followup.send(f"残高が不足しています。現在の残高: {settlement['balance']:,} KR（必要額: {total_bet:,} KR）")
         return
-    
-    # スロット結果
-    symbols = ["💎", "⭐", "🍒", "🍋", "🍊", "🍇"]
-    result = random.choices(symbols, k=3)
-    
-    # 配当計算
-    multiplier = 0
-    if result.count("💎") == 3:
-        multiplier = 10  # 💎💎💎: 10倍
-    elif result.count("⭐") == 3:
-        multiplier = 5   # ⭐⭐⭐: 5倍
-    elif len(set(result)) == 1:
-        multiplier = 3   # その他三つ揃い: 3倍
-    elif len(set(result)) == 2:
-        multiplier = 1.5 # 二つ揃い: 1.5倍
-    
-    # 控除率5%適用
-    house_edge = 0.95
-    win_amount = int(金額 * multiplier * house_edge) if multiplier > 0 else 0
-    
-    # 残高更新
-    new_balance = balance - 金額 + win_amount
-    user_ref.update({"balance": new_balance})
+    new_balance = settlement["balance"] + spin_result["net"]
     
     # 結果表示
+    if 回数 == 1:
+        description = f"結果: {' '.join(spin_result['results'][0]['reels'])}"
+    else:
+        description = "\n".join(
+            f"{' '.join(result['reels'])}  {'+' + format(result['win'], ',') + ' KR' if result['win'] else '-'}"
+            for result in spin_result["results"]
+        )
     embed = discord.Embed(
         title="🎰 スロットマシン",
-        description=f"結果: {' '.join(result)}",
+        description=description,
         color=discord.Color.gold() if win_amount > 0 else discord.Color.red()
     )
     
+    if 回数 > 1:
+        embed.add_field(
+            name="合計",
+            value=f"ベット: **{total_bet:,} KR**（{金額:,} KR × {回数}回）\n収支: **{spin_result['net']:+,} KR**",
+            inline=False
+        )
+    
     if win_amount > 0:
         embed.add_field(
             name="結果", 
@@ -233,7 +294,7 @@ async def slot_cmd(interaction: discord.Interaction, 金額: int):
     
     embed.set_footer(text="KRAFT中央銀行")
     await interaction.followup.send(embed=embed)
-    print(f"スロット結果: {win_amount} KR獲得")
+    print(f"スロット結果: {win_amount} KR獲得（{回数}回）")
 
 @bot.tree.command(name="残高調整", description="管理者専用：ユーザーの残高を調整します")
 async def admin_adjust_cmd(interaction: discord.Interaction, user: discord.Member, 金額: int, 理由: str):
@@ -248,22 +309,22 @@ async def admin_adjust_cmd(interaction: discord.Interaction, user: discord.Membe
         
         user_id = str(user.id)
         user_ref = db.collection("users").document(user_id)
-        user_doc = user_ref.get()
+        user_doc = await run_db(user_ref.get)
         
+        batch = db.batch()
         if user_doc.exists:
             current_balance = user_doc.to_dict().get("balance", 0)
             new_balance = current_balance + 金額
-            user_ref.update({"balance": new_balance})
+            batch.update(user_ref, {"balance": firestore.Increment(金額)})
         else:
-            # 新規ユーザーの場合
-            new_balance = 1000 + 金額
-            user_ref.set({
-                "user_id": user_id,
-                "balance": new_balance,
-                "level": 1,
-                "xp": 0,
-                "created_at": firestore.SERVER_TIMESTAMP
-            })
+            # 新規ユーザーの場合（共通の既定値で作成）
+            record = UserRecord.new(user_id)
+            record.balance += 金額
+            new_balance = record.balance
+            batch.set(user_ref, record.changes())
+        KraftLedger.post(batch, user_id, 金額, SYSTEM_MINT, f"admin_adjust: {理由}", db=db)
+        await run_db(batch.commit)
+        user_cache.invalidate(user_id)
         
         embed = discord.Embed(
             title="💰 残高調整完了",
@@ -299,6 +360,9 @@ async def on_ready():
     print(f"Bot: {bot.user}")
     print(f"Guilds: {[g.name for g in bot.guilds]}")
     
+    # 他のBotによる残高更新をキャッシュへ反映（USER_CACHE_CONFIG["listener"] 有効時のみ。既定はTTLで反映）
+    user_cache.start_listener()
+    
     # コマンド同期
     print("\n🔄 コマンドを同期中...")
     try:
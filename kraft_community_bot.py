@@ -4,11 +4,16 @@ import discord
 from discord.ext import commands, tasks
 import os
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import firestore
 import datetime
 import random
 import asyncio
+from collections import OrderedDict
+from shared.kraft_db import get_db, run_db
+from shared.kraft_user_cache import user_cache
+from shared.kraft_user_record import UserRecord
+from shared.kraft_rate_limit import rate_limiter, format_retry_after
+from shared.kraft_ledger import KraftLedger, SYSTEM_COMMUNITY_FUND, SYSTEM_MINT
 
 print("👥 KRAFTコミュニティBot - 開発版")
 print("=" * 50)
@@ -19,10 +24,7 @@ TOKEN = os.getenv("DISCORD_TOKEN_COMMUNITY_BOT")
 ADMIN_USER_IDS = os.getenv("ADMIN_USER_IDS", "").split(",")
 
 # Firebase初期化（中央銀行Botと共有）
-if not firebase_admin._apps:
-    cred = credentials.Certificate("config/firebase_credentials.json")
-    firebase_admin.initialize_app(cred)
-db = firestore.client()
+db = get_db()
 
 print(f"Token: {'OK' if TOKEN else 'NG'}")
 print(f"Admin IDs: {ADMIN_USER_IDS}")
@@ -46,6 +48,37 @@ LEVEL_UP_MULTIPLIER = 1.5
 LEVELUP_CHANNEL_ID = None
 DONATION_CHANNEL_ID = None
 
+# コミュニティ基金設定（分散カウンター）
+FUND_SHARD_COUNT = 10  # 基金シャード数（同時寄付の書き込み競合を分散）
+FUND_CACHE_TTL = 60    # 基金合計表示のキャッシュ時間(秒)
+fund_total_cache = {"total": None, "fetched_at": None}
+
+# プロフィールキャッシュ設定
+PROFILE_CACHE_TTL = 120    # プロフィール表示データのキャッシュ時間(秒)
+PROFILE_CACHE_SIZE = 1000  # キャッシュする最大ユーザー数
+profile_cache = OrderedDict()
+profile_loading = {}       # 読み込み中のユーザーID -> [読み込み中の数, 読み込み中に破棄された回数]
+
+# XPランキング設定
+LEADERBOARD_SIZE = 20            # ランキングに保持する上位人数
+LEADERBOARD_FLUSH_INTERVAL = 60  # ランキング保存間隔(秒)
+leaderboard_state = {"entries": None, "dirty": False}
+leaderboard_load_lock = asyncio.Lock()  # 初回読み込み・再構築を1回に限定
+
+# メッセージ処理パイプライン設定
+MESSAGE_WORKER_COUNT = 4     # XP処理ワーカー数
+MESSAGE_QUEUE_SIZE = 2000    # 全ワーカー合計のキュー上限
+message_queues = [asyncio.Queue(maxsize=MESSAGE_QUEUE_SIZE // MESSAGE_WORKER_COUNT) for _ in range(MESSAGE_WORKER_COUNT)]
+message_workers = []
+message_pipeline_stats = {
+    "enqueued": 0,
+    "processed": 0,
+    "dropped": 0,
+    "errors": 0,
+    "max_depth": 0,
+    "total_wait": 0.0
+}
+
 # XPシステムヘルパー関数
 def calculate_xp_for_level(level):
     """指定レベルに到達するのに必要な総XP"""
@@ -64,9 +97,253 @@ def calculate_level_and_xp(total_xp):
     
     return level, current_xp
 
+# コミュニティ基金ヘルパー関数
+def get_fund_shard_ref():
+    """寄付を加算する基金シャードをランダムに選択"""
+    shard_id = str(random.randrange(FUND_SHARD_COUNT))
+    return db.collection("community").document("fund").collection("shards").document(shard_id)
+
+def get_community_fund_total(force_refresh=False):
+    """コミュニティ基金の合計額（シャード集計・キャッシュ付き）"""
+    now = datetime.datetime.utcnow()
+    fetched_at = fund_total_cache["fetched_at"]
+    if not force_refresh and fetched_at and (now - fetched_at).total_seconds() < FUND_CACHE_TTL:
+        return fund_total_cache["total"]
+    
+    # 旧形式の合計値（community/fund.total）にシャード合計を加算
+    fund_ref = db.collection("community").document("fund")
+    fund_doc = fund_ref.get()
+    total = fund_doc.to_dict().get("total", 0) if fund_doc.exists else 0
+    for shard in fund_ref.collection("shards").stream():
+        total += shard.to_dict().get("total", 0)
+    
+    fund_total_cache["total"] = total
+    fund_total_cache["fetched_at"] = now
+    return total
+
+# XPランキングヘルパー関数
+def load_leaderboard():
+    """XPランキング読み込み（未作成時のみユーザー一覧から再構築。スレッドで実行するため状態は更新しない）"""
+    leaderboard_ref = db.collection("community").document("leaderboard")
+    leaderboard_doc = leaderboard_ref.get()
+    
+    if leaderboard_doc.exists:
+        entries = leaderboard_doc.to_dict().get("entries", [])
+    else:
+        # 総XP降順の先頭ページのみ取得して再構築
+        print("🔄 XPランキングを再構築中...")
+        query = db.collection("users").order_by("total_xp", direction=firestore.Query.DESCENDING).limit(LEADERBOARD_SIZE)
+        entries = []
+        for user_doc in query.stream():
+            user_data = user_doc.to_dict()
+            entries.append({
+                "user_id": user_doc.id,
+                "total_xp": user_data.get("total_xp", 0),
+                "level": user_data.get("level", 1)
+            })
+        leaderboard_ref.set({"entries": entries, "updated_at": firestore.SERVER_TIMESTAMP})
+        print(f"✅ XPランキング再構築完了: {len(entries)}人")
+    
+    return entries
+
+async def fetch_leaderboard():
+    """XPランキング取得（読み込み済みならスレッドを使わずに返す。同時の初回読み込みは1回にまとめる）"""
+    if leaderboard_state["entries"] is None:
+        async with leaderboard_load_lock:
+            if leaderboard_state["entries"] is None:
+                leaderboard_state["entries"] = await run_db(load_leaderboard)
+    return leaderboard_state["entries"]
+
+async def update_leaderboard(user_id, total_xp, level):
+    """XP付与時にランキング上位K件を差分更新（総XPは減少しない前提）"""
+    entries = await fetch_leaderboard()
+    
+    for entry in entries:
+        if entry["user_id"] == user_id:
+            entry["total_xp"] = total_xp
+            entry["level"] = level
+            break
+    else:
+        if len(entries) >= LEADERBOARD_SIZE and total_xp <= entries[-1]["total_xp"]:
+            return  # 圏外
+        entries.append({"user_id": user_id, "total_xp": total_xp, "level": level})
+    
+    entries.sort(key=lambda entry: entry["total_xp"], reverse=True)
+    del entries[LEADERBOARD_SIZE:]
+    leaderboard_state["dirty"] = True
+
+def save_leaderboard(entries):
+    """ランキングを1ドキュメントとして保存"""
+    db.collection("community").document("leaderboard").set({
+        "entries": entries,
+        "updated_at": firestore.SERVER_TIMESTAMP
+    })
+
+async def flush_leaderboard():
+    """ランキングに変更があれば保存（イベントループ上で複製した内容をスレッドで書き込む）"""
+    if not leaderboard_state["dirty"] or leaderboard_state["entries"] is None:
+        return
+    entries = [dict(entry) for entry in leaderboard_state["entries"]]
+    leaderboard_state["dirty"] = False
+    try:
+        await run_db(save_leaderboard, entries)
+    except Exception:
+        leaderboard_state["dirty"] = True
+        raise
+
+@firestore.transactional
+def apply_donation(transaction, user_ref, user_id, amount, xp_reward):
+    """寄付処理（残高減算・XP付与・基金加算・寄付ログを1トランザクションで確定）"""
+    user_doc = user_ref.get(transaction=transaction)
+    
+    if not user_doc.exists:
+        return {"success": False, "balance": None}
+    
+    user_data = user_doc.to_dict()
+    balance = user_data.get("balance", 0)
+    
+    if balance < amount:
+        return {"success": False, "balance": balance}
+    
+    current_level = user_data.get("level", 1)
+    new_total_xp = user_data.get("total_xp", 0) + xp_reward
+    new_level, new_xp = calculate_level_and_xp(new_total_xp)
+    new_balance = balance - amount
+    
+    # ユーザー情報更新
+    transaction.update(user_ref, {
+        "balance": new_balance,
+        "level": new_level,
+        "xp": new_xp,
+        "total_xp": new_total_xp,
+        "donations_made": user_data.get("donations_made", 0) + 1
+    })
+    
+    # 台帳仕訳
+    KraftLedger.post(transaction, user_id, -amount, SYSTEM_COMMUNITY_FUND, "donation", db=db)
+    
+    # コミュニティ基金に追加（シャードへのアトミック加算）
+    transaction.set(get_fund_shard_ref(), {"total": firestore.Increment(amount)}, merge=True)
+    
+    # 寄付ログ
+    transaction.set(db.collection("donations").document(), {
+        "user_id": user_id,
+        "amount": amount,
+        "xp_reward": xp_reward,
+        "timestamp": firestore.SERVER_TIMESTAMP
+    })
+    
+    return {
+        "success": True,
+        "balance": new_balance,
+        "old_level": current_level,
+        "new_level": new_level,
+        "total_xp": new_total_xp
+    }
+
 # =====================================
 # プロフィール確認コマンド
 # =====================================
+# プロフィールキャッシュヘルパー関数
+def build_profile_view(data):
+    """ユーザーデータからプロフィール表示用データを構築"""
+    current_level = data.get("level", 1)
+    current_xp = data.get("xp", 0)
+    next_level_xp = calculate_xp_for_level(current_level + 1)
+    current_level_xp = calculate_xp_for_level(current_level)
+    level_xp = next_level_xp - current_level_xp
+    
+    # 称号表示（最新の称号を優先表示、最大3個）
+    titles = data.get("titles", [])
+    titles_text = None
+    if titles:
+        display_titles = titles[-3:] if len(titles) > 3 else titles
+        titles_text = " | ".join([f"**{title}**" for title in display_titles])
+        if len(titles) > 3:
+            titles_text += f" 他{len(titles) - 3}個"
+    
+    # レベルアップまでの進捗バー
+    progress = current_xp / level_xp
+    progress_bar = "▓" * int(progress * 10) + "░" * (10 - int(progress * 10))
+    
+    return {
+        "level": current_level,
+        "titles_text": titles_text,
+        "balance": data.get("balance", 0),
+        "xp_text": f"{current_xp}/{level_xp} XP",
+        "total_xp": data.get("total_xp", 0),
+        "messages_count": data.get("messages_count", 0),
+        "quests_completed": data.get("quests_completed", 0),
+        "donations_made": data.get("donations_made", 0),
+        "donations_received": data.get("donations_received", 0),
+        "progress_text": f"{progress_bar} ({next_level_xp - data.get('total_xp', 0)} XP)",
+        "cached_at": datetime.datetime.utcnow()
+    }
+
+def invalidate_profile_cache(user_id):
+    """XP・残高・称号・クエスト更新時にプロフィールキャッシュを破棄（イベントループ上で呼び出す）"""
+    profile_cache.pop(user_id, None)
+    loading = profile_loading.get(user_id)
+    if loading:
+        loading[1] += 1
+
+def load_profile_data(user_ids):
+    """プロフィール表示用のユーザーデータを一括読み込み（スレッドで実行するためキャッシュには触れない）"""
+    refs = [db.collection("users").document(user_id) for user_id in user_ids]
+    datas = {}
+    for user_doc in db.get_all(refs):
+        user_id = user_doc.id
+        if user_doc.exists:
+            datas[user_id] = user_doc.to_dict()
+        else:
+            # 新規ユーザー初期化（共通の既定値で作成）
+            record = UserRecord.new(user_id)
+            user_doc.reference.set(record.changes())
+            datas[user_id] = record.to_dict()
+            print(f"新規ユーザー作成: {user_id}")
+    return datas
+
+async def get_profile_views(user_ids):
+    """
+    プロフィール表示データ取得（キャッシュ未登録分は一括読み込み）
+    キャッシュの参照・更新はイベントループ上で行い、読み込み中に破棄されたユーザーの結果はキャッシュしない
+    """
+    now = datetime.datetime.utcnow()
+    views = {}
+    cold_ids = []
+    
+    for user_id in dict.fromkeys(user_ids):
+        view = profile_cache.get(user_id)
+        if view and (now - view["cached_at"]).total_seconds() < PROFILE_CACHE_TTL:
+            profile_cache.move_to_end(user_id)
+            views[user_id] = view
+        else:
+            cold_ids.append(user_id)
+    
+    if cold_ids:
+        started = {}
+        for user_id in cold_ids:
+            loading = profile_loading.setdefault(user_id, [0, 0])
+            loading[0] += 1
+            started[user_id] = loading[1]
+        try:
+            datas = await run_db(load_profile_data, cold_ids)
+            for user_id, data in datas.items():
+                views[user_id] = build_profile_view(data)
+                if profile_loading[user_id][1] == started[user_id]:
+                    profile_cache[user_id] = views[user_id]
+        finally:
+            for user_id in cold_ids:
+                loading = profile_loading[user_id]
+                loading[0] -= 1
+                if not loading[0]:
+                    del profile_loading[user_id]
+        
+        while len(profile_cache) > PROFILE_CACHE_SIZE:
+            profile_cache.popitem(last=False)
+    
+    return views
+
 @bot.tree.command(name="プロフィール", description="あなたのプロフィール情報を確認します")
 async def profile_cmd(interaction: discord.Interaction, ユーザー: discord.Member = None):
     print(f"[プロフィール] {interaction.user.name} が実行")
@@ -75,37 +352,8 @@ async def profile_cmd(interaction: discord.Interaction, ユーザー: discord.Me
     target_user = ユーザー if ユーザー else interaction.user
     user_id = str(target_user.id)
     
-    # ユーザー情報取得
-    user_ref = db.collection("users").document(user_id)
-    user_doc = user_ref.get()
-    
-    if not user_doc.exists:
-        # 新規ユーザー初期化
-        user_data = {
-            "user_id": user_id,
-            "balance": 1000,
-            "level": 1,
-            "xp": 0,
-            "total_xp": 0,
-            "messages_count": 0,
-            "donations_made": 0,
-            "donations_received": 0,
-            "quests_completed": 0,
-            "last_message_xp": None,
-            "created_at": firestore.SERVER_TIMESTAMP
-        }
-        user_ref.set(user_data)
-        data = user_data
-        print(f"新規ユーザー作成: {user_id}")
-    else:
-        data = user_doc.to_dict()
-    
-    # レベルアップに必要なXP計算
-    current_level = data.get("level", 1)
-    current_xp = data.get("xp", 0)
-    next_level_xp = calculate_xp_for_level(current_level + 1)
-    current_level_xp = calculate_xp_for_level(current_level)
-    xp_needed = next_level_xp - data.get("total_xp", 0)
+    # ユーザー情報取得（キャッシュ優先）
+    view = (await get_profile_views([user_id]))[user_id]
     
     embed = discord.Embed(
         title=f"👤 {target_user.display_name} のプロフィール",
@@ -113,61 +361,53 @@ async def profile_cmd(interaction: discord.Interaction, ユーザー: discord.Me
     )
     
     # 称号表示
-    titles = data.get("titles", [])
-    if titles:
-        # 最新の称号を優先表示（最大3個）
-        display_titles = titles[-3:] if len(titles) > 3 else titles
-        titles_text = " | ".join([f"**{title}**" for title in display_titles])
-        if len(titles) > 3:
-            titles_text += f" 他{len(titles) - 3}個"
+    if view["titles_text"]:
         embed.add_field(
             name="🏅 称号",
-            value=titles_text,
+            value=view["titles_text"],
             inline=False
         )
     
     embed.add_field(
         name="💰 残高", 
-        value=f"{data.get('balance', 0):,} KR", 
+        value=f"{view['balance']:,} KR", 
         inline=True
     )
     embed.add_field(
         name="⭐ レベル", 
-        value=f"Lv.{current_level}", 
+        value=f"Lv.{view['level']}", 
         inline=True
     )
     embed.add_field(
         name="✨ 経験値", 
-        value=f"{current_xp}/{next_level_xp - current_level_xp} XP", 
+        value=view["xp_text"], 
         inline=True
     )
     embed.add_field(
         name="📈 総経験値", 
-        value=f"{data.get('total_xp', 0):,} XP", 
+        value=f"{view['total_xp']:,} XP", 
         inline=True
     )
     embed.add_field(
         name="💬 メッセージ数", 
-        value=f"{data.get('messages_count', 0):,} 回", 
+        value=f"{view['messages_count']:,} 回", 
         inline=True
     )
     embed.add_field(
         name="🎯 クエスト完了", 
-        value=f"{data.get('quests_completed', 0)} 個", 
+        value=f"{view['quests_completed']} 個", 
         inline=True
     )
     embed.add_field(
         name="💝 寄付実績", 
-        value=f"送付: {data.get('donations_made', 0)} 回\n受取: {data.get('donations_received', 0)} 回", 
+        value=f"送付: {view['donations_made']} 回\n受取: {view['donations_received']} 回", 
         inline=False
     )
     
     # レベルアップまでの進捗バー
-    progress = current_xp / (next_level_xp - current_level_xp)
-    progress_bar = "▓" * int(progress * 10) + "░" * (10 - int(progress * 10))
     embed.add_field(
         name="📊 次のレベルまで", 
-        value=f"{progress_bar} ({xp_needed} XP)", 
+        value=view["progress_text"], 
         inline=False
     )
     
@@ -175,7 +415,7 @@ async def profile_cmd(interaction: discord.Interaction, ユーザー: discord.Me
     embed.set_footer(text="KRAFTコミュニティ")
     
     await interaction.followup.send(embed=embed)
-    print(f"プロフィール表示成功: Lv.{current_level}")
+    print(f"プロフィール表示成功: Lv.{view['level']}")
 
 # =====================================
 # 寄付コマンド
@@ -183,6 +423,12 @@ async def profile_cmd(interaction: discord.Interaction, ユーザー: discord.Me
 @bot.tree.command(name="寄付", description="コミュニティに寄付してXPを獲得します")
 async def donate_cmd(interaction: discord.Interaction, 金額: int):
     print(f"[寄付] {interaction.user.name}: {金額}KR")
+    # 頻度制限（Firestoreへアクセスする前にメモリ内で判定）
+    allowed, retry_after = rate_limiter.acquire(str(interaction.user.id), "donate")
+    if not allowed:
+        await interaction.response.send_message(f"⏳ 取引が集中しています。{format_retry_after(retry_after)}後にもう一度お試しください。", ephemeral=True)
+        return
+    
     await interaction.response.defer()
     
     if 金額 < 100:
@@ -195,61 +441,32 @@ async def donate_cmd(interaction: discord.Interaction, 金額: int):
     
     user_id = str(interaction.user.id)
     user_ref = db.collection("users").document(user_id)
-    user_doc = user_ref.get()
-    
-    if not user_doc.exists:
-        await interaction.followup.send("残高が不足しています。")
-        return
-    
-    user_data = user_doc.to_dict()
-    balance = user_data.get("balance", 0)
-    
-    if balance < 金額:
-        await interaction.followup.send(f"残高が不足しています。現在の残高: {balance:,} KR")
-        return
     
     # 寄付額に応じたXP計算（1KR = 0.1XP）
     xp_reward = int(金額 * 0.1)
     
-    # ユーザー情報更新
-    new_balance = balance - 金額
-    current_level = user_data.get("level", 1)
-    current_xp = user_data.get("xp", 0)
-    current_total_xp = user_data.get("total_xp", 0)
+    # 残高減算・XP付与・基金加算・寄付ログを一括確定
+    result = await run_db(apply_donation, db.transaction(), user_ref, user_id, 金額, xp_reward)
+    user_cache.invalidate(user_id)
+    invalidate_profile_cache(user_id)
     
-    new_total_xp = current_total_xp + xp_reward
-    new_level, new_xp = calculate_level_and_xp(new_total_xp)
+    if not result["success"]:
+        if result["balance"] is not None:
+            await interaction.followup.send(f"残高が不足しています。現在の残高: {result['balance']:,} KR")
+        else:
+            await interaction.followup.send("残高が不足しています。")
+        return
     
+    new_balance = result["balance"]
+    current_level = result["old_level"]
+    new_level = result["new_level"]
     level_up = new_level > current_level
+    await update_leaderboard(user_id, result["total_xp"], new_level)
     
-    # データベース更新
-    update_data = {
-        "balance": new_balance,
-        "level": new_level,
-        "xp": new_xp,
-        "total_xp": new_total_xp,
-        "donations_made": user_data.get("donations_made", 0) + 1
-    }
-    user_ref.update(update_data)
-    
-    # コミュニティ基金に追加
-    community_ref = db.collection("community").document("fund")
-    community_doc = community_ref.get()
-    
-    if community_doc.exists:
-        current_fund = community_doc.to_dict().get("total", 0)
-        community_ref.update({"total": current_fund + 金額})
-    else:
-        community_ref.set({"total": 金額, "created_at": firestore.SERVER_TIMESTAMP})
-    
-    # 寄付ログ
-    donation_data = {
-        "user_id": user_id,
-        "amount": 金額,
-        "xp_reward": xp_reward,
-        "timestamp": firestore.SERVER_TIMESTAMP
-    }
-    db.collection("donations").add(donation_data)
+    # 表示用の基金合計（キャッシュ済みなら今回の寄付分を反映）
+    if fund_total_cache["total"] is not None:
+        fund_total_cache["total"] += 金額
+    fund_total = await run_db(get_community_fund_total)
     
     embed = discord.Embed(
         title="💝 寄付完了",
@@ -258,6 +475,7 @@ async def donate_cmd(interaction: discord.Interaction, 金額: int):
     )
     embed.add_field(name="XP獲得", value=f"+{xp_reward} XP", inline=True)
     embed.add_field(name="残高", value=f"{new_balance:,} KR", inline=True)
+    embed.add_field(name="コミュニティ基金", value=f"{fund_total:,} KR", inline=True)
     
     if level_up:
         embed.add_field(
@@ -271,6 +489,36 @@ async def donate_cmd(interaction: discord.Interaction, 金額: int):
     await interaction.followup.send(embed=embed)
     print(f"寄付成功: {金額} KR, {xp_reward} XP獲得")
 
+# =====================================
+# XPランキングコマンド
+# =====================================
+@bot.tree.command(name="ランキング", description="XP・レベルの上位ランキングを表示します")
+async def leaderboard_cmd(interaction: discord.Interaction):
+    print(f"[ランキング] {interaction.user.name} が実行")
+    await interaction.response.defer()
+    
+    entries = await fetch_leaderboard()
+    
+    embed = discord.Embed(
+        title="🏆 XPランキング",
+        color=discord.Color.gold()
+    )
+    
+    if not entries:
+        embed.description = "まだランキングデータがありません"
+    else:
+        medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+        lines = []
+        for rank, entry in enumerate(entries, start=1):
+            prefix = medals.get(rank, f"**{rank}.**")
+            lines.append(f"{prefix} <@{entry['user_id']}> Lv.{entry['level']} ({entry['total_xp']:,} XP)")
+        embed.description = "\n".join(lines)
+    
+    embed.set_footer(text="KRAFTコミュニティ")
+    
+    await interaction.followup.send(embed=embed)
+    print(f"ランキング表示: {len(entries)}人")
+
 # =====================================
 # 個人クエスト作成コマンド
 # =====================================
@@ -320,8 +568,8 @@ async def quest_create_cmd(interaction: discord.Interaction, 目標内容: str,
     user_id = str(interaction.user.id)
     
     # 現在のアクティブクエスト数チェック
-    active_quests = db.collection("personal_quests").where("user_id", "==", user_id).where("status", "==", "active").stream()
-    active_count = len(list(active_quests))
+    active_query = db.collection("personal_quests").where("user_id", "==", user_id).where("status", "==", "active")
+    active_count = len(await run_db(active_query.get))
     
     if active_count >= 10:
         await interaction.followup.send("アクティブなクエストが上限（10個）に達しています。", ephemeral=True)
@@ -342,7 +590,7 @@ async def quest_create_cmd(interaction: discord.Interaction, 目標内容: str,
     }
     
     # クエスト登録
-    quest_ref = db.collection("personal_quests").add(quest_data)
+    quest_ref = await run_db(db.collection("personal_quests").add, quest_data)
     quest_id = quest_ref[1].id
     
     embed = discord.Embed(
@@ -370,7 +618,8 @@ async def my_quest_list_cmd(interaction: discord.Interaction):
     user_id = str(interaction.user.id)
     
     # ユーザーのアクティブクエスト取得
-    quests = db.collection("personal_quests").where("user_id", "==", user_id).where("status", "==", "active").stream()
+    quest_query = db.collection("personal_quests").where("user_id", "==", user_id).where("status", "==", "active")
+    quests = await run_db(quest_query.get)
     
     embed = discord.Embed(
         title="🎯 あなたの個人クエスト",
@@ -436,7 +685,8 @@ async def quest_complete_cmd(interaction: discord.Interaction):
     user_id = str(interaction.user.id)
     
     # ユーザーのアクティブクエスト取得
-    quests = list(db.collection("personal_quests").where("user_id", "==", user_id).where("status", "==", "active").stream())
+    quest_query = db.collection("personal_quests").where("user_id", "==", user_id).where("status", "==", "active")
+    quests = await run_db(quest_query.get)
     
     if not quests:
         await interaction.followup.send("達成できるアクティブなクエストがありません。", ephemeral=True)
@@ -472,7 +722,7 @@ async def quest_complete_cmd(interaction: discord.Interaction):
         
         # クエスト達成処理
         quest_ref = db.collection("personal_quests").document(quest_id)
-        quest_doc = quest_ref.get()
+        quest_doc = await run_db(quest_ref.get)
         
         if not quest_doc.exists:
             await select_interaction.response.send_message("クエストが見つかりません", ephemeral=True)
@@ -486,45 +736,46 @@ async def quest_complete_cmd(interaction: discord.Interaction):
         
         # クエスト完了処理
         reward_xp = quest_data.get("reward_xp", 0)
-        quest_ref.update({
+        await run_db(quest_ref.update, {
             "status": "completed",
             "completed_at": firestore.SERVER_TIMESTAMP
         })
         
         # ユーザーのXP付与
         user_ref = db.collection("users").document(user_id)
-        user_doc = user_ref.get()
+        record = await user_cache.fetch(user_id)
         
         level_up = False
         kr_reward = 0
         current_level = 1
         new_level = 1
         
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
-            current_level = user_data.get("level", 1)
-            current_total_xp = user_data.get("total_xp", 0)
+        if record is not None:
+            current_level = record.level
             
-            new_total_xp = current_total_xp + reward_xp
+            new_total_xp = record.total_xp + reward_xp
             new_level, new_xp = calculate_level_and_xp(new_total_xp)
             
             level_up = new_level > current_level
             
+            record.level = new_level
+            record.xp = new_xp
+            record.total_xp = new_total_xp
             # クエスト完了数も更新
-            quests_completed = user_data.get("quests_completed", 0) + 1
-            
-            user_ref.update({
-                "level": new_level,
-                "xp": new_xp,
-                "total_xp": new_total_xp,
-                "quests_completed": quests_completed
-            })
+            record.quests_completed += 1
             
-            # レベルアップ報酬
+            # レベルアップ報酬（XP更新と同じバッチでアトミック加算）
+            batch = db.batch()
             if level_up:
                 kr_reward = new_level * 500
-                current_balance = user_data.get("balance", 1000)
-                user_ref.update({"balance": current_balance + kr_reward})
+                record.increment("balance", kr_reward)
+                KraftLedger.post(batch, user_id, kr_reward, SYSTEM_MINT, f"level_up_{new_level}", db=db)
+            batch.update(user_ref, record.changes())
+            await run_db(batch.commit)
+            user_cache.record_saved(record)
+            await update_leaderboard(user_id, new_total_xp, new_level)
+            
+            invalidate_profile_cache(user_id)
         
         embed = discord.Embed(
             title="🎉 クエスト達成！",
@@ -559,7 +810,8 @@ async def quest_delete_cmd(interaction: discord.Interaction):
     user_id = str(interaction.user.id)
     
     # ユーザーのアクティブクエスト取得
-    quests = list(db.collection("personal_quests").where("user_id", "==", user_id).where("status", "==", "active").stream())
+    quest_query = db.collection("personal_quests").where("user_id", "==", user_id).where("status", "==", "active")
+    quests = await run_db(quest_query.get)
     
     if not quests:
         await interaction.followup.send("削除できるアクティブなクエストがありません。", ephemeral=True)
@@ -596,7 +848,7 @@ async def quest_delete_cmd(interaction: discord.Interaction):
         
         # クエスト削除処理
         quest_ref = db.collection("personal_quests").document(quest_id)
-        quest_doc = quest_ref.get()
+        quest_doc = await run_db(quest_ref.get)
         
         if not quest_doc.exists:
             await select_interaction.response.send_message("クエストが見つかりません", ephemeral=True)
@@ -609,7 +861,7 @@ async def quest_delete_cmd(interaction: discord.Interaction):
             return
         
         # クエスト削除
-        quest_ref.update({
+        await run_db(quest_ref.update, {
             "status": "deleted",
             "deleted_at": firestore.SERVER_TIMESTAMP
         })
@@ -654,6 +906,7 @@ async def on_ready():
         print("\n🎯 利用可能なコマンド:")
         print("  /プロフィール [ユーザー] - プロフィール確認")
         print("  /寄付 [金額] - コミュニティ寄付")
+        print("  /ランキング - XPランキング")
         print("  /クエスト作成 [目標内容] [年] [月] [日] - 個人クエスト作成")
         print("  /マイクエスト - 自分のクエスト一覧")
         print("  /クエスト達成 - クエスト達成報告（選択式）")
@@ -676,7 +929,7 @@ async def quest_deadline_check():
         
         # 期限切れクエスト取得
         now = datetime.datetime.utcnow()
-        active_quests = db.collection("personal_quests").where("status", "==", "active").stream()
+        active_quests = await run_db(db.collection("personal_quests").where("status", "==", "active").get)
         
         expired_count = 0
         for quest in active_quests:
@@ -690,7 +943,7 @@ async def quest_deadline_check():
             
             if deadline.replace(tzinfo=None) < now:
                 # クエストを期限切れに変更
-                quest.reference.update({
+                await run_db(quest.reference.update, {
                     "status": "expired",
                     "expired_at": firestore.SERVER_TIMESTAMP
                 })
@@ -710,24 +963,18 @@ async def quest_deadline_check():
 async def before_quest_deadline_check():
     await bot.wait_until_ready()
 
-# メッセージ監視とXP付与
-@bot.event
-async def on_message(message):
-    # ボットのメッセージは無視
-    if message.author.bot:
-        return
-    
+# メッセージXP付与（ワーカーから呼び出し）
+async def process_message_xp(message):
     try:
         user_id = str(message.author.id)
         user_ref = db.collection("users").document(user_id)
-        user_doc = user_ref.get()
+        record = await user_cache.fetch(user_id) or UserRecord.new(user_id)
         
         # クールダウンチェック
         now = datetime.datetime.utcnow()
         
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
-            last_xp_time = user_data.get("last_message_xp")
+        if record.exists:
+            last_xp_time = record.last_message_xp
             
             if last_xp_time:
                 if isinstance(last_xp_time, str):
@@ -740,48 +987,36 @@ async def on_message(message):
                     return  # クールダウン中
         
         # XP付与
-        current_level = user_data.get("level", 1) if user_doc.exists else 1
-        current_xp = user_data.get("xp", 0) if user_doc.exists else 0
-        current_total_xp = user_data.get("total_xp", 0) if user_doc.exists else 0
-        messages_count = user_data.get("messages_count", 0) if user_doc.exists else 0
+        current_level = record.level
         
-        new_total_xp = current_total_xp + XP_PER_MESSAGE
+        new_total_xp = record.total_xp + XP_PER_MESSAGE
         new_level, new_xp = calculate_level_and_xp(new_total_xp)
         
         level_up = new_level > current_level
         
-        # データベース更新
-        update_data = {
-            "user_id": user_id,
-            "level": new_level,
-            "xp": new_xp,
-            "total_xp": new_total_xp,
-            "messages_count": messages_count + 1,
-            "last_message_xp": now,
-            "balance": user_data.get("balance", 1000) if user_doc.exists else 1000
-        }
-        
-        if not user_doc.exists:
-            update_data.update({
-                "donations_made": 0,
-                "donations_received": 0,
-                "quests_completed": 0,
-                "created_at": firestore.SERVER_TIMESTAMP
-            })
+        # データベース更新（変更したフィールドのみ。新規ユーザーは既定値つきで作成）
+        record.level = new_level
+        record.xp = new_xp
+        record.total_xp = new_total_xp
+        record.messages_count += 1
+        record.last_message_xp = now
         
-        user_ref.set(update_data, merge=True)
+        # レベルアップ報酬はXP更新と同じバッチでアトミック加算（残高は読み取った値で上書きしない）
+        batch = db.batch()
+        if level_up:
+            kr_reward = new_level * 500  # レベル × 500 KR
+            record.increment("balance", kr_reward)
+            KraftLedger.post(batch, user_id, kr_reward, SYSTEM_MINT, f"level_up_{new_level}", db=db)
+        batch.set(user_ref, record.changes(), merge=True)
+        await run_db(batch.commit)
+        user_cache.record_saved(record)
+        invalidate_profile_cache(user_id)
+        await update_leaderboard(user_id, new_total_xp, new_level)
         
         # レベルアップ通知
         if level_up:
             print(f"レベルアップ: {message.author.name} Lv.{current_level} → Lv.{new_level}")
             
-            # レベルアップ報酬計算
-            kr_reward = new_level * 500  # レベル × 500 KR
-            
-            # 報酬付与
-            current_balance = update_data.get("balance", 1000)
-            user_ref.update({"balance": current_balance + kr_reward})
-            
             # レベルアップ通知（同じチャンネルに送信）
             embed = discord.Embed(
                 title="🎉 レベルアップ！",
@@ -794,11 +1029,84 @@ async def on_message(message):
             await message.channel.send(embed=embed)
     
     except Exception as e:
+        message_pipeline_stats["errors"] += 1
         print(f"メッセージ処理エラー: {e}")
+
+def get_message_pipeline_stats():
+    """メッセージ処理パイプラインの統計情報"""
+    stats = dict(message_pipeline_stats)
+    stats["depth"] = sum(queue.qsize() for queue in message_queues)
+    stats["capacity"] = sum(queue.maxsize for queue in message_queues)
+    processed = stats["processed"]
+    stats["avg_wait"] = stats["total_wait"] / processed if processed > 0 else 0.0
+    return stats
+
+async def message_worker(worker_id):
+    """担当キューのメッセージを順番にXP処理するワーカー"""
+    queue = message_queues[worker_id]
+    while True:
+        message, enqueued_at = await queue.get()
+        try:
+            message_pipeline_stats["total_wait"] += asyncio.get_running_loop().time() - enqueued_at
+            await process_message_xp(message)
+            message_pipeline_stats["processed"] += 1
+        finally:
+            queue.task_done()
+
+def start_message_workers():
+    """メッセージ処理ワーカーを起動（起動済みなら何もしない）"""
+    if message_workers:
+        return
+    for worker_id in range(MESSAGE_WORKER_COUNT):
+        message_workers.append(asyncio.create_task(message_worker(worker_id)))
+    print(f"✅ メッセージ処理ワーカー起動: {MESSAGE_WORKER_COUNT}個")
+
+# メッセージ監視とXP付与
+@bot.event
+async def on_message(message):
+    # ボットのメッセージは無視
+    if message.author.bot:
+        return
+    
+    # 同一ユーザーのメッセージは同じワーカーに割り当てて順序を保証
+    queue = message_queues[message.author.id % MESSAGE_WORKER_COUNT]
+    try:
+        queue.put_nowait((message, asyncio.get_running_loop().time()))
+        message_pipeline_stats["enqueued"] += 1
+        depth = sum(q.qsize() for q in message_queues)
+        if depth > message_pipeline_stats["max_depth"]:
+            message_pipeline_stats["max_depth"] = depth
+    except asyncio.QueueFull:
+        # キュー飽和時はXPのみのイベントを破棄（コマンド処理は継続）
+        message_pipeline_stats["dropped"] += 1
     
     # コマンド処理を続行
     await bot.process_commands(message)
 
+# バックグラウンドタスク：XPランキング保存
+@tasks.loop(seconds=LEADERBOARD_FLUSH_INTERVAL)
+async def leaderboard_flush():
+    try:
+        await flush_leaderboard()
+    except Exception as e:
+        print(f"❌ XPランキング保存エラー: {e}")
+
+@leaderboard_flush.before_loop
+async def before_leaderboard_flush():
+    await bot.wait_until_ready()
+
+# バックグラウンドタスク：メッセージ処理パイプライン統計
+@tasks.loop(minutes=5)
+async def message_pipeline_report():
+    stats = get_message_pipeline_stats()
+    print(f"📨 メッセージ処理: 受付 {stats['enqueued']} / 処理 {stats['processed']} / 破棄 {stats['dropped']} / "
+          f"エラー {stats['errors']} / 待機 {stats['depth']}/{stats['capacity']} (最大 {stats['max_depth']}) / "
+          f"平均待ち時間 {stats['avg_wait']:.3f}秒")
+
+@message_pipeline_report.before_loop
+async def before_message_pipeline_report():
+    await bot.wait_until_ready()
+
 # エラーハンドリング
 @bot.event
 async def on_error(event, *args, **kwargs):
@@ -811,6 +1119,12 @@ async def on_ready():
     print(f"\n👥 KRAFTコミュニティBot起動: {bot.user}")
     print(f"接続サーバー: {[g.name for g in bot.guilds]}")
     
+    # メッセージ処理ワーカー起動
+    start_message_workers()
+    
+    # 他のBotによるユーザーデータ更新をキャッシュへ反映（USER_CACHE_CONFIG["listener"] 有効時のみ。既定はTTLで反映）
+    user_cache.start_listener()
+    
     print("\n🔄 コマンドを同期中...")
     try:
         synced = await bot.tree.sync()
@@ -822,11 +1136,16 @@ async def on_ready():
         if not quest_deadline_check.is_running():
             quest_deadline_check.start()
             print("✅ クエスト期限チェックタスク開始")
+        if not message_pipeline_report.is_running():
+            message_pipeline_report.start()
+        if not leaderboard_flush.is_running():
+            leaderboard_flush.start()
     except Exception as e:
         print(f"❌ コマンド同期失敗: {e}")
 
-print("\n👥 KRAFTコミュニティBot起動中...")
-if TOKEN:
-    bot.run(TOKEN)
-else:
-    print("❌ TOKENが設定されていません")
\ No newline at end of file
+if __name__ == "__main__":
+    print("\n👥 KRAFTコミュニティBot起動中...")
+    if TOKEN:
+        bot.run(TOKEN)
+    else:
+        print("❌ TOKENが設定されていません")
\ No newline at end of file
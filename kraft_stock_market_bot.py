@@ -4,19 +4,24 @@ import discord
 from discord.ext import commands, tasks
 import os
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import firestore
 import datetime
 import random
 import asyncio
 import math
 import json
 from typing import Dict, List, Optional, Tuple, Any
+import logging
 import anthropic
+from shared.kraft_db import get_db, run_db
+from shared.kraft_ledger import KraftLedger, SYSTEM_MARKET
+from shared.kraft_rate_limit import rate_limiter, format_retry_after
 
 print("📈 KRAFT株式市場Bot - 開発版")
 print("=" * 50)
 
+logger = logging.getLogger(__name__)
+
 # 環境変数読み込み
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN_STOCK_MARKET_BOT")
@@ -31,10 +36,7 @@ except Exception as e:
     anthropic_client = None
 
 # Firebase初期化（共有）
-if not firebase_admin._apps:
-    cred = credentials.Certificate("config/firebase_credentials.json")
-    firebase_admin.initialize_app(cred)
-db = firestore.client()
+db = get_db()
 
 print(f"Token: {'OK' if TOKEN else 'NG'}")
 print(f"Admin IDs: {ADMIN_USER_IDS}")
@@ -229,7 +231,7 @@ async def on_ready():
             
             for symbol, stock_info in STOCK_DATA.items():
                 # 現在価格取得
-                price_doc = market_ref.document(f"stock_{symbol}").get()
+                price_doc = await run_db(market_ref.document(f"stock_{symbol}").get)
                 if price_doc.exists:
                     data = price_doc.to_dict()
                     current_price = data.get("current_price", stock_info["initial_price"])
@@ -280,8 +282,14 @@ async def on_ready():
                 await interaction.response.send_message("🕒 市場は現在閉場中です。開場時間: 0:00-23:00 (UTC)", ephemeral=True)
                 return
             
-            # 日次取引制限チェック
             user_id = str(interaction.user.id)
+            # 頻度制限（Firestoreへアクセスする前にメモリ内で判定）
+            allowed, retry_after = rate_limiter.acquire(user_id, "trade")
+            if not allowed:
+                await interaction.response.send_message(f"⏳ 取引が集中しています。{format_retry_after(retry_after)}後にもう一度お試しください。", ephemeral=True)
+                return
+            
+            # 日次取引制限チェック
             if not await check_daily_trade_limit(user_id):
                 await interaction.response.send_message(f"❌ 1日の取引回数制限({MARKET_CONFIG['daily_trade_limit']}回)に達しています", ephemeral=True)
                 return
@@ -336,24 +344,17 @@ async def on_ready():
                                     await modal_interaction.response.send_message(f"❌ 最大取引額: {MARKET_CONFIG['max_trade_amount']:,} KR", ephemeral=True)
                                     return
                                 
-                                # ユーザー残高確認
-                                user_ref = db.collection("users").document(user_id)
-                                user_doc = user_ref.get()
+                                # 取引実行（残高確認と減額は同じトランザクションで実行）
+                                result = await execute_stock_purchase(user_id, selected_symbol, shares, current_price, total_cost)
                                 
-                                if not user_doc.exists:
+                                if result["balance"] is None:
                                     await modal_interaction.response.send_message("❌ ユーザーデータが見つかりません", ephemeral=True)
                                     return
                                 
-                                user_data = user_doc.to_dict()
-                                balance = user_data.get("balance", 0)
-                                
-                                if balance < total_cost:
-                                    await modal_interaction.response.send_message(f"❌ 残高不足\n必要額: {total_cost:,} KR\n現在残高: {balance:,} KR", ephemeral=True)
+                                if not result["success"]:
+                                    await modal_interaction.response.send_message(f"❌ 残高不足\n必要額: {total_cost:,} KR\n現在残高: {result['balance']:,} KR", ephemeral=True)
                                     return
                                 
-                                # 取引実行
-                                await execute_stock_purchase(user_id, selected_symbol, shares, current_price, total_cost)
-                                
                                 embed = discord.Embed(
                                     title="📈 株式購入完了",
                                     description=f"{stock_info['emoji']} {stock_info['name']} を購入しました",
@@ -363,7 +364,7 @@ async def on_ready():
                                 embed.add_field(name="購入株数", value=f"{shares:,}株", inline=True)
                                 embed.add_field(name="単価", value=f"{current_price:.2f} KR", inline=True)
                                 embed.add_field(name="手数料込み総額", value=f"{total_cost:,} KR", inline=True)
-                                embed.add_field(name="新残高", value=f"{balance - total_cost:,} KR", inline=True)
+                                embed.add_field(name="新残高", value=f"{result['balance']:,} KR", inline=True)
                                 
                                 embed.set_footer(text="KRAFT株式市場")
                                 await modal_interaction.response.send_message(embed=embed)
@@ -395,27 +396,33 @@ async def on_ready():
     # =====================================
     @bot.tree.command(name="株式売却", description="保有している株式を売却します")
     async def sell_stock_cmd(interaction: discord.Interaction):
-        print(f"[DEBUG] 株式売却コマンド開始: {interaction.user.name}")
+        logger.debug(f"株式売却コマンド開始: {interaction.user.name}")
         try:
             # 市場開場時間チェック
-            print(f"[DEBUG] 市場開場チェック...")
+            logger.debug(f"市場開場チェック...")
             if not is_market_open():
-                print(f"[DEBUG] 市場閉場中のためコマンド終了")
+                logger.debug(f"市場閉場中のためコマンド終了")
                 await interaction.response.send_message("🕒 市場は現在閉場中です。開場時間: 0:00-23:00 (UTC)", ephemeral=True)
                 return
             
-            # 日次取引制限チェック
             user_id = str(interaction.user.id)
-            print(f"[DEBUG] 日次取引制限チェック: user_id={user_id}")
+            # 頻度制限（Firestoreへアクセスする前にメモリ内で判定）
+            allowed, retry_after = rate_limiter.acquire(user_id, "trade")
+            if not allowed:
+                await interaction.response.send_message(f"⏳ 取引が集中しています。{format_retry_after(retry_after)}後にもう一度お試しください。", ephemeral=True)
+                return
+            
+            # 日次取引制限チェック
+            logger.debug(f"日次取引制限チェック: user_id={user_id}")
             if not await check_daily_trade_limit(user_id):
-                print(f"[DEBUG] 取引制限に達しているためコマンド終了")
+                logger.debug(f"取引制限に達しているためコマンド終了")
                 await interaction.response.send_message(f"❌ 1日の取引回数制限({MARKET_CONFIG['daily_trade_limit']}回)に達しています", ephemeral=True)
                 return
             
             # ポートフォリオ取得
-            print(f"[DEBUG] ポートフォリオ取得中...")
+            logger.debug(f"ポートフォリオ取得中...")
             portfolio = await get_user_portfolio(user_id)
-            print(f"[DEBUG] ポートフォリオ: {portfolio}")
+            logger.debug(f"ポートフォリオ: {portfolio}")
             
             if not portfolio:
                 await interaction.response.send_message("📊 保有株式がありません", ephemeral=True)
@@ -493,10 +500,15 @@ async def on_ready():
                                 avg_cost = holding["average_cost"]
                                 profit_loss = (current_price - avg_cost) * shares
                                 
-                                # 取引実行
-                                print(f"[DEBUG] execute_stock_sale呼び出し前: user_id={user_id}, symbol={selected_symbol}, shares={shares}, price={current_price}, total_value={total_value}")
-                                new_balance = await execute_stock_sale(user_id, selected_symbol, shares, current_price, total_value)
-                                print(f"[DEBUG] execute_stock_sale呼び出し後: new_balance={new_balance}")
+                                # 取引実行（保有株数の確認と増額は同じトランザクションで実行）
+                                logger.debug(f"execute_stock_sale呼び出し前: user_id={user_id}, symbol={selected_symbol}, shares={shares}, price={current_price}, total_value={total_value}")
+                                result = await execute_stock_sale(user_id, selected_symbol, shares, current_price, total_value)
+                                logger.debug(f"execute_stock_sale呼び出し後: {result}")
+                                
+                                if not result["success"]:
+                                    await modal_interaction.response.send_message(f"❌ 保有株数不足\n保有: {result['shares']}株\n売却希望: {shares}株", ephemeral=True)
+                                    return
+                                remaining_shares = result["shares"]
                                 
                                 embed = discord.Embed(
                                     title="📉 株式売却完了",
@@ -515,7 +527,7 @@ async def on_ready():
                                 else:
                                     embed.add_field(name="損益", value="⚪ ±0 KR", inline=True)
                                 
-                                embed.add_field(name="新残高", value=f"{new_balance:,} KR", inline=True)
+                                embed.add_field(name="残り保有株数", value=f"{remaining_shares:,}株", inline=True)
                                 
                                 embed.set_footer(text="KRAFT株式市場")
                                 await modal_interaction.response.send_message(embed=embed)
@@ -708,7 +720,7 @@ async def on_ready():
             
             # 全ユーザーのポートフォリオ取得
             users_ref = db.collection("users")
-            users = users_ref.stream()
+            users = await run_db(users_ref.get)
             
             rankings = []
             
@@ -791,7 +803,7 @@ async def on_ready():
             await interaction.response.send_message("🔄 ニュース生成中...", ephemeral=True)
             
             # ニュース生成テスト
-            print("[DEBUG] テスト用ニュース生成開始...")
+            logger.debug("テスト用ニュース生成開始...")
             news = await generate_market_news()
             
             # テスト結果を編集で更新
@@ -882,7 +894,7 @@ async def initialize_market_data():
         
         for symbol, stock_info in STOCK_DATA.items():
             doc_ref = market_ref.document(f"stock_{symbol}")
-            doc = doc_ref.get()
+            doc = await run_db(doc_ref.get)
             
             if not doc.exists:
                 initial_data = {
@@ -894,7 +906,7 @@ async def initialize_market_data():
                     "last_updated": firestore.SERVER_TIMESTAMP,
                     "price_history": [stock_info["initial_price"]]
                 }
-                doc_ref.set(initial_data)
+                await run_db(doc_ref.set, initial_data)
                 print(f"初期化: {symbol} = {stock_info['initial_price']} KR")
     
     except Exception as e:
@@ -909,7 +921,7 @@ async def get_current_stock_price(symbol: str) -> float:
     """現在の株価取得"""
     try:
         market_ref = db.collection("market_data").document(f"stock_{symbol}")
-        doc = market_ref.get()
+        doc = await run_db(market_ref.get)
         
         if doc.exists:
             return doc.to_dict().get("current_price", STOCK_DATA[symbol]["initial_price"])
@@ -925,7 +937,7 @@ async def check_daily_trade_limit(user_id: str) -> bool:
     try:
         today = datetime.datetime.utcnow().strftime("%Y-%m-%d")
         trades_ref = db.collection("trades").where("user_id", "==", user_id).where("date", "==", today)
-        trades = list(trades_ref.stream())
+        trades = await run_db(trades_ref.get)
         
         return len(trades) < MARKET_CONFIG["daily_trade_limit"]
     
@@ -937,7 +949,7 @@ async def get_user_portfolio(user_id: str) -> Dict:
     """ユーザーのポートフォリオ取得"""
     try:
         portfolio_ref = db.collection("portfolios").document(user_id)
-        doc = portfolio_ref.get()
+        doc = await run_db(portfolio_ref.get)
         
         if doc.exists:
             return doc.to_dict().get("holdings", {})
@@ -948,145 +960,145 @@ async def get_user_portfolio(user_id: str) -> Dict:
         print(f"ポートフォリオ取得エラー: {e}")
         return {}
 
-async def execute_stock_purchase(user_id: str, symbol: str, shares: int, price: float, total_cost: int):
-    """株式購入実行"""
-    try:
-        # トランザクション開始
-        batch = db.batch()
-        
-        # ユーザー残高減額
-        user_ref = db.collection("users").document(user_id)
-        user_doc = user_ref.get()
-        user_data = user_doc.to_dict()
-        new_balance = user_data["balance"] - total_cost
-        batch.update(user_ref, {"balance": new_balance})
-        
-        # ポートフォリオ更新
-        portfolio_ref = db.collection("portfolios").document(user_id)
-        portfolio_doc = portfolio_ref.get()
-        
-        if portfolio_doc.exists:
-            holdings = portfolio_doc.to_dict().get("holdings", {})
-        else:
-            holdings = {}
-        
-        if symbol in holdings:
-            # 平均取得価格計算
-            existing_shares = holdings[symbol]["shares"]
-            existing_cost = holdings[symbol]["average_cost"]
-            total_shares = existing_shares + shares
-            total_investment = (existing_cost * existing_shares) + (price * shares)
-            new_average_cost = total_investment / total_shares
-            
-            holdings[symbol] = {
-                "shares": total_shares,
-                "average_cost": new_average_cost
-            }
-        else:
-            holdings[symbol] = {
-                "shares": shares,
-                "average_cost": price
-            }
-        
-        batch.set(portfolio_ref, {"holdings": holdings}, merge=True)
+@firestore.transactional
+def apply_stock_purchase(transaction, user_id: str, symbol: str, shares: int, price: float, total_cost: int) -> Dict:
+    """株式購入（残高が足りる場合のみ減額し、ポートフォリオ・取引ログ・出来高を1トランザクションで確定）"""
+    user_ref = db.collection("users").document(user_id)
+    portfolio_ref = db.collection("portfolios").document(user_id)
+    market_ref = db.collection("market_data").document(f"stock_{symbol}")
+    
+    # 3ドキュメントを1回の読み取りで取得
+    docs = {doc.reference.path: doc for doc in transaction.get_all([user_ref, portfolio_ref, market_ref])}
+    user_doc = docs[user_ref.path]
+    portfolio_doc = docs[portfolio_ref.path]
+    market_doc = docs[market_ref.path]
+    
+    if not user_doc.exists:
+        return {"success": False, "balance": None}
+    
+    balance = user_doc.to_dict().get("balance", 0)
+    if balance < total_cost:
+        return {"success": False, "balance": balance}
+    
+    # ユーザー残高減額
+    transaction.update(user_ref, {"balance": firestore.Increment(-total_cost)})
+    KraftLedger.post(transaction, user_id, -total_cost, SYSTEM_MARKET, f"stock_buy_{symbol}", db=db)
+    
+    # ポートフォリオ更新
+    holdings = portfolio_doc.to_dict().get("holdings", {}) if portfolio_doc.exists else {}
+    
+    if symbol in holdings:
+        # 平均取得価格計算
+        existing_shares = holdings[symbol]["shares"]
+        existing_cost = holdings[symbol]["average_cost"]
+        total_shares = existing_shares + shares
+        total_investment = (existing_cost * existing_shares) + (price * shares)
+        new_average_cost = total_investment / total_shares
         
-        # 取引ログ
-        today = datetime.datetime.utcnow().strftime("%Y-%m-%d")
-        trade_data = {
-            "user_id": user_id,
-            "symbol": symbol,
-            "type": "buy",
+        holdings[symbol] = {
+            "shares": total_shares,
+            "average_cost": new_average_cost
+        }
+    else:
+        holdings[symbol] = {
             "shares": shares,
-            "price": price,
-            "total_amount": total_cost,
-            "timestamp": firestore.SERVER_TIMESTAMP,
-            "date": today
+            "average_cost": price
         }
-        batch.set(db.collection("trades").document(), trade_data)
-        
-        # 出来高更新
-        market_ref = db.collection("market_data").document(f"stock_{symbol}")
-        market_doc = market_ref.get()
-        if market_doc.exists:
-            current_volume = market_doc.to_dict().get("daily_volume", 0)
-            batch.update(market_ref, {"daily_volume": current_volume + shares})
-        
-        # バッチ実行
-        batch.commit()
-        
+    
+    transaction.set(portfolio_ref, {"holdings": holdings}, merge=True)
+    
+    # 取引ログ
+    today = datetime.datetime.utcnow().strftime("%Y-%m-%d")
+    trade_data = {
+        "user_id": user_id,
+        "symbol": symbol,
+        "type": "buy",
+        "shares": shares,
+        "price": price,
+        "total_amount": total_cost,
+        "timestamp": firestore.SERVER_TIMESTAMP,
+        "date": today
+    }
+    transaction.set(db.collection("trades").document(), trade_data)
+    
+    # 出来高更新
+    if market_doc.exists:
+        transaction.update(market_ref, {"daily_volume": firestore.Increment(shares)})
+    
+    return {"success": True, "balance": balance - total_cost}
+
+async def execute_stock_purchase(user_id: str, symbol: str, shares: int, price: float, total_cost: int) -> Dict:
+    """
+    株式購入実行
+    Returns:
+        Dict: success と購入後の残高（残高不足の場合は現在の残高、ユーザーが存在しない場合はNone）
+    """
+    try:
+        return await run_db(apply_stock_purchase, db.transaction(), user_id, symbol, shares, price, total_cost)
     except Exception as e:
         print(f"株式購入実行エラー: {e}")
         raise
 
-async def execute_stock_sale(user_id: str, symbol: str, shares: int, price: float, total_value: int) -> int:
-    """株式売却実行"""
+@firestore.transactional
+def apply_stock_sale(transaction, user_id: str, symbol: str, shares: int, price: float, total_value: int) -> Dict:
+    """株式売却（保有株数が足りる場合のみ増額し、ポートフォリオ・取引ログ・出来高を1トランザクションで確定）"""
+    user_ref = db.collection("users").document(user_id)
+    portfolio_ref = db.collection("portfolios").document(user_id)
+    market_ref = db.collection("market_data").document(f"stock_{symbol}")
+    
+    # 2ドキュメントを1回の読み取りで取得
+    docs = {doc.reference.path: doc for doc in transaction.get_all([portfolio_ref, market_ref])}
+    portfolio_doc = docs[portfolio_ref.path]
+    market_doc = docs[market_ref.path]
+    
+    holdings = portfolio_doc.to_dict().get("holdings", {}) if portfolio_doc.exists else {}
+    current_shares = holdings[symbol]["shares"] if symbol in holdings else 0
+    logger.debug(f"売却前のholdings: {holdings}")
+    if current_shares < shares:
+        return {"success": False, "shares": current_shares}
+    
+    # ユーザー残高増額
+    transaction.update(user_ref, {"balance": firestore.Increment(total_value)})
+    KraftLedger.post(transaction, user_id, total_value, SYSTEM_MARKET, f"stock_sell_{symbol}", db=db)
+    
+    # ポートフォリオ更新
+    remaining_shares = current_shares - shares
+    logger.debug(f"{symbol}: 現在{current_shares}株 → 売却{shares}株 → 残り{remaining_shares}株")
+    if remaining_shares <= 0:
+        # 全て売却した場合は該当銘柄を削除
+        del holdings[symbol]
+    else:
+        holdings[symbol]["shares"] = remaining_shares
+    transaction.update(portfolio_ref, {"holdings": holdings})
+    
+    # 取引ログ
+    today = datetime.datetime.utcnow().strftime("%Y-%m-%d")
+    trade_data = {
+        "user_id": user_id,
+        "symbol": symbol,
+        "type": "sell",
+        "shares": shares,
+        "price": price,
+        "total_amount": total_value,
+        "timestamp": firestore.SERVER_TIMESTAMP,
+        "date": today
+    }
+    transaction.set(db.collection("trades").document(), trade_data)
+    
+    # 出来高更新
+    if market_doc.exists:
+        transaction.update(market_ref, {"daily_volume": firestore.Increment(shares)})
+    
+    return {"success": True, "shares": remaining_shares}
+
+async def execute_stock_sale(user_id: str, symbol: str, shares: int, price: float, total_value: int) -> Dict:
+    """
+    株式売却実行
+    Returns:
+        Dict: success と売却後の保有株数（保有株数が足りない場合は現在の保有株数）
+    """
     try:
-        # トランザクション開始
-        batch = db.batch()
-        
-        # ユーザー残高増額
-        user_ref = db.collection("users").document(user_id)
-        user_doc = user_ref.get()
-        user_data = user_doc.to_dict()
-        new_balance = user_data["balance"] + total_value
-        batch.update(user_ref, {"balance": new_balance})
-        
-        # ポートフォリオ更新
-        portfolio_ref = db.collection("portfolios").document(user_id)
-        portfolio_doc = portfolio_ref.get()
-        
-        if portfolio_doc.exists:
-            holdings = portfolio_doc.to_dict().get("holdings", {})
-            print(f"[DEBUG] 売却前のholdings: {holdings}")
-            
-            if symbol in holdings:
-                # 現在の保有株数から売却株数を減算
-                current_shares = holdings[symbol]["shares"]
-                remaining_shares = current_shares - shares
-                print(f"[DEBUG] {symbol}: 現在{current_shares}株 → 売却{shares}株 → 残り{remaining_shares}株")
-                
-                if remaining_shares <= 0:
-                    # 全て売却した場合は該当銘柄を削除
-                    del holdings[symbol]
-                    print(f"[DEBUG] {symbol}を完全売却、ポートフォリオから削除")
-                else:
-                    # 残りがある場合は株数を更新
-                    holdings[symbol]["shares"] = remaining_shares
-                    print(f"[DEBUG] {symbol}の株数を{remaining_shares}株に更新")
-                
-                print(f"[DEBUG] 売却後のholdings: {holdings}")
-                batch.update(portfolio_ref, {"holdings": holdings})
-            else:
-                print(f"[DEBUG] エラー: {symbol}がポートフォリオに見つかりません")
-        
-        # 取引ログ
-        today = datetime.datetime.utcnow().strftime("%Y-%m-%d")
-        trade_data = {
-            "user_id": user_id,
-            "symbol": symbol,
-            "type": "sell",
-            "shares": shares,
-            "price": price,
-            "total_amount": total_value,
-            "timestamp": firestore.SERVER_TIMESTAMP,
-            "date": today
-        }
-        batch.set(db.collection("trades").document(), trade_data)
-        
-        # 出来高更新
-        market_ref = db.collection("market_data").document(f"stock_{symbol}")
-        market_doc = market_ref.get()
-        if market_doc.exists:
-            current_volume = market_doc.to_dict().get("daily_volume", 0)
-            batch.update(market_ref, {"daily_volume": current_volume + shares})
-        
-        # バッチ実行
-        print(f"[DEBUG] バッチ処理を実行中...")
-        batch.commit()
-        print(f"[DEBUG] バッチ処理完了: 残高{new_balance}KR")
-        
-        return new_balance
-        
+        return await run_db(apply_stock_sale, db.transaction(), user_id, symbol, shares, price, total_value)
     except Exception as e:
         print(f"株式売却実行エラー: {e}")
         raise
@@ -1103,7 +1115,7 @@ async def price_update_task():
         
         for symbol, stock_info in STOCK_DATA.items():
             doc_ref = market_ref.document(f"stock_{symbol}")
-            doc = doc_ref.get()
+            doc = await run_db(doc_ref.get)
             
             if not doc.exists:
                 continue
@@ -1144,7 +1156,7 @@ async def price_update_task():
                 "price_history": price_history
             }
             
-            doc_ref.update(update_data)
+            await run_db(doc_ref.update, update_data)
             
             print(f"株価更新: {symbol} = {new_price:.2f} KR ({daily_change_percent:+.2f}%)")
             
@@ -1160,7 +1172,7 @@ async def generate_market_news() -> str:
             try:
                 current_price = await get_current_stock_price(symbol)
                 market_ref = db.collection("market_data").document(f"stock_{symbol}")
-                market_doc = market_ref.get()
+                market_doc = await run_db(market_ref.get)
                 
                 if market_doc.exists:
                     market_data_dict = market_doc.to_dict()
@@ -1323,7 +1335,7 @@ async def apply_news_stock_effect(symbol: str, event_type: str, news_content: st
         
         # 株価を更新
         market_ref = db.collection("market_data").document(f"stock_{symbol}")
-        market_doc = market_ref.get()
+        market_doc = await run_db(market_ref.get)
         
         if market_doc.exists:
             market_data = market_doc.to_dict()
@@ -1345,7 +1357,7 @@ async def apply_news_stock_effect(symbol: str, event_type: str, news_content: st
                 price_history = price_history[-10:]
             
             # 最新の価格も更新
-            market_ref.update({
+            await run_db(market_ref.update, {
                 "current_price": new_price,
                 "price_history": price_history,
                 "last_updated": firestore.SERVER_TIMESTAMP
@@ -1361,7 +1373,7 @@ async def market_news_task():
     """市場ニュース・イベントタスク（2時間間隔、AI生成）"""
     try:
         if random.random() < 0.6:  # 60%の確率でニュース配信（頻度向上）
-            print("[DEBUG] 市場ニュース生成開始...")
+            logger.debug("市場ニュース生成開始...")
             news = await generate_market_news()
             
             # ニュースチャンネルに投稿
@@ -1377,11 +1389,11 @@ async def market_news_task():
                     embed.set_footer(text="KRAFT株式市場 | AI生成ニュース")
                     
                     await channel.send(embed=embed)
-                    print(f"[DEBUG] 市場ニュース配信成功: {news[:50]}...")
+                    logger.debug(f"市場ニュース配信成功: {news[:50]}...")
                 else:
-                    print(f"[DEBUG] ニュースチャンネルが見つかりません: {INVESTMENT_NEWS_CHANNEL_ID}")
+                    logger.warning(f"ニュースチャンネルが見つかりません: {INVESTMENT_NEWS_CHANNEL_ID}")
             else:
-                print("[DEBUG] ニュースチャンネルIDが設定されていません")
+                logger.warning("ニュースチャンネルIDが設定されていません")
             
             print(f"市場ニュース配信: {news}")
     
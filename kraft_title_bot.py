@@ -6,11 +6,15 @@ import discord
 from discord import app_commands
 from discord.ext import commands, tasks
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import firestore
+from shared.kraft_db import get_db, run_db
+from shared.kraft_user_record import UserRecord
+from shared.kraft_title_conditions import compile_title_conditions, build_field_index, titles_for_fields, month_key, QUERYABLE_FIELDS
 import datetime
 import asyncio
-from typing import Optional, Dict, Any, List, Set
+import heapq
+import time
+from typing import Optional, Dict, Any, List, Set, Iterable, Tuple
 import logging
 
 # 環境変数読み込み
@@ -25,10 +29,7 @@ if not TOKEN:
     exit(1)
 
 # Firebase初期化
-if not firebase_admin._apps:
-    cred = credentials.Certificate("config/firebase_credentials.json")
-    firebase_admin.initialize_app(cred)
-db = firestore.client()
+db = get_db()
 
 # ロギング設定
 logging.basicConfig(level=logging.INFO)
@@ -153,6 +154,532 @@ TITLE_CONDITIONS = {
     }
 }
 
+# 称号条件は起動時に1回だけコンパイル（判定時に文字列を解析しない）
+TITLE_PREDICATES = compile_title_conditions(TITLE_CONDITIONS)
+
+# フィールド -> 依存する称号（イベントで変更されたフィールドの称号のみ判定）
+TITLE_FIELD_INDEX = build_field_index(TITLE_PREDICATES)
+
+# イベントごとに変更されるフィールド
+EVENT_FIELDS = {
+    "message": ("monthly_messages", "active_channels"),
+    "quest_complete": ("completed_quests", "consecutive_quest_failures", "level"),
+    "quest_failure": ("consecutive_quest_failures",),
+    "donation": ("donation_total", "became_zero_by_donation"),
+    "transfer": ("transfer_total", "became_zero_by_transfer"),
+    "investment_profit": ("investment_profit",),
+    "investment_loss": ("became_zero_by_investment",)
+}
+
+# 称号チェック処理設定
+TITLE_CHECK_CONFIG = {
+    "worker_count": 4,        # 称号チェックワーカー数
+    "coalesce_window": 3.0,   # 同一ユーザーをチェックする最短間隔(秒)（その間のイベントは1回にまとめる）
+    "report_interval": 5      # 統計出力間隔(分)
+}
+
+# 全ユーザー称号チェック設定
+FORCE_CHECK_CONFIG = {
+    "page_size": 500,          # 1ページの読み取り件数（1ページの称号書き込みを1バッチで確定）
+    "role_concurrency": 5,     # ロール付与・通知の同時実行数
+    "progress_interval": 3.0   # 進捗メッセージの更新間隔(秒)
+}
+
+# 称号定義の差分判定設定
+TITLE_TABLE_CONFIG = {
+    "state_document": "title_bot_state/title_table"  # 前回起動時の称号定義の保存先
+}
+
+def find_new_titles(record: UserRecord, candidates: Iterable[str]) -> List[str]:
+    """
+    未取得の称号のうち条件を満たすものを返す
+    Args:
+        record: ユーザーデータ
+        candidates: 判定する称号名（TITLE_CONDITIONS の定義順）
+    Returns:
+        List[str]: 新しく獲得した称号
+    """
+    current_titles = set(record.titles)
+    new_titles = []
+    for title_name in candidates:
+        if title_name in current_titles:
+            continue  # 既に持っている称号はスキップ
+        
+        if TITLE_PREDICATES[title_name](record):
+            new_titles.append(title_name)
+            logger.info(f"称号付与: {record.user_id} -> {title_name}")
+    return new_titles
+
+class TitleCheckWorkSet:
+    """
+    ユーザー単位で重複をまとめる称号チェック待ち集合
+    同じユーザーのイベントは変更フィールドを合算して1件にまとめ、前回チェックから coalesce_window 秒経過後に取り出す
+    """
+    
+    def __init__(self, coalesce_window: float = None):
+        self.coalesce_window = coalesce_window if coalesce_window is not None else TITLE_CHECK_CONFIG["coalesce_window"]
+        self._pending: Dict[str, list] = {}       # user_id -> [変更フィールド（None は全称号）, 最初の受付時刻]
+        self._heap: List[tuple] = []               # (取り出し可能時刻, 受付順, user_id)
+        self._last_checked: Dict[str, float] = {}  # user_id -> 前回チェック開始時刻
+        self._in_flight: Set[str] = set()
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+        self.stats = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "processed": 0,
+            "errors": 0,
+            "max_depth": 0,
+            "total_lag": 0.0,
+            "max_lag": 0.0
+        }
+    
+    def __len__(self):
+        return len(self._pending)
+    
+    def add(self, user_id: str, fields: Optional[Iterable[str]] = None):
+        """
+        称号チェックを予約（予約済みのユーザーは変更フィールドを合算）
+        Args:
+            user_id: ユーザーID
+            fields: 変更されたフィールド（None は全称号をチェック）
+        """
+        now = time.monotonic()
+        self.stats["enqueued"] += 1
+        entry = self._pending.get(user_id)
+        if entry is not None:
+            self.stats["coalesced"] += 1
+            if entry[0] is not None:
+                if fields is None:
+                    entry[0] = None
+                else:
+                    entry[0].update(fields)
+            return
+        
+        self._pending[user_id] = [None if fields is None else set(fields), now]
+        ready_at = max(now, self._last_checked.get(user_id, 0.0) + self.coalesce_window)
+        self._seq += 1
+        heapq.heappush(self._heap, (ready_at, self._seq, user_id))
+        if len(self._pending) > self.stats["max_depth"]:
+            self.stats["max_depth"] = len(self._pending)
+        self._wakeup.set()
+    
+    async def take(self):
+        """
+        チェック可能になったユーザーを取り出す（なければ待機）
+        Returns:
+            Tuple[str, Optional[Set[str]]]: (ユーザーID, 変更フィールド)
+        """
+        while True:
+            now = time.monotonic()
+            if self._heap:
+                ready_at, _, user_id = self._heap[0]
+                if ready_at <= now:
+                    heapq.heappop(self._heap)
+                    if user_id in self._in_flight:
+                        # 別ワーカーがチェック中のユーザーは間隔を空けて再予約
+                        self._seq += 1
+                        heapq.heappush(self._heap, (now + self.coalesce_window, self._seq, user_id))
+                        continue
+                    fields, enqueued_at = self._pending.pop(user_id)
+                    self._in_flight.add(user_id)
+                    self._last_checked[user_id] = now
+                    lag = now - enqueued_at
+                    self.stats["total_lag"] += lag
+                    if lag > self.stats["max_lag"]:
+                        self.stats["max_lag"] = lag
+                    return user_id, fields
+                timeout = ready_at - now
+            else:
+                timeout = None
+            
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    def done(self, user_id: str, error: bool = False):
+        """チェック完了を記録"""
+        self._in_flight.discard(user_id)
+        self.stats["processed"] += 1
+        if error:
+            self.stats["errors"] += 1
+        # 間隔を過ぎたチェック時刻は不要（メモリを増やさない）
+        if len(self._last_checked) > 10000:
+            cutoff = time.monotonic() - self.coalesce_window
+            self._last_checked = {uid: t for uid, t in self._last_checked.items() if t > cutoff}
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """待ち件数・遅延などの統計情報"""
+        stats = dict(self.stats)
+        stats["depth"] = len(self._pending)
+        stats["in_flight"] = len(self._in_flight)
+        processed = stats["processed"]
+        stats["avg_lag"] = stats["total_lag"] / processed if processed > 0 else 0.0
+        if self._pending:
+            stats["oldest_wait"] = time.monotonic() - min(entry[1] for entry in self._pending.values())
+        else:
+            stats["oldest_wait"] = 0.0
+        return stats
+
+# 月次アクティビティ設定
+MONTHLY_ACTIVITY_CONFIG = {
+    "flush_interval": 10,  # 集計をFirestoreへ書き込む間隔(秒)
+    "batch_size": 500      # 1バッチで書き込むユーザー数
+}
+
+class MonthlyActivityAccumulator:
+    """
+    月間メッセージ数・発言チャンネルのメモリ内集計
+    メッセージごとには読み書きせず、一定間隔でユーザーごとに1回の加算（Increment / ArrayUnion）にまとめて書き込む
+    users/{id}.monthly_activity.{YYYY-MM} に記録するため、月が変わると自動的に新しいキーで集計される
+    """
+    
+    def __init__(self):
+        self._pending: Dict[str, Dict[str, list]] = {}  # user_id -> 月 -> [発言数, チャンネルIDの集合]
+        self._flushing: Dict[str, Dict[str, list]] = {}  # 書き込み中（コミット完了までは称号判定に反映する）
+        self._flush_lock = asyncio.Lock()
+        self.stats = {"messages": 0, "flushes": 0, "writes": 0, "errors": 0}
+    
+    def __len__(self):
+        return len(self._pending)
+    
+    def add(self, user_id: str, channel_id: int, now: datetime.datetime = None):
+        """メッセージ1件を集計（読み書きなし）"""
+        month = month_key(now)
+        counts = self._pending.setdefault(user_id, {}).setdefault(month, [0, set()])
+        counts[0] += 1
+        counts[1].add(str(channel_id))
+        self.stats["messages"] += 1
+    
+    def overlay(self, record: UserRecord):
+        """未書き込みの集計をユーザーデータに反映（称号判定用。変更としては記録しない）"""
+        sources = [pending for pending in (self._flushing.get(record.user_id), self._pending.get(record.user_id)) if pending]
+        if not sources:
+            return
+        activity = {month: dict(values) for month, values in (record.monthly_activity or {}).items()}
+        for pending in sources:
+            for month, (messages, channels) in pending.items():
+                current = activity.setdefault(month, {})
+                current["messages"] = current.get("messages", 0) + messages
+                current["channels"] = list(set(current.get("channels", [])) | channels)
+        record.apply({"monthly_activity": activity})
+    
+    def _merge_back(self, pending: Dict[str, Dict[str, list]]):
+        """書き込みに失敗した集計を戻す"""
+        for user_id, months in pending.items():
+            for month, (messages, channels) in months.items():
+                counts = self._pending.setdefault(user_id, {}).setdefault(month, [0, set()])
+                counts[0] += messages
+                counts[1].update(channels)
+    
+    async def flush(self) -> int:
+        """
+        集計をFirestoreへ書き込み（定期タスクと終了時の書き込みが重ならないよう直列化）
+        Returns:
+            int: 書き込んだユーザー数
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            # コミットが完了するまでは書き込み中として保持し、成功したチャンクだけ取り除く
+            self._flushing, self._pending = self._pending, {}
+            items = list(self._flushing.items())
+            written = 0
+            batch_size = MONTHLY_ACTIVITY_CONFIG["batch_size"]
+            try:
+                for start in range(0, len(items), batch_size):
+                    chunk = items[start:start + batch_size]
+                    batch = db.batch()
+                    for user_id, months in chunk:
+                        batch.set(db.collection("users").document(user_id), {"monthly_activity": {
+                            month: {
+                                "messages": firestore.Increment(messages),
+                                "channels": firestore.ArrayUnion(sorted(channels))
+                            } for month, (messages, channels) in months.items()
+                        }}, merge=True)
+                    try:
+                        await run_db(batch.commit)
+                    except Exception as e:
+                        self.stats["errors"] += 1
+                        logger.error(f"月間アクティビティ書き込みエラー: {e}")
+                        break
+                    for user_id, _ in chunk:
+                        del self._flushing[user_id]
+                    written += len(chunk)
+            finally:
+                # 書き込めなかった集計（キャンセル時を含む）は次回に持ち越す
+                self._merge_back(self._flushing)
+                self._flushing = {}
+            self.stats["flushes"] += 1
+            self.stats["writes"] += written
+            return written
+
+class GuildRoleCache:
+    """
+    ギルドごとのロール名 -> ロール と、ユーザー -> 所属ギルド の索引
+    起動時に作成し、ロール・メンバーのイベントで更新する（付与時に一覧の線形探索やREST呼び出しをしない）
+    """
+    
+    def __init__(self):
+        self._roles: Dict[int, Dict[str, Any]] = {}     # guild_id -> ロール名 -> ロール
+        self._member_guilds: Dict[int, Set[int]] = {}   # user_id -> guild_id の集合
+    
+    def build(self, guilds):
+        """全ギルドの索引を作成"""
+        self._roles.clear()
+        self._member_guilds.clear()
+        for guild in guilds:
+            self.add_guild(guild)
+    
+    def add_guild(self, guild):
+        self.rebuild_roles(guild)
+        for member in guild.members:
+            self.add_member(guild.id, member.id)
+    
+    def remove_guild(self, guild):
+        self._roles.pop(guild.id, None)
+        for guild_ids in self._member_guilds.values():
+            guild_ids.discard(guild.id)
+    
+    def rebuild_roles(self, guild):
+        """ギルドのロール名索引を作り直す（同名ロールは一覧の先頭を優先）"""
+        roles = {}
+        for role in guild.roles:
+            roles.setdefault(role.name, role)
+        self._roles[guild.id] = roles
+    
+    def add_member(self, guild_id: int, user_id: int):
+        self._member_guilds.setdefault(user_id, set()).add(guild_id)
+    
+    def remove_member(self, guild_id: int, user_id: int):
+        guild_ids = self._member_guilds.get(user_id)
+        if guild_ids is not None:
+            guild_ids.discard(guild_id)
+            if not guild_ids:
+                del self._member_guilds[user_id]
+    
+    def get_role(self, guild_id: int, role_name: str):
+        return self._roles.get(guild_id, {}).get(role_name)
+    
+    def guilds_of(self, user_id: int) -> Set[int]:
+        """ユーザーが所属するギルドID"""
+        return self._member_guilds.get(user_id, set())
+
+# 称号獲得通知設定
+NOTIFICATION_CONFIG = {
+    "max_embeds_per_message": 10,  # 1メッセージにまとめるユーザー数（Discordの埋め込み上限）
+    "gather_delay": 0.5,           # 最初の通知を受け付けてから送信までにまとめる待ち時間(秒)
+    "max_fields_per_embed": 25,    # 1ユーザーの埋め込みに載せる称号数の上限
+    "max_message_chars": 6000,     # 1メッセージの埋め込み合計文字数の上限
+    "max_retries": 3,              # 送信失敗時の再試行回数
+    "channel_retry_interval": 30   # 通知チャンネルが取得できない場合に通知を保持したまま再取得するまでの間隔(秒)
+}
+
+class TitleNotificationDispatcher:
+    """
+    称号獲得通知の送信キュー
+    1回のチェックで獲得した称号はユーザーごとに1つの埋め込みにまとめ、複数ユーザー分を1メッセージで送信する
+    送信は1タスクから順番に行い、間隔はdiscord.pyのレート制限処理（レスポンスヘッダーの残数・リセット時間）に任せる
+    """
+    
+    def __init__(self, bot: "KraftTitleBot"):
+        self.bot = bot
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"enqueued": 0, "messages": 0, "embeds": 0, "titles": 0, "rate_limited": 0, "failures": 0,
+                      "channel_missing": 0}
+    
+    def __len__(self):
+        return self._queue.qsize()
+    
+    def enqueue(self, user_id: str, titles: List[str]):
+        """ユーザーが獲得した称号の通知を予約"""
+        if titles:
+            self._queue.put_nowait((user_id, list(titles)))
+            self.stats["enqueued"] += 1
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    def build_embed(self, user_id: str, titles: List[str]) -> discord.Embed:
+        """ユーザー1人分の称号獲得通知"""
+        user = self.bot.get_user(int(user_id))
+        mention = user.mention if user else f"<@{user_id}>"
+        title_text = "、".join(f"**『{title_name}』**" for title_name in titles)
+        
+        embed = discord.Embed(
+            title="🎉 新しい称号を獲得しました！",
+            description=f"{mention} が称号 {title_text} を獲得しました！",
+            color=discord.Color.gold()
+        )
+        for title_name in titles[:NOTIFICATION_CONFIG["max_fields_per_embed"]]:
+            title_info = TITLE_CONDITIONS.get(title_name, {})
+            embed.add_field(
+                name=f"📋 {title_name}",
+                value=f"カテゴリ: {title_info.get('category', '不明')}\n条件: {title_info.get('description', '')}",
+                inline=False
+            )
+        if user:
+            embed.set_thumbnail(url=user.display_avatar.url)
+        embed.set_footer(text="KRAFT 称号システム")
+        return embed
+    
+    async def _next_batch(self) -> List[tuple]:
+        """送信待ちの通知を1メッセージ分まとめて取り出す（同じユーザーの通知は結合）"""
+        first = await self._queue.get()
+        if NOTIFICATION_CONFIG["gather_delay"] > 0 and self._queue.qsize() < NOTIFICATION_CONFIG["max_embeds_per_message"]:
+            await asyncio.sleep(NOTIFICATION_CONFIG["gather_delay"])
+        
+        merged: Dict[str, List[str]] = {first[0]: first[1]}
+        while len(merged) < NOTIFICATION_CONFIG["max_embeds_per_message"] and not self._queue.empty():
+            user_id, titles = self._queue.get_nowait()
+            current = merged.setdefault(user_id, [])
+            for title in titles:
+                if title not in current:
+                    current.append(title)
+        return list(merged.items())
+    
+    async def _send(self, channel, embeds: List[discord.Embed]) -> bool:
+        for attempt in range(NOTIFICATION_CONFIG["max_retries"] + 1):
+            try:
+                await channel.send(embeds=embeds)
+                return True
+            except discord.HTTPException as e:
+                if e.status != 429 or attempt == NOTIFICATION_CONFIG["max_retries"]:
+                    raise
+                # discord.pyの待機で吸収できなかった429のみ、指定された時間だけ待って再送
+                self.stats["rate_limited"] += 1
+                retry_after = getattr(e, "retry_after", None) or float(e.response.headers.get("Retry-After", 1))
+                await asyncio.sleep(retry_after)
+        return False
+    
+    async def _get_channel(self):
+        """通知チャンネルを取得（キャッシュにない場合はAPIから取得）"""
+        channel = self.bot.get_channel(self.bot.notification_channel_id)
+        if channel:
+            return channel
+        try:
+            return await self.bot.fetch_channel(self.bot.notification_channel_id)
+        except discord.HTTPException as e:
+            logger.debug(f"称号通知チャンネル取得エラー ({self.bot.notification_channel_id}): {e}")
+            return None
+    
+    async def _wait_for_channel(self):
+        """通知チャンネルが取得できるまで待機（取り出した通知は破棄せず保持したまま再試行）"""
+        while True:
+            channel = await self._get_channel()
+            if channel:
+                return channel
+            self.stats["channel_missing"] += 1
+            logger.warning(f"称号通知チャンネルが見つかりません ({self.bot.notification_channel_id})。"
+                           f"{NOTIFICATION_CONFIG['channel_retry_interval']}秒後に再試行します（待機 {len(self)}件）")
+            await asyncio.sleep(NOTIFICATION_CONFIG["channel_retry_interval"])
+    
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                channel = await self._wait_for_channel()
+                embeds = [self.build_embed(user_id, titles) for user_id, titles in batch]
+                
+                # 埋め込みの合計文字数の上限を超えない単位で送信
+                group, group_chars = [], 0
+                for embed in embeds:
+                    if group and group_chars + len(embed) > NOTIFICATION_CONFIG["max_message_chars"]:
+                        await self._send(channel, group)
+                        self.stats["messages"] += 1
+                        group, group_chars = [], 0
+                    group.append(embed)
+                    group_chars += len(embed)
+                await self._send(channel, group)
+                self.stats["messages"] += 1
+                self.stats["embeds"] += len(embeds)
+                self.stats["titles"] += sum(len(titles) for _, titles in batch)
+            except Exception as e:
+                self.stats["failures"] += 1
+                logger.error(f"称号通知送信エラー: {e}")
+
+# 称号イベント（title_events）読み込み設定
+TITLE_EVENT_CONFIG = {
+    "collection": "title_events",
+    "page_size": 200,      # 1回に読み込むイベント数（イベントごとの更新と削除を1バッチで確定するため250以下）
+    "poll_interval": 5     # 新しいイベントがない場合の確認間隔(秒)
+}
+
+class TitleEventConsumer:
+    """
+    title_events に残っている最も古いイベントからページ単位で読み込み、称号チェックの処理へ渡す
+    1ページ処理するごとにユーザーデータの更新と処理済みイベントの削除を1バッチで確定する（残っているイベントが未処理分のため読み込み位置は持たない）
+    timestamp は各プロセスの時刻で付けられるため、遅れて書き込まれたイベントも次のページ以降で必ず読み込まれる
+    """
+    
+    def __init__(self, bot: "KraftTitleBot"):
+        self.bot = bot
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"processed": 0, "pages": 0, "errors": 0}
+    
+    @property
+    def events_ref(self):
+        return db.collection(TITLE_EVENT_CONFIG["collection"])
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def consume_page(self) -> int:
+        """
+        未処理のイベントを1ページ分処理して削除
+        イベントによるユーザーデータの更新と処理済みイベントの削除は1バッチで確定する
+        （コミットに失敗した場合はどちらも反映されないため、再読み込みしても加算が二重にならない）
+        処理に失敗したイベントは削除せず、次のページで再処理する
+        Returns:
+            int: 処理したイベント数
+        """
+        query = self.events_ref.order_by("timestamp").limit(TITLE_EVENT_CONFIG["page_size"])
+        event_docs = await run_db(query.get)
+        if not event_docs:
+            return 0
+        
+        batch = db.batch()
+        checks = []
+        processed = 0
+        for event_doc in event_docs:
+            try:
+                check = await self.bot.handle_title_event(event_doc.to_dict(), batch)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"称号イベント処理エラー ({event_doc.id}): {e}")
+                continue
+            batch.delete(event_doc.reference)
+            processed += 1
+            if check:
+                checks.append(check)
+        if not processed:
+            return 0
+        await run_db(batch.commit)
+        self.stats["processed"] += processed
+        
+        # 称号チェックは更新の確定後に予約（確定前のデータで判定しない）
+        for user_id, fields in checks:
+            self.bot.title_checks.add(user_id, fields)
+        self.stats["pages"] += 1
+        return processed
+    
+    async def _run(self):
+        while True:
+            try:
+                count = await self.consume_page()
+            except Exception as e:
+                count = 0
+                self.stats["errors"] += 1
+                logger.error(f"称号イベント読み込みエラー: {e}")
+            # 溜まっている間は続けて読み込み、追いついたら一定間隔で確認
+            if count < TITLE_EVENT_CONFIG["page_size"]:
+                await asyncio.sleep(TITLE_EVENT_CONFIG["poll_interval"])
+
 class KraftTitleBot(commands.Bot):
     """KRAFT称号システムメインクラス"""
     
@@ -161,13 +688,37 @@ class KraftTitleBot(commands.Bot):
         intents.message_content = True
         intents.members = True
         super().__init__(command_prefix='!title_', intents=intents)
-        self.title_check_queue = asyncio.Queue()
+        self.title_checks = TitleCheckWorkSet()
+        self.monthly_activity = MonthlyActivityAccumulator()
+        self.role_cache = GuildRoleCache()
+        self.notifications = TitleNotificationDispatcher(self)
+        self.event_consumer = TitleEventConsumer(self)
+        self.title_table_task: Optional[asyncio.Task] = None
+        self.title_check_workers: List[asyncio.Task] = []
         self.notification_channel_id = 1352859030715891782  # 称号獲得のお知らせチャンネル
     
     async def on_ready(self):
         """Bot起動時処理"""
         print(f'🏅 KRAFT称号システム {self.user.name} が稼働開始しました')
         
+        # ロール・メンバー索引作成
+        self.role_cache.build(self.guilds)
+        
+        # 称号チェックワーカー・通知送信タスク起動
+        self.start_title_check_workers()
+        self.notifications.start()
+        
+        # 他のBotからの称号イベント（title_events）の読み込み開始
+        self.event_consumer.start()
+        
+        # 追加・変更された称号のみ全ユーザーを再判定
+        if self.title_table_task is None:
+            self.title_table_task = asyncio.create_task(self.sync_title_table())
+        if not self.title_check_report.is_running():
+            self.title_check_report.start()
+        if not self.monthly_activity_flush.is_running():
+            self.monthly_activity_flush.start()
+        
         # コマンド登録
         self.tree.command(name="称号強制チェック", description="全ユーザーの称号を強制チェックします（管理者専用）")(force_title_check_cmd)
         
@@ -185,37 +736,65 @@ class KraftTitleBot(commands.Bot):
             import traceback
             traceback.print_exc()
     
+    # =====================================
+    # ロール・メンバー索引の更新
+    # =====================================
+    
+    async def on_guild_join(self, guild: discord.Guild):
+        self.role_cache.add_guild(guild)
+    
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.role_cache.remove_guild(guild)
+    
+    async def on_guild_role_create(self, role: discord.Role):
+        self.role_cache.rebuild_roles(role.guild)
+    
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        if before.name != after.name or before.position != after.position:
+            self.role_cache.rebuild_roles(after.guild)
+    
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.role_cache.rebuild_roles(role.guild)
+    
+    async def on_member_join(self, member: discord.Member):
+        self.role_cache.add_member(member.guild.id, member.id)
+    
+    async def on_member_remove(self, member: discord.Member):
+        self.role_cache.remove_member(member.guild.id, member.id)
+    
     # =====================================
     # 称号チェック・付与システム
     # =====================================
     
-    async def check_user_titles(self, user_id: str) -> List[str]:
-        """ユーザーの称号条件をチェック"""
+    async def check_user_titles(self, user_id: str, changed_fields: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        ユーザーの称号条件をチェック
+        Args:
+            user_id: ユーザーID
+            changed_fields: 変更されたフィールド（指定時は依存する称号のみ判定、省略時は全称号）
+        Returns:
+            List[str]: 新しく獲得した称号
+        """
         try:
+            if changed_fields is None:
+                candidates = list(TITLE_PREDICATES)
+            else:
+                candidates = titles_for_fields(TITLE_PREDICATES, TITLE_FIELD_INDEX, changed_fields)
+                if not candidates:
+                    return []
+            
             user_ref = db.collection("users").document(user_id)
-            user_doc = user_ref.get()
+            record = UserRecord.from_snapshot(await run_db(user_ref.get))
             
-            if not user_doc.exists:
+            if record is None:
                 return []
             
-            user_data = user_doc.to_dict()
-            current_titles = set(user_data.get("titles", []))
-            new_titles = []
-            
-            # 各称号の条件をチェック
-            for title_name, title_info in TITLE_CONDITIONS.items():
-                if title_name in current_titles:
-                    continue  # 既に持っている称号はスキップ
-                
-                if await self.evaluate_condition(title_info["condition"], user_data):
-                    current_titles.add(title_name)
-                    new_titles.append(title_name)
-                    logger.info(f"称号付与: {user_id} -> {title_name}")
+            self.monthly_activity.overlay(record)
+            new_titles = find_new_titles(record, candidates)
             
-            # 新しい称号があれば保存
+            # 新しい称号があれば追加（他のプロセスが同時に付与した称号を上書きせず、既存の順序も維持）
             if new_titles:
-                user_data["titles"] = list(current_titles)
-                user_ref.set(user_data, merge=True)
+                await run_db(user_ref.update, {"titles": firestore.ArrayUnion(new_titles)})
             
             return new_titles
             
@@ -223,30 +802,143 @@ class KraftTitleBot(commands.Bot):
             logger.error(f"称号チェックエラー ({user_id}): {e}")
             return []
     
-    async def evaluate_condition(self, condition: str, user_data: Dict[str, Any]) -> bool:
-        """称号条件の評価"""
-        try:
-            # 安全な評価のため、限定された変数のみ使用
-            safe_vars = {
-                "level": user_data.get("level", 1),
-                "monthly_messages": user_data.get("monthly_messages", 0),
-                "active_channels": len(user_data.get("active_channels", [])),
-                "completed_quests": user_data.get("completed_quests", 0),
-                "consecutive_quest_failures": user_data.get("consecutive_quest_failures", 0),
-                "donation_total": user_data.get("donation_total", 0),
-                "transfer_total": user_data.get("transfer_total", 0),
-                "investment_profit": user_data.get("investment_profit", 0),
-                "became_zero_by_donation": user_data.get("became_zero_by_donation", False),
-                "became_zero_by_investment": user_data.get("became_zero_by_investment", False),
-                "became_zero_by_transfer": user_data.get("became_zero_by_transfer", False)
-            }
+    async def scan_and_grant(self, query, candidates: List[str], result: Dict[str, int],
+                             grant_tasks: List[asyncio.Task], semaphore: asyncio.Semaphore, progress=None):
+        """
+        クエリ結果をページ単位で読み取り、読み取ったデータで称号を判定して付与
+        Args:
+            query: 対象ユーザーのクエリ（並び順はクエリ側で指定）
+            candidates: 判定する称号名
+            result: 集計（users / new_titles / batches を加算）
+            grant_tasks: ロール付与・通知タスクの追加先
+            semaphore: ロール付与の同時実行数
+            progress: ページごとに途中結果を渡して呼び出すコルーチン関数
+        """
+        page_size = FORCE_CHECK_CONFIG["page_size"]
+        cursor = None
+        
+        while True:
+            page_query = query.limit(page_size)
+            if cursor is not None:
+                page_query = page_query.start_after(cursor)
+            user_docs = await run_db(page_query.get)
+            if not user_docs:
+                break
             
-            # 条件評価
-            return eval(condition, {"__builtins__": {}}, safe_vars)
+            # 新しい称号はページ単位で1バッチにまとめて追加
+            batch = db.batch()
+            awarded = []
+            for user_doc in user_docs:
+                record = UserRecord.from_snapshot(user_doc)
+                self.monthly_activity.overlay(record)
+                new_titles = find_new_titles(record, candidates)
+                if new_titles:
+                    batch.update(user_doc.reference, {"titles": firestore.ArrayUnion(new_titles)})
+                    awarded.append((user_doc.id, new_titles))
+            if awarded:
+                await run_db(batch.commit)
+                result["batches"] += 1
             
-        except Exception as e:
-            logger.error(f"条件評価エラー: {condition} - {e}")
-            return False
+            # ロール付与・通知は同時実行数を制限して並行処理
+            for user_id, new_titles in awarded:
+                grant_tasks.append(asyncio.create_task(self.grant_titles(user_id, new_titles, semaphore)))
+            
+            result["users"] += len(user_docs)
+            result["new_titles"] += sum(len(new_titles) for _, new_titles in awarded)
+            if progress is not None:
+                await progress(result)
+            
+            if len(user_docs) < page_size:
+                break
+            cursor = user_docs[-1]
+    
+    async def run_full_title_check(self, progress=None) -> Dict[str, int]:
+        """
+        全ユーザーの称号をチェック（users を1回だけページ単位で読み取り、読み取ったデータで判定）
+        Args:
+            progress: ページごとに途中結果を渡して呼び出すコルーチン関数
+        Returns:
+            Dict[str, int]: チェックしたユーザー数・新規称号数・書き込みバッチ数
+        """
+        semaphore = asyncio.Semaphore(FORCE_CHECK_CONFIG["role_concurrency"])
+        grant_tasks = []
+        result = {"users": 0, "new_titles": 0, "batches": 0}
+        await self.scan_and_grant(db.collection("users"), list(TITLE_PREDICATES), result, grant_tasks, semaphore, progress)
+        if grant_tasks:
+            await asyncio.gather(*grant_tasks)
+        return result
+    
+    async def recompute_titles(self, title_names: List[str]) -> Dict[str, int]:
+        """
+        指定した称号だけを全ユーザーについて判定
+        「フィールド 比較 定数」の条件は範囲クエリで該当ユーザーのみ読み取り、それ以外は1回の全件読み取りでまとめて判定
+        Returns:
+            Dict[str, int]: 読み取ったユーザー数・新規称号数・書き込みバッチ数・範囲クエリ/全件読み取りした称号数
+        """
+        users_ref = db.collection("users")
+        semaphore = asyncio.Semaphore(FORCE_CHECK_CONFIG["role_concurrency"])
+        grant_tasks = []
+        result = {"users": 0, "new_titles": 0, "batches": 0, "range_queries": 0, "scanned_titles": 0}
+        default_record = UserRecord.new("")
+        
+        scan_titles = []
+        for title_name in title_names:
+            condition = TITLE_PREDICATES[title_name]
+            comparison = condition.comparison
+            # フィールドがないユーザーは範囲クエリに含まれないため、既定値で条件を満たす称号は全件判定
+            if comparison and comparison[0] in QUERYABLE_FIELDS and not condition(default_record):
+                field, op, value = comparison
+                query = users_ref.where(field, op, value)
+                if op not in ("==", "!="):
+                    query = query.order_by(field)
+                await self.scan_and_grant(query, [title_name], result, grant_tasks, semaphore)
+                result["range_queries"] += 1
+            else:
+                scan_titles.append(title_name)
+        
+        if scan_titles:
+            await self.scan_and_grant(users_ref, scan_titles, result, grant_tasks, semaphore)
+            result["scanned_titles"] = len(scan_titles)
+        
+        if grant_tasks:
+            await asyncio.gather(*grant_tasks)
+        return result
+    
+    async def sync_title_table(self) -> Optional[Dict[str, Any]]:
+        """
+        称号定義をFirestoreに保存した前回の定義と比較し、追加・変更された称号だけを再判定
+        初回は現在の定義を保存するのみ（既存の称号はイベント・強制チェックで判定済みとみなす）
+        Returns:
+            Optional[Dict]: 再判定した称号と結果（変更がなければNone）
+        """
+        state_ref = db.document(TITLE_TABLE_CONFIG["state_document"])
+        current = {title_name: condition.source for title_name, condition in TITLE_PREDICATES.items()}
+        state_doc = await run_db(state_ref.get)
+        
+        changed = []
+        if state_doc.exists:
+            previous = state_doc.to_dict().get("conditions", {})
+            changed = [title_name for title_name, source in current.items() if previous.get(title_name) != source]
+            if not changed and set(previous) == set(current):
+                return None
+        
+        result = None
+        if changed:
+            logger.info(f"称号定義の変更を検出: {changed}")
+            result = await self.recompute_titles(changed)
+            result["titles"] = changed
+            logger.info(f"称号再判定完了: {result}")
+        
+        # 再判定が完了してから保存（途中で停止した場合は次回起動時に再実行）
+        await run_db(state_ref.set, {"conditions": current, "updated_at": firestore.SERVER_TIMESTAMP})
+        return result
+    
+    async def grant_titles(self, user_id: str, titles: List[str], semaphore: asyncio.Semaphore):
+        """称号のロール付与と通知"""
+        async with semaphore:
+            for title in titles:
+                await self.assign_discord_role(user_id, title)
+        self.notifications.enqueue(user_id, titles)
     
     async def assign_discord_role(self, user_id: str, title_name: str) -> bool:
         """Discordロールを付与"""
@@ -255,11 +947,12 @@ class KraftTitleBot(commands.Bot):
             if not title_info:
                 return False
             
-            # 全ギルドでロール付与を試行
-            for guild in self.guilds:
-                member = guild.get_member(int(user_id))
+            # ユーザーが所属するギルドでロール付与を試行
+            for guild_id in list(self.role_cache.guilds_of(int(user_id))):
+                guild = self.get_guild(guild_id)
+                member = guild.get_member(int(user_id)) if guild else None
                 if member:
-                    role = discord.utils.get(guild.roles, name=title_info["role_name"])
+                    role = self.role_cache.get_role(guild_id, title_info["role_name"])
                     if role and role not in member.roles:
                         await member.add_roles(role)
                         logger.info(f"ロール付与: {member.name} -> {title_info['role_name']}")
@@ -271,205 +964,169 @@ class KraftTitleBot(commands.Bot):
             logger.error(f"ロール付与エラー: {e}")
             return False
     
-    async def send_title_notification(self, user_id: str, title_name: str):
-        """称号獲得通知を送信"""
-        try:
-            channel = self.get_channel(self.notification_channel_id)
-            if not channel:
-                return
-            
-            # ユーザー取得
-            user = self.get_user(int(user_id))
-            if not user:
-                user = await self.fetch_user(int(user_id))
-            
-            if not user:
-                return
-            
-            title_info = TITLE_CONDITIONS.get(title_name, {})
-            description = title_info.get("description", "")
-            category = title_info.get("category", "不明")
-            
-            embed = discord.Embed(
-                title="🎉 新しい称号を獲得しました！",
-                description=f"{user.mention} が称号 **『{title_name}』** を獲得しました！",
-                color=discord.Color.gold()
-            )
-            
-            embed.add_field(
-                name="📋 詳細",
-                value=f"カテゴリ: {category}\n条件: {description}",
-                inline=False
-            )
-            
-            embed.set_thumbnail(url=user.display_avatar.url)
-            embed.set_footer(text="KRAFT 称号システム")
-            
-            await channel.send(embed=embed)
-            
-        except Exception as e:
-            logger.error(f"称号通知送信エラー: {e}")
-    
     # =====================================
     # イベント監視システム
     # =====================================
     
-    async def on_message_event(self, user_id: str, message: discord.Message):
-        """メッセージイベント処理"""
-        try:
-            # 月間メッセージ数更新
-            await self.update_monthly_activity(user_id, message.channel.id)
-            
-            # 称号チェックをキューに追加
-            await self.title_check_queue.put(("message", user_id))
-            
-        except Exception as e:
-            logger.error(f"メッセージイベント処理エラー: {e}")
-    
-    async def on_quest_complete_event(self, user_id: str):
-        """クエスト完了イベント処理"""
-        try:
-            # 連続失敗カウンターリセット
-            user_ref = db.collection("users").document(user_id)
-            user_ref.update({"consecutive_quest_failures": 0})
-            
-            # 称号チェックをキューに追加
-            await self.title_check_queue.put(("quest_complete", user_id))
-            
-        except Exception as e:
-            logger.error(f"クエスト完了イベント処理エラー: {e}")
+    async def handle_title_event(self, event: Dict[str, Any], writer=None) -> Optional[Tuple[str, Optional[Tuple[str, ...]]]]:
+        """
+        title_events のイベントを種類ごとの処理へ振り分け（処理エラーは呼び出し側へ送出）
+        Args:
+            event: {"user_id", "type", "data", "timestamp"}（KraftAPI.log_title_event の形式）
+            writer: WriteBatch（指定した場合はユーザーデータの更新を追加するだけで、コミットと称号チェックの予約は呼び出し側）
+        Returns:
+            Optional[Tuple]: (ユーザーID, 変更されたフィールド)。対象ユーザーがない場合はNone
+        """
+        user_id = str(event.get("user_id", ""))
+        if not user_id:
+            return None
+        event_type = event.get("type")
+        data = event.get("data") or {}
+        
+        if event_type == "message":
+            fields = await self.on_message_event(user_id, channel_id=data.get("channel_id"), writer=writer)
+        elif event_type == "quest_complete":
+            fields = await self.on_quest_complete_event(user_id, writer=writer)
+        elif event_type == "quest_failure":
+            fields = await self.on_quest_failure_event(user_id, writer=writer)
+        elif event_type in ("donation", "transfer", "investment_profit", "investment_loss"):
+            fields = await self.on_economic_event(user_id, event_type, int(data.get("amount", 0)),
+                                                  bool(data.get("resulted_in_zero", False)), writer=writer)
+        elif event_type == "level_up":
+            fields = ("level",)
+        else:
+            # 種類の分からないイベントは全称号をチェック
+            fields = None
+        
+        if writer is None:
+            self.title_checks.add(user_id, fields)
+        return user_id, fields
     
-    async def on_quest_failure_event(self, user_id: str):
-        """クエスト失敗イベント処理"""
-        try:
-            # 連続失敗カウンター増加
-            user_ref = db.collection("users").document(user_id)
-            user_doc = user_ref.get()
-            user_data = user_doc.to_dict() if user_doc.exists else {}
-            
-            consecutive_failures = user_data.get("consecutive_quest_failures", 0) + 1
-            user_ref.update({"consecutive_quest_failures": consecutive_failures})
-            
-            # 称号チェックをキューに追加
-            await self.title_check_queue.put(("quest_failure", user_id))
-            
-        except Exception as e:
-            logger.error(f"クエスト失敗イベント処理エラー: {e}")
+    async def _write_user(self, user_id: str, update_data: Dict[str, Any], writer=None):
+        """ユーザーデータをマージ更新（writer を指定した場合はバッチに追加するだけ）"""
+        user_ref = db.collection("users").document(user_id)
+        if writer is not None:
+            writer.set(user_ref, update_data, merge=True)
+        else:
+            await run_db(user_ref.set, update_data, merge=True)
     
-    async def on_economic_event(self, user_id: str, event_type: str, amount: int, resulted_in_zero: bool = False):
-        """経済イベント処理（寄付・送金・投資）"""
-        try:
-            user_ref = db.collection("users").document(user_id)
-            user_doc = user_ref.get()
-            user_data = user_doc.to_dict() if user_doc.exists else {}
-            
-            # イベントタイプ別の処理
-            if event_type == "donation":
-                user_data["donation_total"] = user_data.get("donation_total", 0) + amount
-                if resulted_in_zero:
-                    user_data["became_zero_by_donation"] = True
-            elif event_type == "transfer":
-                user_data["transfer_total"] = user_data.get("transfer_total", 0) + amount
-                if resulted_in_zero:
-                    user_data["became_zero_by_transfer"] = True
-            elif event_type == "investment_profit":
-                user_data["investment_profit"] = user_data.get("investment_profit", 0) + amount
-            elif event_type == "investment_loss" and resulted_in_zero:
-                user_data["became_zero_by_investment"] = True
-            
-            user_ref.set(user_data, merge=True)
-            
-            # 称号チェックをキューに追加
-            await self.title_check_queue.put(("economic", user_id))
-            
-        except Exception as e:
-            logger.error(f"経済イベント処理エラー: {e}")
+    async def on_message_event(self, user_id: str, message: Optional[discord.Message] = None,
+                               channel_id: Optional[int] = None, writer=None) -> Tuple[str, ...]:
+        """
+        メッセージイベント処理
+        writer を指定した場合は月間アクティビティの加算をイベントの削除と同じバッチで書き込み、
+        指定しない場合はメモリ内で集計して一定間隔でまとめて書き込む
+        """
+        if message is not None:
+            channel_id = message.channel.id
+        if channel_id is not None:
+            if writer is not None:
+                await self._write_user(user_id, {"monthly_activity": {month_key(): {
+                    "messages": firestore.Increment(1),
+                    "channels": firestore.ArrayUnion([str(channel_id)])
+                }}}, writer)
+            else:
+                self.monthly_activity.add(user_id, channel_id)
+        return EVENT_FIELDS["message"]
     
-    # =====================================
-    # ユーティリティメソッド
-    # =====================================
+    async def on_quest_complete_event(self, user_id: str, writer=None) -> Tuple[str, ...]:
+        """クエスト完了イベント処理（連続失敗カウンターリセット）"""
+        await self._write_user(user_id, {"consecutive_quest_failures": 0}, writer)
+        return EVENT_FIELDS["quest_complete"]
     
-    async def update_monthly_activity(self, user_id: str, channel_id: int):
-        """月間アクティビティ更新"""
-        try:
-            user_ref = db.collection("users").document(user_id)
-            user_doc = user_ref.get()
-            user_data = user_doc.to_dict() if user_doc.exists else {}
-            
-            now = datetime.datetime.utcnow()
-            last_reset = user_data.get("last_monthly_reset", "2025-01-01T00:00:00")
-            
-            try:
-                last_reset_date = datetime.datetime.fromisoformat(last_reset)
-            except ValueError:
-                last_reset_date = datetime.datetime.strptime(last_reset, "%Y-%m-%dT%H:%M:%S")
-            
-            # 月が変わっていればリセット
-            if now.month != last_reset_date.month or now.year != last_reset_date.year:
-                user_data["monthly_messages"] = 0
-                user_data["active_channels"] = []
-                user_data["last_monthly_reset"] = now.isoformat()
-            
-            # 月間メッセージ数増加
-            user_data["monthly_messages"] = user_data.get("monthly_messages", 0) + 1
-            
-            # アクティブチャンネル追加
-            active_channels = set(user_data.get("active_channels", []))
-            active_channels.add(str(channel_id))
-            user_data["active_channels"] = list(active_channels)
-            
-            user_ref.set(user_data, merge=True)
-            
-        except Exception as e:
-            logger.error(f"月間アクティビティ更新エラー: {e}")
+    async def on_quest_failure_event(self, user_id: str, writer=None) -> Tuple[str, ...]:
+        """クエスト失敗イベント処理（連続失敗カウンターを読み取りなしでアトミック加算）"""
+        await self._write_user(user_id, {"consecutive_quest_failures": firestore.Increment(1)}, writer)
+        return EVENT_FIELDS["quest_failure"]
     
+    async def on_economic_event(self, user_id: str, event_type: str, amount: int, resulted_in_zero: bool = False,
+                                writer=None) -> Tuple[str, ...]:
+        """経済イベント処理（寄付・送金・投資）"""
+        update_data = {}
+        
+        # イベントタイプ別の処理（読み取りなしでアトミック加算）
+        if event_type == "donation":
+            update_data["donation_total"] = firestore.Increment(amount)
+            if resulted_in_zero:
+                update_data["became_zero_by_donation"] = True
+        elif event_type == "transfer":
+            update_data["transfer_total"] = firestore.Increment(amount)
+            if resulted_in_zero:
+                update_data["became_zero_by_transfer"] = True
+        elif event_type == "investment_profit":
+            update_data["investment_profit"] = firestore.Increment(amount)
+        elif event_type == "investment_loss" and resulted_in_zero:
+            update_data["became_zero_by_investment"] = True
+        
+        if update_data:
+            await self._write_user(user_id, update_data, writer)
+        return EVENT_FIELDS[event_type]
     
     # =====================================
     # バックグラウンドタスク
     # =====================================
     
-    @tasks.loop(minutes=5)
-    async def title_check_task(self):
-        """称号チェックタスク"""
-        try:
-            # キューからイベントを処理
-            processed = 0
-            while not self.title_check_queue.empty() and processed < 10:
-                event_type, user_id = await self.title_check_queue.get()
-                
-                new_titles = await self.check_user_titles(user_id)
+    async def title_check_worker(self, worker_id: int):
+        """待ち集合からユーザーを取り出して称号チェック・ロール付与・通知を行うワーカー"""
+        while True:
+            user_id, changed_fields = await self.title_checks.take()
+            error = False
+            try:
+                new_titles = await self.check_user_titles(user_id, changed_fields)
                 
-                # 新しい称号があれば処理
+                # 新しい称号があればロール付与し、通知は送信キューでまとめて送信
                 for title in new_titles:
                     await self.assign_discord_role(user_id, title)
-                    await self.send_title_notification(user_id, title)
-                    await asyncio.sleep(1)  # レート制限対策
-                
-                processed += 1
-                
+                self.notifications.enqueue(user_id, new_titles)
+            except Exception as e:
+                error = True
+                logger.error(f"称号チェックワーカーエラー ({worker_id}): {e}")
+            finally:
+                self.title_checks.done(user_id, error)
+    
+    def start_title_check_workers(self):
+        """称号チェックワーカーを起動（起動済みなら何もしない）"""
+        if self.title_check_workers:
+            return
+        for worker_id in range(TITLE_CHECK_CONFIG["worker_count"]):
+            self.title_check_workers.append(asyncio.create_task(self.title_check_worker(worker_id)))
+        print(f"✅ 称号チェックワーカー起動: {TITLE_CHECK_CONFIG['worker_count']}個")
+    
+    @tasks.loop(minutes=TITLE_CHECK_CONFIG["report_interval"])
+    async def title_check_report(self):
+        """称号チェック統計"""
+        stats = self.title_checks.get_stats()
+        print(f"🏅 称号チェック: 受付 {stats['enqueued']} / 統合 {stats['coalesced']} / 処理 {stats['processed']} / "
+              f"エラー {stats['errors']} / 待機 {stats['depth']} (最大 {stats['max_depth']}) / "
+              f"平均遅延 {stats['avg_lag']:.3f}秒 (最大 {stats['max_lag']:.3f}秒)")
+        notification_stats = self.notifications.stats
+        print(f"📣 称号通知: 受付 {notification_stats['enqueued']} / 送信 {notification_stats['messages']}件 "
+              f"({notification_stats['embeds']}人・{notification_stats['titles']}称号) / 待機 {len(self.notifications)} / "
+              f"レート制限 {notification_stats['rate_limited']} / 失敗 {notification_stats['failures']} / "
+              f"チャンネル未取得 {notification_stats['channel_missing']}")
+    
+    @tasks.loop(seconds=MONTHLY_ACTIVITY_CONFIG["flush_interval"])
+    async def monthly_activity_flush(self):
+        """月間アクティビティ集計の書き込みタスク（月次リセットは月ごとのキーで不要）"""
+        try:
+            await self.monthly_activity.flush()
         except Exception as e:
-            logger.error(f"称号チェックタスクエラー: {e}")
+            logger.error(f"月間アクティビティ書き込みタスクエラー: {e}")
     
-    @tasks.loop(hours=24)
-    async def monthly_reset_task(self):
-        """月次リセットタスク"""
+    async def close(self):
+        """終了時に未書き込みの集計を保存"""
         try:
-            now = datetime.datetime.utcnow()
-            if now.day == 1 and now.hour == 0:  # 月初の午前0時
-                logger.info("月次称号データリセット実行")
-                
-                # 必要に応じて月次データのリセット処理を実装
-                # 現在は各ユーザーのメッセージ時に自動リセットされるため、ここでは特に処理なし
-                
+            await self.monthly_activity.flush()
         except Exception as e:
-            logger.error(f"月次リセットタスクエラー: {e}")
+            logger.error(f"月間アクティビティ書き込みエラー: {e}")
+        await super().close()
     
-    @title_check_task.before_loop
-    async def before_title_check_task(self):
+    @title_check_report.before_loop
+    async def before_title_check_report(self):
         await self.wait_until_ready()
     
-    @monthly_reset_task.before_loop
-    async def before_monthly_reset_task(self):
+    @monthly_activity_flush.before_loop
+    async def before_monthly_activity_flush(self):
         await self.wait_until_ready()
 
 # =====================================
@@ -485,28 +1142,35 @@ async def force_title_check_cmd(interaction: discord.Interaction):
     await interaction.response.defer()
     
     bot = interaction.client
-    users_ref = db.collection("users")
-    users = users_ref.stream()
+    progress_message = await interaction.followup.send("🔄 称号チェックを開始します...", wait=True)
+    last_update = [time.monotonic()]
     
-    total_users = 0
-    total_new_titles = 0
+    async def report_progress(result: Dict[str, int]):
+        # 編集回数を抑えるため一定間隔ごとに更新
+        now = time.monotonic()
+        if now - last_update[0] < FORCE_CHECK_CONFIG["progress_interval"]:
+            return
+        last_update[0] = now
+        try:
+            await progress_message.edit(content=(
+                f"🔄 称号チェック中...\n"
+                f"チェック済み: {result['users']}人\n"
+                f"新規称号付与: {result['new_titles']}個"
+            ))
+        except Exception as e:
+            logger.warning(f"進捗更新エラー: {e}")
     
-    for user_doc in users:
-        user_id = user_doc.id
-        new_titles = await bot.check_user_titles(user_id)
-        total_users += 1
-        total_new_titles += len(new_titles)
-        
-        # 新しい称号があればロール付与と通知
-        for title in new_titles:
-            await bot.assign_discord_role(user_id, title)
-            await bot.send_title_notification(user_id, title)
+    result = await bot.run_full_title_check(report_progress)
     
-    await interaction.followup.send(
+    content = (
         f"✅ 称号チェック完了\n"
-        f"チェック対象: {total_users}人\n"
-        f"新規称号付与: {total_new_titles}個"
+        f"チェック対象: {result['users']}人\n"
+        f"新規称号付与: {result['new_titles']}個"
     )
+    try:
+        await progress_message.edit(content=content)
+    except Exception:
+        await interaction.followup.send(content)
 
 # Bot起動
 if __name__ == "__main__":
@@ -9,6 +9,10 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.economic_settings import EconomicSettings
+from shared.kraft_ledger import (
+    KraftLedger, LedgerSequence, is_system_account,
+    SYSTEM_COMMUNITY_FUND, SYSTEM_CASINO, SYSTEM_MARKET
+)
 import firebase_admin
 from firebase_admin import credentials, firestore
 from datetime import datetime, timedelta
@@ -27,30 +31,38 @@ class BalanceAnalyzer:
         self.db = firestore.client()
     
     def analyze_kr_flow(self, days: int = 7) -> Dict[str, Any]:
-        """KR流入・流出分析"""
+        """KR流入・流出分析（台帳の期間範囲を1回ストリーム）"""
         cutoff_date = datetime.now() - timedelta(days=days)
         
-        # 取引履歴取得
-        transactions_ref = self.db.collection("transactions")
-        transactions = transactions_ref.where("timestamp", ">=", cutoff_date).stream()
-        
         inflow = {"levelup": 0, "other": 0}
         outflow = {"transfer": 0, "donation": 0, "slot": 0, "investment": 0}
         
-        for transaction in transactions:
-            data = transaction.to_dict()
-            amount = data.get("amount", 0)
-            transaction_type = data.get("transaction_type", "")
+        # ユーザー勘定側の仕訳のみ集計（システム勘定はシャード集計のため仕訳を持たない）
+        entries = KraftLedger.iter_entries(
+            start_seq=LedgerSequence.watermark(cutoff_date.timestamp()), db=self.db
+        )
+        for entry in entries:
+            amount = entry["d"]
+            counter_account = entry["c"]
+            reason = entry["r"]
             
-            if amount > 0:  # 流入
-                if transaction_type == "levelup":
+            if not is_system_account(counter_account):
+                # ユーザー間送金は流出側のみ計上
+                if amount < 0:
+                    outflow["transfer"] += -amount
+            elif amount > 0:  # 流入
+                if reason.startswith("level_up"):
                     inflow["levelup"] += amount
                 else:
                     inflow["other"] += amount
             else:  # 流出
                 amount = abs(amount)
-                if transaction_type in outflow:
-                    outflow[transaction_type] += amount
+                if counter_account == SYSTEM_COMMUNITY_FUND:
+                    outflow["donation"] += amount
+                elif counter_account == SYSTEM_CASINO:
+                    outflow["slot"] += amount
+                elif counter_account == SYSTEM_MARKET:
+                    outflow["investment"] += amount
         
         total_inflow = sum(inflow.values())
         total_outflow = sum(outflow.values())
@@ -0,0 +1,650 @@
+#!/usr/bin/env python3
+"""
+KRAFTベンチマーク用フェイク
+Firestoreのインメモリ代替・Discordオブジェクトの代替・Botモジュール読み込み補助
+"""
+
+import os
+import sys
+import copy
+import time
+import random
+import uuid
+import asyncio
+import datetime
+import threading
+import importlib
+from typing import Any, Dict, List, Optional
+from google.api_core.exceptions import AlreadyExists, NotFound
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# =====================================
+# Firestore代替（インメモリ）
+# =====================================
+
+class FakeAborted(Exception):
+    """トランザクション競合（読み取り後に対象ドキュメントが更新された）"""
+
+
+class FirestoreStats:
+    """Firestore呼び出し統計"""
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.calls = 0
+        self.aborts = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"reads": self.reads, "writes": self.writes, "calls": self.calls, "aborts": self.aborts}
+
+
+def _is_sentinel(value: Any, name: str) -> bool:
+    """SERVER_TIMESTAMP / DELETE_FIELD 判定（実ライブラリ・フェイク両対応）"""
+    try:
+        from google.cloud.firestore_v1 import transforms
+        return value is getattr(transforms, name)
+    except ImportError:
+        return getattr(value, "name", None) == name
+
+
+def _resolve_transform(current: Any, value: Any) -> Any:
+    """フィールド変換（Increment / ArrayUnion / ArrayRemove / SERVER_TIMESTAMP）を適用"""
+    transform = type(value).__name__
+    if transform == "Increment":
+        return (current or 0) + value.value
+    if transform == "ArrayUnion":
+        result = list(current or [])
+        for item in value.values:
+            if item not in result:
+                result.append(item)
+        return result
+    if transform == "ArrayRemove":
+        return [item for item in (current or []) if item not in value.values]
+    if _is_sentinel(value, "SERVER_TIMESTAMP"):
+        return datetime.datetime.utcnow()
+    return copy.deepcopy(value)
+
+
+def _set_field(data: Dict[str, Any], field_path: str, value: Any):
+    """ドット区切りのフィールドパスに値を書き込み"""
+    keys = field_path.split(".")
+    for key in keys[:-1]:
+        if not isinstance(data.get(key), dict):
+            data[key] = {}
+        data = data[key]
+    if _is_sentinel(value, "DELETE_FIELD"):
+        data.pop(keys[-1], None)
+    else:
+        data[keys[-1]] = _resolve_transform(data.get(keys[-1]), value)
+
+
+def _get_field(data: Dict[str, Any], field_path: str) -> Any:
+    for key in field_path.split("."):
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+
+def _merge(data: Dict[str, Any], updates: Dict[str, Any]):
+    """set(merge=True) のネストマージ"""
+    for key, value in updates.items():
+        if isinstance(value, dict):
+            # ネストしたマップはフィールド単位でマージ（変換もネスト先で適用）
+            if not isinstance(data.get(key), dict):
+                data[key] = {}
+            _merge(data[key], value)
+        elif _is_sentinel(value, "DELETE_FIELD"):
+            data.pop(key, None)
+        else:
+            data[key] = _resolve_transform(data.get(key), value)
+
+
+class FakeFirestore:
+    """Firestoreクライアントのインメモリ代替（呼び出しごとの遅延を設定可能）"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.stats = FirestoreStats()
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._listeners: List["FakeWatch"] = []
+
+    # --- 内部処理 ---
+
+    def _round_trip(self):
+        self.stats.calls += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _read(self, path: str) -> "FakeDocumentSnapshot":
+        with self._lock:
+            self.stats.reads += 1
+            data = self._docs.get(path)
+            return FakeDocumentSnapshot(self.document(path), copy.deepcopy(data), self._versions.get(path, 0))
+
+    def _apply(self, op: str, path: str, data: Optional[Dict[str, Any]] = None, merge: bool = False):
+        with self._lock:
+            self.stats.writes += 1
+            if op == "delete":
+                self._docs.pop(path, None)
+            elif op == "create":
+                if path in self._docs:
+                    raise AlreadyExists(f"Document already exists: {path}")
+                doc = {}
+                _merge(doc, data)
+                self._docs[path] = doc
+            elif op == "set":
+                doc = self._docs.get(path, {}) if merge else {}
+                doc = copy.deepcopy(doc)
+                _merge(doc, data)
+                self._docs[path] = doc
+            elif op == "update":
+                if path not in self._docs:
+                    raise NotFound(f"No document to update: {path}")
+                doc = copy.deepcopy(self._docs[path])
+                for field_path, value in data.items():
+                    _set_field(doc, field_path, value)
+                self._docs[path] = doc
+            self._versions[path] = self._versions.get(path, 0) + 1
+        for watch in list(self._listeners):
+            watch._notify(path)
+
+    # --- 公開API ---
+
+    def collection(self, name: str) -> "FakeCollectionReference":
+        return FakeCollectionReference(self, name)
+
+    def document(self, path: str) -> "FakeDocumentReference":
+        return FakeDocumentReference(self, path)
+
+    def batch(self) -> "FakeWriteBatch":
+        return FakeWriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False) -> "FakeTransaction":
+        return FakeTransaction(self, max_attempts)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        self._round_trip()
+        for ref in references:
+            snapshot = self._read(ref.path)
+            if transaction is not None:
+                transaction._record(snapshot)
+            yield snapshot
+
+    def seed(self, path: str, data: Dict[str, Any]):
+        """統計に含めずにドキュメントを投入"""
+        with self._lock:
+            self._docs[path] = copy.deepcopy(data)
+            self._versions[path] = self._versions.get(path, 0) + 1
+
+    def seed_merge(self, path: str, data: Dict[str, Any]):
+        """統計に含めずに set(merge=True) 相当の書き込み（他のBotによる更新の再現用）"""
+        with self._lock:
+            doc = copy.deepcopy(self._docs.get(path, {}))
+            _merge(doc, data)
+            self._docs[path] = doc
+            self._versions[path] = self._versions.get(path, 0) + 1
+
+    def dump(self, path: str) -> Optional[Dict[str, Any]]:
+        """統計に含めずにドキュメントを取得"""
+        with self._lock:
+            data = self._docs.get(path)
+            return copy.deepcopy(data) if data is not None else None
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference: "FakeDocumentReference", data: Optional[Dict[str, Any]], version: int = 0):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self._version = version
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        return _get_field(self._data or {}, field_path)
+
+
+class FakeDocumentReference:
+    def __init__(self, db: FakeFirestore, path: str):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    @property
+    def parent(self) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._db, self.path.rsplit("/", 1)[0])
+
+    def collection(self, name: str) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._db, f"{self.path}/{name}")
+
+    def get(self, field_paths=None, transaction=None) -> FakeDocumentSnapshot:
+        self._db._round_trip()
+        snapshot = self._db._read(self.path)
+        if transaction is not None:
+            transaction._record(snapshot)
+        return snapshot
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False):
+        self._db._round_trip()
+        self._db._apply("set", self.path, document_data, merge)
+
+    def create(self, document_data: Dict[str, Any]):
+        self._db._round_trip()
+        self._db._apply("create", self.path, document_data)
+
+    def update(self, field_updates: Dict[str, Any]):
+        self._db._round_trip()
+        self._db._apply("update", self.path, field_updates)
+
+    def delete(self):
+        self._db._round_trip()
+        self._db._apply("delete", self.path)
+
+    def on_snapshot(self, callback):
+        return FakeWatch(self._db, callback, lambda path: path == self.path)
+
+
+class FakeQuery:
+    _OPERATORS = {
+        "==": lambda a, b: a == b,
+        "!=": lambda a, b: a != b,
+        "<": lambda a, b: a is not None and a < b,
+        "<=": lambda a, b: a is not None and a <= b,
+        ">": lambda a, b: a is not None and a > b,
+        ">=": lambda a, b: a is not None and a >= b,
+        "in": lambda a, b: a in b,
+        "not-in": lambda a, b: a not in b,
+        "array_contains": lambda a, b: isinstance(a, list) and b in a,
+    }
+
+    def __init__(self, db: FakeFirestore, path: str, filters=None, orders=None, limit=None, cursor=None):
+        self._db = db
+        self._path = path
+        self._filters = filters or []
+        self._orders = orders or []
+        self._limit = limit
+        self._cursor = cursor
+
+    def _copy(self, **changes) -> "FakeQuery":
+        params = {"filters": list(self._filters), "orders": list(self._orders),
+                  "limit": self._limit, "cursor": self._cursor}
+        params.update(changes)
+        return FakeQuery(self._db, self._path, **params)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None) -> "FakeQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "FakeQuery":
+        return self._copy(orders=self._orders + [(field_path, direction)])
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._copy(limit=count)
+
+    def start_after(self, document_fields) -> "FakeQuery":
+        return self._copy(cursor=document_fields)
+
+    def _sort_key(self, doc_id: str, data: Dict[str, Any]):
+        return tuple(_get_field(data, field) for field, _ in self._orders) + (doc_id,)
+
+    def _matches(self) -> List[FakeDocumentSnapshot]:
+        prefix = self._path + "/"
+        with self._db._lock:
+            items = [
+                (path, data) for path, data in self._db._docs.items()
+                if path.startswith(prefix) and "/" not in path[len(prefix):]
+            ]
+        matched = []
+        for path, data in items:
+            if all(self._OPERATORS[op](_get_field(data, field), value) for field, op, value in self._filters):
+                if all(_get_field(data, field) is not None for field, _ in self._orders):
+                    matched.append((path, data))
+
+        descending = any(direction == "DESCENDING" for _, direction in self._orders)
+        matched.sort(key=lambda item: self._sort_key(item[0].rsplit("/", 1)[-1], item[1]), reverse=descending)
+
+        if self._cursor is not None:
+            cursor = self._cursor
+            if isinstance(cursor, FakeDocumentSnapshot):
+                cursor_key = self._sort_key(cursor.id, cursor._data or {})
+            else:
+                cursor_key = tuple(cursor.get(field) for field, _ in self._orders)
+            width = len(cursor_key)
+            keyed = [(self._sort_key(path.rsplit("/", 1)[-1], data)[:width], path, data) for path, data in matched]
+            matched = [(path, data) for key, path, data in keyed
+                       if (key < cursor_key if descending else key > cursor_key)]
+
+        if self._limit is not None:
+            matched = matched[:self._limit]
+
+        snapshots = []
+        for path, data in matched:
+            self._db.stats.reads += 1
+            snapshots.append(FakeDocumentSnapshot(self._db.document(path), copy.deepcopy(data),
+                                                  self._db._versions.get(path, 0)))
+        if not snapshots:
+            self._db.stats.reads += 1  # 空クエリも1読み取り課金
+        return snapshots
+
+    def stream(self, transaction=None):
+        self._db._round_trip()
+        for snapshot in self._matches():
+            if transaction is not None:
+                transaction._record(snapshot)
+            yield snapshot
+
+    def get(self, transaction=None) -> List[FakeDocumentSnapshot]:
+        return list(self.stream(transaction=transaction))
+
+    def on_snapshot(self, callback):
+        prefix = self._path + "/"
+        return FakeWatch(self._db, callback, lambda path: path.startswith(prefix), query=self)
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, db: FakeFirestore, path: str):
+        super().__init__(db, path)
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self._db, f"{self._path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None):
+        ref = self.document(document_id)
+        ref.set(document_data)
+        return datetime.datetime.utcnow(), ref
+
+    def list_documents(self):
+        return [snapshot.reference for snapshot in self._matches()]
+
+
+class FakeWatch:
+    """on_snapshot リスナーの代替（変更をコールバックへ同期通知）"""
+
+    def __init__(self, db: FakeFirestore, callback, matcher, query: Optional[FakeQuery] = None):
+        self._db = db
+        self._callback = callback
+        self._matcher = matcher
+        self._query = query
+        db._listeners.append(self)
+
+    def _notify(self, path: str):
+        if not self._matcher(path):
+            return
+        with self._db._lock:
+            data = self._db._docs.get(path)
+        snapshot = FakeDocumentSnapshot(self._db.document(path), copy.deepcopy(data))
+        change_type = "REMOVED" if data is None else "MODIFIED"
+        change = type("FakeChange", (), {"document": snapshot, "type": type("T", (), {"name": change_type})})
+        self._callback([snapshot], [change], datetime.datetime.utcnow())
+
+    def unsubscribe(self):
+        if self in self._db._listeners:
+            self._db._listeners.remove(self)
+
+
+class FakeWriteBatch:
+    MAX_OPERATIONS = 500
+
+    def __init__(self, db: FakeFirestore):
+        self._db = db
+        self._ops = []
+
+    def __len__(self):
+        return len(self._ops)
+
+    def _add(self, op, ref, data=None, merge=False):
+        if len(self._ops) >= self.MAX_OPERATIONS:
+            raise ValueError("Maximum 500 writes allowed per request")
+        self._ops.append((op, ref.path, data, merge))
+
+    def set(self, reference, document_data, merge=False):
+        self._add("set", reference, document_data, merge)
+
+    def create(self, reference, document_data):
+        self._add("create", reference, document_data)
+
+    def update(self, reference, field_updates):
+        self._add("update", reference, field_updates)
+
+    def delete(self, reference):
+        self._add("delete", reference)
+
+    def commit(self):
+        self._db._round_trip()
+        with self._db._lock:
+            # 前提条件を先に検証し、失敗時はどの書き込みも反映しない
+            for op, path, data, merge in self._ops:
+                if op == "create" and path in self._db._docs:
+                    raise AlreadyExists(f"Document already exists: {path}")
+                if op == "update" and path not in self._db._docs:
+                    raise NotFound(f"No document to update: {path}")
+            for op, path, data, merge in self._ops:
+                self._db._apply(op, path, data, merge)
+        self._ops = []
+
+
+class FakeTransaction(FakeWriteBatch):
+    """楽観的並行性制御つきトランザクション（読み取り後の更新を検出して中断）"""
+
+    def __init__(self, db: FakeFirestore, max_attempts: int = 5):
+        super().__init__(db)
+        self._max_attempts = max_attempts
+        self._read_versions: Dict[str, int] = {}
+
+    def get_all(self, references):
+        return self._db.get_all(references, transaction=self)
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, FakeDocumentReference):
+            return self.get_all([ref_or_query])
+        return ref_or_query.stream(transaction=self)
+
+    def _record(self, snapshot: FakeDocumentSnapshot):
+        self._read_versions.setdefault(snapshot.reference.path, snapshot._version)
+
+    def _reset(self):
+        self._ops = []
+        self._read_versions = {}
+
+    def _commit(self):
+        self._db._round_trip()
+        with self._db._lock:
+            for path, version in self._read_versions.items():
+                if self._db._versions.get(path, 0) != version:
+                    self._db.stats.aborts += 1
+                    raise FakeAborted(path)
+            for op, path, data, merge in self._ops:
+                self._db._apply(op, path, data, merge)
+        self._ops = []
+
+
+def fake_transactional(to_wrap):
+    """firestore.transactional の代替（競合時は指数バックオフで再試行）"""
+    def wrapper(transaction, *args, **kwargs):
+        for attempt in range(transaction._max_attempts):
+            transaction._reset()
+            result = to_wrap(transaction, *args, **kwargs)
+            try:
+                transaction._commit()
+                return result
+            except FakeAborted:
+                time.sleep(random.uniform(0, max(transaction._db.latency, 0.001) * 2 ** attempt))
+        raise ValueError(f"Failed to commit transaction in {transaction._max_attempts} attempts.")
+    return wrapper
+
+# =====================================
+# Discord代替
+# =====================================
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str, bot: bool = False):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+        self.avatar = None
+        self.display_avatar = type("Avatar", (), {"url": f"https://example.invalid/{user_id}.png"})()
+        self.roles = []
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+    async def add_roles(self, *roles, reason=None):
+        for role in roles:
+            if role not in self.roles:
+                self.roles.append(role)
+
+
+class FakeRole:
+    def __init__(self, role_id: int, name: str):
+        self.id = role_id
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, FakeRole) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, name: str, members: List[FakeUser], role_names: List[str]):
+        self.id = guild_id
+        self.name = name
+        self.members = members
+        self._members = {member.id: member for member in members}
+        self.roles = [FakeRole(guild_id * 1000 + i, role_name) for i, role_name in enumerate(role_names)]
+
+    def get_member(self, user_id: int) -> Optional[FakeUser]:
+        return self._members.get(user_id)
+
+    def get_role(self, role_id: int) -> Optional[FakeRole]:
+        for role in self.roles:
+            if role.id == role_id:
+                return role
+        return None
+
+
+class FakeChannel:
+    """送信内容を記録するチャンネル（送信ごとの遅延を設定可能）"""
+
+    def __init__(self, channel_id: int, latency: float = 0.0):
+        self.id = channel_id
+        self.latency = latency
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        message = FakeMessage(None, self, content or "")
+        message.embeds = [kwargs["embed"]] if kwargs.get("embed") else kwargs.get("embeds", [])
+        self.sent.append((time.perf_counter(), content, kwargs))
+        return message
+
+
+class FakeMessage:
+    def __init__(self, author: Optional[FakeUser], channel: FakeChannel, content: str):
+        self.author = author
+        self.channel = channel
+        self.content = content
+        self.embeds = []
+        self.guild = None
+
+    async def edit(self, content=None, **kwargs):
+        if content is not None:
+            self.content = content
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, ephemeral: bool = False, thinking: bool = False):
+        self._done = True
+
+    async def send_message(self, content=None, **kwargs):
+        self._done = True
+        self._interaction.sent.append((content, kwargs))
+
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        self._interaction.sent.append((content, kwargs))
+        return FakeMessage(None, FakeChannel(0), content or "")
+
+
+class FakeInteraction:
+    """スラッシュコマンド呼び出しの代替（送信内容は sent に記録）"""
+
+    _next_id = 1
+
+    def __init__(self, user: FakeUser, client=None, guild: Optional[FakeGuild] = None):
+        self.id = FakeInteraction._next_id
+        FakeInteraction._next_id += 1
+        self.user = user
+        self.client = client
+        self.guild = guild
+        self.sent = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+# =====================================
+# Botモジュール読み込み
+# =====================================
+
+def install_fake_firestore(fake_db: FakeFirestore):
+    """firebase_admin をフェイクFirestoreに差し替え（Botモジュール読み込み前に呼び出す）"""
+    import firebase_admin
+    from firebase_admin import firestore
+
+    from shared import kraft_db
+
+    firebase_admin._apps.setdefault("[DEFAULT]", object())
+    firestore.client = lambda app=None: fake_db
+    firestore.transactional = fake_transactional
+    kraft_db.set_db(fake_db)
+
+
+def load_bot_module(module_name: str, fake_db: FakeFirestore, token_env: Optional[str] = None):
+    """Botスクリプトをフェイク環境で読み込み（bot.run は実行されない）"""
+    install_fake_firestore(fake_db)
+    if token_env:
+        os.environ[token_env] = "benchmark-token"
+    if module_name in sys.modules:
+        del sys.modules[module_name]
+    return importlib.import_module(module_name)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """パーセンタイル値（最近傍法）"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
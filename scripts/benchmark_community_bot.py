@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+KRAFTコミュニティBot 負荷ベンチマーク
+インメモリFirestore上でメッセージXP処理・寄付・クエストのスループットとレイテンシを計測
+
+使い方:
+    python scripts/benchmark_community_bot.py --messages 5000 --users 300 --latency-ms 5
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import contextlib
+from typing import Any, Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_fakes import (
+    FakeFirestore, FakeUser, FakeChannel, FakeMessage, FakeInteraction,
+    load_bot_module, percentile
+)
+
+
+def summarize(name: str, samples: List[float], elapsed: float, count: int,
+              stats_before: Dict[str, int], stats_after: Dict[str, int]) -> Dict[str, Any]:
+    """計測結果の集計"""
+    reads = stats_after["reads"] - stats_before["reads"]
+    writes = stats_after["writes"] - stats_before["writes"]
+    return {
+        "scenario": name,
+        "count": count,
+        "elapsed_sec": round(elapsed, 4),
+        "throughput_per_sec": round(count / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "reads_per_op": round(reads / count, 3) if count else 0.0,
+        "writes_per_op": round(writes / count, 3) if count else 0.0,
+        "aborts": stats_after["aborts"] - stats_before["aborts"]
+    }
+
+
+def print_result(result: Dict[str, Any]):
+    print(f"  [{result['scenario']}] {result['count']}件 / {result['elapsed_sec']}秒 "
+          f"= {result['throughput_per_sec']}件/秒")
+    print(f"    p50: {result['p50_ms']}ms  p99: {result['p99_ms']}ms  "
+          f"読み取り/件: {result['reads_per_op']}  書き込み/件: {result['writes_per_op']}  "
+          f"競合: {result['aborts']}")
+
+
+class CommunityBotBenchmark:
+    """コミュニティBotベンチマーク"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.db = FakeFirestore(latency=args.latency_ms / 1000)
+        self.bot_module = load_bot_module("kraft_community_bot", self.db)
+        if args.cooldown is not None:
+            self.bot_module.XP_COOLDOWN = args.cooldown
+
+        # コマンド処理は計測対象外（未ログイン状態の commands.Bot はメッセージを処理できない）
+        async def skip_process_commands(message):
+            return None
+        self.bot_module.bot.process_commands = skip_process_commands
+
+        self.users = [FakeUser(100000 + i, f"bench_user_{i}") for i in range(args.users)]
+        self.channels = [FakeChannel(900000 + i) for i in range(args.channels)]
+        for user in self.users:
+            self.db.seed(f"users/{user.id}", {
+                "user_id": str(user.id),
+                "balance": 10_000_000,
+                "level": 1,
+                "xp": 0,
+                "total_xp": 0,
+                "messages_count": 0,
+                "donations_made": 0,
+                "donations_received": 0,
+                "quests_completed": 0
+            })
+
+    async def run_messages(self) -> List[Dict[str, Any]]:
+        """メッセージXP処理（ゲートウェイハンドラーとワーカー処理を個別に計測）"""
+        module = self.bot_module
+        handler_samples = []
+        xp_samples = []
+
+        original_process = module.process_message_xp
+
+        async def timed_process(message):
+            start = time.perf_counter()
+            await original_process(message)
+            xp_samples.append(time.perf_counter() - start)
+        module.process_message_xp = timed_process
+        module.start_message_workers()
+
+        stats_before = self.db.stats.snapshot()
+        start = time.perf_counter()
+        for i in range(self.args.messages):
+            message = FakeMessage(self.random.choice(self.users), self.random.choice(self.channels), f"bench message {i}")
+            handler_start = time.perf_counter()
+            await module.on_message(message)
+            handler_samples.append(time.perf_counter() - handler_start)
+            if self.args.rate > 0:
+                await asyncio.sleep(1 / self.args.rate)
+            elif i % 100 == 0:
+                await asyncio.sleep(0)
+        gateway_elapsed = time.perf_counter() - start
+        await asyncio.gather(*(queue.join() for queue in module.message_queues))
+        elapsed = time.perf_counter() - start
+        stats_after = self.db.stats.snapshot()
+
+        module.process_message_xp = original_process
+        pipeline = module.get_message_pipeline_stats()
+        processed = len(xp_samples)
+
+        results = [
+            summarize("message_gateway", handler_samples, gateway_elapsed, self.args.messages,
+                      stats_before, stats_before),
+            summarize("message_xp", xp_samples, elapsed, processed, stats_before, stats_after)
+        ]
+        results[1]["dropped"] = pipeline["dropped"]
+        results[1]["max_queue_depth"] = pipeline["max_depth"]
+        return results
+
+    async def run_donations(self) -> Dict[str, Any]:
+        """寄付コマンド"""
+        samples = []
+        stats_before = self.db.stats.snapshot()
+        start = time.perf_counter()
+        for _ in range(self.args.donations):
+            interaction = FakeInteraction(self.random.choice(self.users))
+            op_start = time.perf_counter()
+            await self.bot_module.donate_cmd.callback(interaction, self.random.randint(100, 5000))
+            samples.append(time.perf_counter() - op_start)
+        elapsed = time.perf_counter() - start
+        return summarize("donate", samples, elapsed, self.args.donations, stats_before, self.db.stats.snapshot())
+
+    async def run_quests(self) -> List[Dict[str, Any]]:
+        """クエスト作成・達成コマンド"""
+        module = self.bot_module
+        deadline = datetime.datetime.now() + datetime.timedelta(days=30)
+        create_samples = []
+        complete_samples = []
+
+        stats_before = self.db.stats.snapshot()
+        start = time.perf_counter()
+        for i in range(self.args.quests):
+            interaction = FakeInteraction(self.users[i % len(self.users)])
+            op_start = time.perf_counter()
+            await module.quest_create_cmd.callback(interaction, f"bench quest {i}", deadline.year, deadline.month, deadline.day)
+            create_samples.append(time.perf_counter() - op_start)
+        create_elapsed = time.perf_counter() - start
+        create_stats = self.db.stats.snapshot()
+
+        start = time.perf_counter()
+        for i in range(self.args.quests):
+            user = self.users[i % len(self.users)]
+            interaction = FakeInteraction(user)
+            op_start = time.perf_counter()
+            await module.quest_complete_cmd.callback(interaction)
+            view = interaction.sent[-1][1].get("view")
+            if view is not None:
+                select = view.children[0]
+                select._values = [select.options[0].value]
+                await select.callback(FakeInteraction(user))
+            complete_samples.append(time.perf_counter() - op_start)
+        complete_elapsed = time.perf_counter() - start
+
+        return [
+            summarize("quest_create", create_samples, create_elapsed, self.args.quests, stats_before, create_stats),
+            summarize("quest_complete", complete_samples, complete_elapsed, self.args.quests,
+                      create_stats, self.db.stats.snapshot())
+        ]
+
+    async def run(self) -> List[Dict[str, Any]]:
+        results = []
+        if self.args.messages > 0:
+            results.extend(await self.run_messages())
+        if self.args.donations > 0:
+            results.append(await self.run_donations())
+        if self.args.quests > 0:
+            results.extend(await self.run_quests())
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KRAFTコミュニティBot 負荷ベンチマーク")
+    parser.add_argument("--messages", type=int, default=2000, help="送信メッセージ数")
+    parser.add_argument("--users", type=int, default=200, help="ユーザー数")
+    parser.add_argument("--channels", type=int, default=5, help="チャンネル数")
+    parser.add_argument("--rate", type=float, default=0, help="メッセージ送信レート(件/秒、0で最大速度)")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Firestore呼び出しごとの遅延(ミリ秒)")
+    parser.add_argument("--cooldown", type=int, default=None, help="XPクールダウン秒数の上書き")
+    parser.add_argument("--donations", type=int, default=200, help="寄付コマンド実行回数")
+    parser.add_argument("--quests", type=int, default=50, help="クエスト作成・達成の実行回数")
+    parser.add_argument("--seed", type=int, default=42, help="乱数シード")
+    parser.add_argument("--json", dest="json_path", default=None, help="結果をJSONで保存するパス")
+    parser.add_argument("--verbose", action="store_true", help="Botのログ出力を表示")
+    args = parser.parse_args()
+
+    # Botのログ出力は計測ノイズになるため既定で抑制
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(open(os.devnull, "w")))
+        benchmark = CommunityBotBenchmark(args)
+        results = asyncio.run(benchmark.run())
+
+    print("\n📊 KRAFTコミュニティBot ベンチマーク結果")
+    print(f"  Firestore遅延: {args.latency_ms}ms / ユーザー数: {args.users}")
+    for result in results:
+        print_result(result)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 結果を保存しました: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+KRAFT称号Bot 負荷ベンチマーク
+インメモリFirestoreとフェイクのDiscordギルド上で、メッセージ・クエスト・経済イベントを指定レートで投入し、
+イベント発生から称号付与・通知送信までの遅延、待ち件数の推移、イベントあたりの読み書き数、通知送信レートを計測
+（ネットワーク接続は不要）
+
+使い方:
+    python scripts/benchmark_title_bot.py --duration 10 --message-rate 200 --quest-rate 20 --economic-rate 50
+    python scripts/benchmark_title_bot.py --via-title-events --latency-ms 5 --json result.json
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+import argparse
+import datetime
+import contextlib
+from typing import Any, Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_fakes import FakeFirestore, FakeUser, FakeGuild, FakeChannel, load_bot_module, percentile
+
+# 初期データの範囲（称号の条件値の前後に分布させ、計測中に条件を満たすユーザーが出るようにする）
+SEED_RANGES = {
+    "level": (1, 30),
+    "monthly_messages": (0, 1000),
+    "active_channels": (0, 10),
+    "completed_quests": (80, 100),
+    "consecutive_quest_failures": (0, 10),
+    "donation_total": (0, 50000),
+    "transfer_total": (0, 100000),
+    "investment_profit": (0, 100000)
+}
+
+ECONOMIC_EVENTS = ("donation", "transfer", "investment_profit", "investment_loss")
+
+
+def summarize_latency(samples: List[float]) -> Dict[str, Any]:
+    """遅延の集計（ミリ秒）"""
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3) if samples else 0.0
+    }
+
+
+def print_result(result: Dict[str, Any]):
+    events = result["events"]
+    print(f"  イベント: {events['total']}件 / {result['elapsed_sec']}秒 = {events['rate_per_sec']}件/秒 "
+          f"(メッセージ {events['message']} / クエスト {events['quest']} / 経済 {events['economic']})")
+    for label, key in (("イベント→称号付与", "grant_latency"), ("イベント→通知送信", "notify_latency")):
+        latency = result[key]
+        print(f"  {label}: {latency['count']}件  p50: {latency['p50_ms']}ms  p99: {latency['p99_ms']}ms  "
+              f"最大: {latency['max_ms']}ms")
+    titles = result["titles"]
+    print(f"  称号: 付与 {titles['granted']} / 通知 {titles['notified']} / 未付与 {titles['missed']} / "
+          f"対応イベントなし {titles['unattributed']}")
+    depth = result["queue_depth"]
+    print(f"  待ち件数: 称号チェック 最大 {depth['title_checks_max']} (平均 {depth['title_checks_avg']})  "
+          f"通知 最大 {depth['notifications_max']}  title_events 最大 {depth['title_events_max']}")
+    firestore_stats = result["firestore"]
+    print(f"  Firestore: 読み取り/件: {firestore_stats['reads_per_event']}  "
+          f"書き込み/件: {firestore_stats['writes_per_event']}  呼び出し/件: {firestore_stats['calls_per_event']}")
+    checks = result["title_checks"]
+    print(f"  称号チェック: 受付 {checks['enqueued']} / 統合 {checks['coalesced']} / 処理 {checks['processed']} / "
+          f"エラー {checks['errors']}")
+    notifications = result["notifications"]
+    print(f"  通知送信: {notifications['messages']}メッセージ ({notifications['embeds']}人) "
+          f"= {notifications['messages_per_sec']}メッセージ/秒  レート制限 {notifications['rate_limited']} / "
+          f"失敗 {notifications['failures']}")
+
+
+class TitleBotBenchmark:
+    """称号Botベンチマーク"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.db = FakeFirestore(latency=args.latency_ms / 1000)
+        self.module = load_bot_module("kraft_title_bot", self.db, "DISCORD_TOKEN_TITLE_BOT")
+        self.month = self.module.month_key()
+
+        # 計測用の設定上書き（ワーカー・待ち集合はBot作成時に設定を読むため先に反映）
+        self.module.TITLE_CHECK_CONFIG["worker_count"] = args.workers
+        self.module.TITLE_CHECK_CONFIG["coalesce_window"] = args.coalesce_window
+        self.module.NOTIFICATION_CONFIG["gather_delay"] = args.gather_delay
+        self.module.MONTHLY_ACTIVITY_CONFIG["flush_interval"] = args.flush_interval
+        self.module.TITLE_EVENT_CONFIG["poll_interval"] = args.poll_interval
+
+        self.users = [FakeUser(200000 + i, f"bench_user_{i}") for i in range(args.users)]
+        self.guild = FakeGuild(1, "bench_guild", self.users,
+                               [title_info["role_name"] for title_info in self.module.TITLE_CONDITIONS.values()])
+        self.channel = FakeChannel(0, latency=args.send_latency_ms / 1000)
+
+        self.shadow: Dict[str, Dict[str, Any]] = {}      # user_id -> 投入したイベントから計算したユーザーデータ
+        self.crossed: Dict[tuple, float] = {}            # (user_id, 称号) -> 条件を満たしたイベントの発生時刻
+        self.granted: Dict[tuple, float] = {}            # (user_id, 称号) -> 称号付与（通知予約）時刻
+        self.notified: Dict[tuple, float] = {}           # (user_id, 称号) -> 通知送信時刻
+        self.event_counts = {"message": 0, "quest": 0, "economic": 0}
+        self.injected_events = 0
+        self.depth_samples: List[Dict[str, Any]] = []
+        self.seed_users()
+
+    # =====================================
+    # 準備
+    # =====================================
+
+    def seed_users(self):
+        """ユーザーを投入（初期データで条件を満たす称号は取得済みにする）"""
+        for user in self.users:
+            user_id = str(user.id)
+            channel_count = min(self.args.channels, self.random.randint(*SEED_RANGES["active_channels"]))
+            channels = [str(channel_id) for channel_id in self.random.sample(range(self.args.channels), channel_count)]
+            data = {
+                "user_id": user_id,
+                "level": self.random.randint(*SEED_RANGES["level"]),
+                "monthly_activity": {self.month: {
+                    "messages": self.random.randint(*SEED_RANGES["monthly_messages"]),
+                    "channels": channels
+                }},
+                "completed_quests": self.random.randint(*SEED_RANGES["completed_quests"]),
+                "consecutive_quest_failures": self.random.randint(*SEED_RANGES["consecutive_quest_failures"]),
+                "donation_total": self.random.randint(*SEED_RANGES["donation_total"]),
+                "transfer_total": self.random.randint(*SEED_RANGES["transfer_total"]),
+                "investment_profit": self.random.randint(*SEED_RANGES["investment_profit"]),
+                "became_zero_by_donation": False,
+                "became_zero_by_investment": False,
+                "became_zero_by_transfer": False
+            }
+            record = self.module.UserRecord.from_dict(user_id, data)
+            data["titles"] = ["偉大なる一歩"] + [title_name for title_name, condition in self.module.TITLE_PREDICATES.items()
+                                             if condition(record)]
+            self.shadow[user_id] = data
+            self.db.seed(f"users/{user_id}", data)
+
+    def create_bot(self):
+        """Botを作成し、on_ready 相当の起動処理を行う（ギルド・チャンネル・ユーザーはフェイクを返す）"""
+        bot = self.module.KraftTitleBot()
+        members = {user.id: user for user in self.users}
+        bot.get_guild = lambda guild_id: self.guild if guild_id == self.guild.id else None
+        bot.get_channel = lambda channel_id: self.channel if channel_id == bot.notification_channel_id else None
+        bot.get_user = lambda user_id: members.get(user_id)
+
+        # 付与・通知の時刻を記録
+        notifications = bot.notifications
+        original_enqueue = notifications.enqueue
+        original_build_embed = notifications.build_embed
+        original_send = notifications._send
+        embed_titles = {}
+
+        def timed_enqueue(user_id, titles):
+            now = time.perf_counter()
+            for title_name in titles:
+                self.granted.setdefault((user_id, title_name), now)
+            original_enqueue(user_id, titles)
+
+        def tagged_build_embed(user_id, titles):
+            embed = original_build_embed(user_id, titles)
+            embed_titles[id(embed)] = (user_id, list(titles))
+            return embed
+
+        async def timed_send(channel, embeds):
+            sent = await original_send(channel, embeds)
+            now = time.perf_counter()
+            for embed in embeds:
+                user_id, titles = embed_titles.pop(id(embed), (None, []))
+                for title_name in titles:
+                    self.notified.setdefault((user_id, title_name), now)
+            return sent
+
+        notifications.enqueue = timed_enqueue
+        notifications.build_embed = tagged_build_embed
+        notifications._send = timed_send
+
+        bot.role_cache.build([self.guild])
+        bot.start_title_check_workers()
+        bot.notifications.start()
+        if self.args.via_title_events:
+            bot.event_consumer.start()
+        return bot
+
+    # =====================================
+    # イベント投入
+    # =====================================
+
+    def record_event(self, user_id: str, event_type: str, data: Dict[str, Any]):
+        """投入したイベントをユーザーデータに反映し、新たに条件を満たした称号の発生時刻を記録"""
+        shadow = self.shadow[user_id]
+        if event_type == "message":
+            activity = shadow["monthly_activity"][self.month]
+            activity["messages"] += 1
+            if str(data["channel_id"]) not in activity["channels"]:
+                activity["channels"].append(str(data["channel_id"]))
+        elif event_type == "quest_complete":
+            shadow["completed_quests"] += 1
+            shadow["consecutive_quest_failures"] = 0
+        elif event_type == "quest_failure":
+            shadow["consecutive_quest_failures"] += 1
+        elif event_type in ("donation", "transfer"):
+            shadow[f"{event_type}_total"] += data["amount"]
+            if data["resulted_in_zero"]:
+                shadow[f"became_zero_by_{event_type}"] = True
+        elif event_type == "investment_profit":
+            shadow["investment_profit"] += data["amount"]
+        elif event_type == "investment_loss" and data["resulted_in_zero"]:
+            shadow["became_zero_by_investment"] = True
+
+        now = time.perf_counter()
+        record = self.module.UserRecord.from_dict(user_id, shadow)
+        candidates = self.module.titles_for_fields(self.module.TITLE_PREDICATES, self.module.TITLE_FIELD_INDEX,
+                                                   self.module.EVENT_FIELDS[event_type])
+        for title_name in candidates:
+            if title_name in shadow["titles"] or (user_id, title_name) in self.crossed:
+                continue
+            if self.module.TITLE_PREDICATES[title_name](record):
+                self.crossed[(user_id, title_name)] = now
+
+    async def inject(self, bot, user_id: str, event_type: str, data: Dict[str, Any]):
+        """イベントを1件投入（他のBotによるユーザーデータ更新は統計に含めない）"""
+        if event_type == "quest_complete":
+            # 達成数はコミュニティBotが更新する
+            self.db.seed_merge(f"users/{user_id}", {"completed_quests": self.shadow[user_id]["completed_quests"] + 1})
+        self.record_event(user_id, event_type, data)
+        self.injected_events += 1
+
+        event = {
+            "user_id": user_id,
+            "type": event_type,
+            "data": data,
+            "timestamp": datetime.datetime.utcnow().isoformat()
+        }
+        if self.args.via_title_events:
+            # KraftAPI.log_title_event と同じ形式で title_events に記録
+            self.db.seed(f"{self.module.TITLE_EVENT_CONFIG['collection']}/{uuid.uuid4().hex}", event)
+        else:
+            await bot.handle_title_event(event)
+
+    def make_event(self, kind: str):
+        user_id = str(self.random.choice(self.users).id)
+        if kind == "message":
+            return user_id, "message", {"channel_id": self.random.randrange(self.args.channels)}
+        if kind == "quest":
+            event_type = "quest_complete" if self.random.random() < 0.7 else "quest_failure"
+            return user_id, event_type, {}
+        event_type = self.random.choice(ECONOMIC_EVENTS)
+        return user_id, event_type, {
+            "amount": self.random.randint(100, 5000),
+            "resulted_in_zero": self.random.random() < self.args.zero_ratio
+        }
+
+    async def generate(self, bot, kind: str, rate: float, deadline: float):
+        """指定レート（件/秒、ポアソン到着）でイベントを投入"""
+        if rate <= 0:
+            return
+        next_at = time.perf_counter()
+        while True:
+            next_at += self.random.expovariate(rate)
+            if next_at >= deadline:
+                return
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.inject(bot, *self.make_event(kind))
+            self.event_counts[kind] += 1
+
+    async def sample_depth(self, bot, start: float):
+        """待ち件数を一定間隔で記録"""
+        while True:
+            stats = bot.title_checks.get_stats()
+            self.depth_samples.append({
+                "t": round(time.perf_counter() - start, 3),
+                "title_checks": stats["depth"],
+                "in_flight": stats["in_flight"],
+                "notifications": len(bot.notifications),
+                "monthly_activity": len(bot.monthly_activity),
+                "title_events": self.injected_events - bot.event_consumer.stats["processed"] if self.args.via_title_events else 0
+            })
+            await asyncio.sleep(self.args.sample_interval)
+
+    async def flush_monthly_activity(self, bot):
+        """月間アクティビティの定期書き込み（monthly_activity_flush 相当）"""
+        while True:
+            await asyncio.sleep(self.args.flush_interval)
+            await bot.monthly_activity.flush()
+
+    def drained(self, bot) -> bool:
+        if self.args.via_title_events and bot.event_consumer.stats["processed"] < self.injected_events:
+            return False
+        stats = bot.title_checks.get_stats()
+        return (stats["depth"] == 0 and stats["in_flight"] == 0 and len(bot.notifications) == 0
+                and set(self.granted) <= set(self.notified))
+
+    # =====================================
+    # 実行
+    # =====================================
+
+    async def run(self) -> Dict[str, Any]:
+        bot = self.create_bot()
+        stats_before = self.db.stats.snapshot()
+        start = time.perf_counter()
+        deadline = start + self.args.duration
+        background = [
+            asyncio.create_task(self.sample_depth(bot, start)),
+            asyncio.create_task(self.flush_monthly_activity(bot))
+        ]
+
+        await asyncio.gather(
+            self.generate(bot, "message", self.args.message_rate, deadline),
+            self.generate(bot, "quest", self.args.quest_rate, deadline),
+            self.generate(bot, "economic", self.args.economic_rate, deadline)
+        )
+        inject_elapsed = time.perf_counter() - start
+
+        # 投入済みイベントの処理・通知が終わるまで待機
+        drain_deadline = time.perf_counter() + self.args.drain_timeout
+        while not self.drained(bot) and time.perf_counter() < drain_deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        await bot.monthly_activity.flush()
+        stats_after = self.db.stats.snapshot()
+
+        tasks = background + bot.title_check_workers + [bot.notifications._task, bot.event_consumer._task]
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*(task for task in tasks if task is not None), return_exceptions=True)
+
+        return self.build_result(bot, inject_elapsed, elapsed, stats_before, stats_after)
+
+    def build_result(self, bot, inject_elapsed: float, elapsed: float,
+                     stats_before: Dict[str, int], stats_after: Dict[str, int]) -> Dict[str, Any]:
+        total = self.injected_events
+        grant_samples = [self.granted[key] - crossed_at for key, crossed_at in self.crossed.items() if key in self.granted]
+        notify_samples = [self.notified[key] - crossed_at for key, crossed_at in self.crossed.items() if key in self.notified]
+        depths = [sample["title_checks"] for sample in self.depth_samples] or [0]
+        notification_stats = bot.notifications.stats
+        check_stats = bot.title_checks.get_stats()
+
+        def per_event(key: str) -> float:
+            return round((stats_after[key] - stats_before[key]) / total, 3) if total else 0.0
+
+        return {
+            "elapsed_sec": round(elapsed, 4),
+            "events": dict(self.event_counts, total=total,
+                           rate_per_sec=round(total / inject_elapsed, 1) if inject_elapsed > 0 else 0.0),
+            "grant_latency": summarize_latency(grant_samples),
+            "notify_latency": summarize_latency(notify_samples),
+            "titles": {
+                "granted": len(self.granted),
+                "notified": len(self.notified),
+                "missed": len(set(self.crossed) - set(self.granted)),
+                "unattributed": len(set(self.granted) - set(self.crossed))
+            },
+            "queue_depth": {
+                "title_checks_max": max(depths),
+                "title_checks_avg": round(sum(depths) / len(depths), 2),
+                "notifications_max": max((sample["notifications"] for sample in self.depth_samples), default=0),
+                "title_events_max": max((sample["title_events"] for sample in self.depth_samples), default=0),
+                "timeline": self.depth_samples
+            },
+            "firestore": {
+                "reads": stats_after["reads"] - stats_before["reads"],
+                "writes": stats_after["writes"] - stats_before["writes"],
+                "reads_per_event": per_event("reads"),
+                "writes_per_event": per_event("writes"),
+                "calls_per_event": per_event("calls")
+            },
+            "title_checks": {key: check_stats[key] for key in ("enqueued", "coalesced", "processed", "errors", "max_depth")},
+            "notifications": {
+                "messages": notification_stats["messages"],
+                "embeds": notification_stats["embeds"],
+                "messages_per_sec": round(notification_stats["messages"] / elapsed, 2) if elapsed > 0 else 0.0,
+                "embeds_per_sec": round(notification_stats["embeds"] / elapsed, 2) if elapsed > 0 else 0.0,
+                "rate_limited": notification_stats["rate_limited"],
+                "failures": notification_stats["failures"]
+            }
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KRAFT称号Bot 負荷ベンチマーク")
+    parser.add_argument("--duration", type=float, default=10.0, help="イベント投入時間(秒)")
+    parser.add_argument("--users", type=int, default=300, help="ユーザー数")
+    parser.add_argument("--channels", type=int, default=12, help="チャンネル数")
+    parser.add_argument("--message-rate", type=float, default=200, help="メッセージイベントのレート(件/秒)")
+    parser.add_argument("--quest-rate", type=float, default=20, help="クエストイベントのレート(件/秒)")
+    parser.add_argument("--economic-rate", type=float, default=50, help="経済イベントのレート(件/秒)")
+    parser.add_argument("--zero-ratio", type=float, default=0.01, help="経済イベントで残高が0になる割合")
+    parser.add_argument("--via-title-events", action="store_true",
+                        help="イベントを title_events に記録し、イベント読み込み処理を経由して投入")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Firestore呼び出しごとの遅延(ミリ秒)")
+    parser.add_argument("--send-latency-ms", type=float, default=50.0, help="通知メッセージ送信ごとの遅延(ミリ秒)")
+    parser.add_argument("--workers", type=int, default=4, help="称号チェックワーカー数")
+    parser.add_argument("--coalesce-window", type=float, default=3.0, help="同一ユーザーのチェック間隔(秒)")
+    parser.add_argument("--gather-delay", type=float, default=0.5, help="通知をまとめる待ち時間(秒)")
+    parser.add_argument("--flush-interval", type=float, default=10.0, help="月間アクティビティの書き込み間隔(秒)")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="title_events の確認間隔(秒)")
+    parser.add_argument("--sample-interval", type=float, default=0.25, help="待ち件数の記録間隔(秒)")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="投入終了後に処理完了を待つ最大時間(秒)")
+    parser.add_argument("--seed", type=int, default=42, help="乱数シード")
+    parser.add_argument("--json", dest="json_path", default=None, help="結果をJSONで保存するパス（待ち件数の推移を含む）")
+    parser.add_argument("--verbose", action="store_true", help="Botのログ出力を表示")
+    args = parser.parse_args()
+
+    # Botのログ出力は計測ノイズになるため既定で抑制
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(open(os.devnull, "w")))
+            logging.disable(logging.INFO)
+        benchmark = TitleBotBenchmark(args)
+        result = asyncio.run(benchmark.run())
+
+    print("\n📊 KRAFT称号Bot ベンチマーク結果")
+    print(f"  Firestore遅延: {args.latency_ms}ms / 送信遅延: {args.send_latency_ms}ms / ユーザー数: {args.users} / "
+          f"投入経路: {'title_events' if args.via_title_events else '直接'}")
+    print_result(result)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "result": result}, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 結果を保存しました: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
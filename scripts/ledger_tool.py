@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+KRAFT KR台帳ツール
+残高スナップショットの作成・台帳と残高の照合・仕訳の参照を行うツール
+
+使い方:
+    python scripts/ledger_tool.py snapshot
+    python scripts/ledger_tool.py reconcile [--json report.json]
+    python scripts/ledger_tool.py entries <user_id> [--days 7]
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+import argparse
+import json
+
+from shared.kraft_db import get_db
+from shared.kraft_ledger import KraftLedger, LedgerSequence
+
+
+def run_snapshot(db) -> int:
+    """スナップショット作成"""
+    snapshot = KraftLedger.take_snapshot(db)
+    print(f"✅ スナップショット: {snapshot['watermark']}")
+    print(f"  アカウント数: {snapshot['accounts']:,}")
+    return 0
+
+
+def run_reconcile(db, json_path: str = None) -> int:
+    """スナップショット作成後に全ユーザーの残高を照合"""
+    KraftLedger.take_snapshot(db)
+    report = KraftLedger.reconcile(db)
+
+    print(f"🔍 台帳照合 (スナップショット: {report['watermark']})")
+    print(f"  照合ユーザー数: {report['checked']:,} (照合中に取引があり対象外: {report['skipped']:,})")
+    print(f"  差分仕訳数: {report['tail_entries']:,} (照合境界以降: {report['recent_entries']:,})")
+    print(f"  不一致: {report['mismatch_count']:,}件")
+    for mismatch in report["mismatches"]:
+        balance = "なし" if mismatch["balance"] is None else f"{mismatch['balance']:,} KR"
+        print(f"    {mismatch['user_id']}: 残高 {balance} / 台帳 {mismatch['ledger_balance']:,} KR")
+    if report["consistent"]:
+        print(f"  貸借差額: {report['imbalance']:,} KR")
+    else:
+        print(f"  貸借差額: {report['imbalance']:,} KR（照合中の書き込みが続いたため未確定）")
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ レポートを保存しました: {json_path}")
+
+    # systemdのタイマーから実行した場合に失敗として検知できるよう終了コードで返す
+    return 1 if report["mismatch_count"] or (report["consistent"] and report["imbalance"]) else 0
+
+
+def run_entries(db, user_id: str, days: int) -> int:
+    """ユーザーの仕訳一覧"""
+    start_seq = LedgerSequence.watermark((datetime.now() - timedelta(days=days)).timestamp())
+    total = 0
+    for entry in KraftLedger.iter_entries(start_seq=start_seq, account=user_id, db=db):
+        created_at = datetime.fromtimestamp(int(entry["s"][:13]) / 1000)
+        print(f"  {created_at:%Y-%m-%d %H:%M:%S}  {entry['d']:+,} KR  {entry['r']} ({entry['c']})")
+        total += entry["d"]
+    print(f"📒 過去{days}日間の増減: {total:+,} KR")
+    print(f"💰 台帳上の残高: {KraftLedger.get_ledger_balance(user_id, db):,} KR")
+    return 0
+
+
+def main():
+    """メイン実行関数"""
+    parser = argparse.ArgumentParser(description="KRAFT KR台帳ツール")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("snapshot", help="残高スナップショットを作成")
+
+    reconcile_parser = subparsers.add_parser("reconcile", help="台帳と残高を照合")
+    reconcile_parser.add_argument("--json", dest="json_path", default=None, help="照合レポートの保存先")
+
+    entries_parser = subparsers.add_parser("entries", help="ユーザーの仕訳を表示")
+    entries_parser.add_argument("user_id", help="ユーザーID")
+    entries_parser.add_argument("--days", type=int, default=7, help="表示する期間(日)")
+
+    args = parser.parse_args()
+    db = get_db()
+
+    if args.command == "snapshot":
+        return run_snapshot(db)
+    if args.command == "reconcile":
+        return run_reconcile(db, args.json_path)
+    return run_entries(db, args.user_id, args.days)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -33,6 +33,7 @@ sudo -u kraftbot mkdir -p /home/kraftbot/kraft-bot-system/logs
 # Copy service files
 log "Installing systemd service files..."
 cp /home/kraftbot/kraft-bot-system/systemd/*.service /etc/systemd/system/
+cp /home/kraftbot/kraft-bot-system/systemd/*.timer /etc/systemd/system/
 
 # Reload systemd
 log "Reloading systemd daemon..."
@@ -45,6 +46,10 @@ for service in kraft-central-bank kraft-community kraft-title kraft-stock-market
     log "Enabled $service"
 done
 
+# Enable ledger reconciliation timer
+systemctl enable --now kraft-ledger-reconcile.timer
+log "Enabled kraft-ledger-reconcile.timer"
+
 # Start services
 log "Starting services..."
 for service in kraft-central-bank kraft-community kraft-title kraft-stock-market; do
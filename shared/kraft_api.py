@@ -2,15 +2,325 @@
 # 責務: Bot間での統一されたAPI通信インターフェース提供
 
 import aiohttp
+import asyncio
 import firebase_admin
 from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists, NotFound
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 import datetime
+from shared.kraft_db import get_db, run_db
+from shared.kraft_ledger import KraftLedger, SYSTEM_MINT
+from shared.kraft_user_cache import user_cache
+from shared.kraft_user_record import UserRecord
+from shared.kraft_title_conditions import TITLE_SYSTEM_PREDICATES
+from shared.kraft_config import LEVEL_SYSTEM
 
 # ロギング設定
 logger = logging.getLogger(__name__)
 
+
+def _credit_user(db, user_id: str, amount: int, reason: str):
+    """残高のアトミック加算と台帳仕訳を1回のコミットで記録（未登録ユーザーは初期残高つきで作成）"""
+    user_ref = db.collection("users").document(user_id)
+    
+    batch = db.batch()
+    batch.update(user_ref, {"balance": firestore.Increment(amount)})
+    KraftLedger.post(batch, user_id, amount, SYSTEM_MINT, reason, db=db)
+    try:
+        batch.commit()
+    except NotFound:
+        # 新規ユーザー初期化（同時に作成された場合は作成側の残高に加算し直す）
+        record = UserRecord.new(user_id)
+        record.balance += amount
+        batch = db.batch()
+        batch.create(user_ref, record.changes())
+        KraftLedger.post(batch, user_id, amount, SYSTEM_MINT, reason, db=db)
+        try:
+            batch.commit()
+        except AlreadyExists:
+            batch = db.batch()
+            batch.update(user_ref, {"balance": firestore.Increment(amount)})
+            KraftLedger.post(batch, user_id, amount, SYSTEM_MINT, reason, db=db)
+            batch.commit()
+
+
+@firestore.transactional
+def apply_debit(transaction, db, user_ref, amount: int, counter_account: str, reason: str) -> Dict[str, Any]:
+    """
+    残高が足りる場合のみ減額し、同じコミットで台帳仕訳を記録
+    Args:
+        transaction: Firestoreトランザクション
+        db: Firestoreクライアント
+        user_ref: ユーザードキュメント参照
+        amount: 減額するKR
+        counter_account: 相手勘定
+        reason: 減額理由
+    Returns:
+        Dict: success と減額前の残高（ユーザーが存在しない場合はNone）
+    """
+    user_doc = user_ref.get(transaction=transaction)
+    if not user_doc.exists:
+        return {"success": False, "balance": None}
+    
+    balance = user_doc.to_dict().get("balance", 0)
+    if balance < amount:
+        return {"success": False, "balance": balance}
+    
+    transaction.update(user_ref, {"balance": firestore.Increment(-amount)})
+    KraftLedger.post(transaction, user_ref.id, -amount, counter_account, reason, db=db)
+    return {"success": True, "balance": balance}
+
+
+# =====================================
+# 一括付与・一括減額
+# =====================================
+
+BULK_CONFIG = {
+    "batch_size": 500,     # 1コミットあたりの最大書き込み操作数（Firestoreの上限）
+    "max_concurrency": 4,  # 同時に実行するコミット数
+    "max_attempts": 5      # 新規ユーザー作成の競合などで再試行する回数
+}
+
+
+def _group_bulk_entries(entries: List[Tuple[str, int, str]]) -> Dict[str, List[Tuple[int, str]]]:
+    """(ユーザーID, 金額, 理由) をユーザーごとにまとめる（同一ユーザーの残高更新は1回にする）"""
+    grouped = {}
+    for user_id, amount, reason in entries:
+        grouped.setdefault(str(user_id), []).append((amount, reason))
+    return grouped
+
+
+def _chunk_bulk_users(grouped: Dict[str, List[Tuple[int, str]]]) -> List[List[str]]:
+    """1コミットの書き込み操作数が上限に収まるようユーザーを分割"""
+    chunks = []
+    current = []
+    ops = 1  # システム勘定の集計書き込み
+    for user_id, postings in grouped.items():
+        cost = 1 + len(postings)  # 残高更新 + 仕訳
+        if current and ops + cost > BULK_CONFIG["batch_size"]:
+            chunks.append(current)
+            current = []
+            ops = 1
+        current.append(user_id)
+        ops += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _credit_chunk(db, user_ids: List[str], grouped: Dict[str, List[Tuple[int, str]]],
+                  counter_account: str, txid: str) -> Dict[str, bool]:
+    """1チャンク分の付与（既存ユーザーはアトミック加算、未登録ユーザーは初期残高つきで作成）"""
+    refs = [db.collection("users").document(user_id) for user_id in user_ids]
+    existing = None  # 初回は全員既存として読み取りなしでコミット
+
+    for _ in range(BULK_CONFIG["max_attempts"]):
+        batch = db.batch()
+        postings = []
+        for ref in refs:
+            amount = sum(amount for amount, _ in grouped[ref.id])
+            if existing is None or ref.id in existing:
+                batch.update(ref, {"balance": firestore.Increment(amount)})
+            else:
+                record = UserRecord.new(ref.id)
+                record.balance += amount
+                batch.create(ref, record.changes())
+            postings.extend((ref.id, amount, reason) for amount, reason in grouped[ref.id])
+        KraftLedger.post_many(batch, postings, counter_account, txid, db=db)
+
+        try:
+            batch.commit()
+            return {user_id: True for user_id in user_ids}
+        except (NotFound, AlreadyExists):
+            existing = {doc.id for doc in db.get_all(refs) if doc.exists}
+
+    logger.error(f"一括付与チャンク失敗: {len(user_ids)}ユーザー ({txid})")
+    return {user_id: False for user_id in user_ids}
+
+
+@firestore.transactional
+def _apply_debit_chunk(transaction, db, refs, grouped: Dict[str, List[Tuple[int, str]]],
+                       counter_account: str, txid: str) -> Dict[str, bool]:
+    """1チャンク分の減額（残高が合計額以上のユーザーのみ減額）"""
+    results = {}
+    postings = []
+    for user_doc in transaction.get_all(refs):
+        amount = sum(amount for amount, _ in grouped[user_doc.id])
+        if not user_doc.exists or user_doc.to_dict().get("balance", 0) < amount:
+            results[user_doc.id] = False
+            continue
+        transaction.update(user_doc.reference, {"balance": firestore.Increment(-amount)})
+        postings.extend((user_doc.id, -amount, reason) for amount, reason in grouped[user_doc.id])
+        results[user_doc.id] = True
+
+    if postings:
+        KraftLedger.post_many(transaction, postings, counter_account, txid, db=db)
+    return results
+
+
+def _debit_chunk(db, user_ids: List[str], grouped: Dict[str, List[Tuple[int, str]]],
+                 counter_account: str, txid: str) -> Dict[str, bool]:
+    refs = [db.collection("users").document(user_id) for user_id in user_ids]
+    transaction = db.transaction(max_attempts=BULK_CONFIG["max_attempts"])
+    return _apply_debit_chunk(transaction, db, refs, grouped, counter_account, txid)
+
+
+async def _run_bulk(entries: List[Tuple[str, int, str]], reason: str, counter_account: str,
+                    chunk_func) -> Dict[str, Any]:
+    """チャンクを並列数を制限して実行し、結果を1件のサマリーとして台帳に記録"""
+    db = get_db()
+    txid = KraftLedger.new_txid()
+    grouped = _group_bulk_entries(entries)
+    semaphore = asyncio.Semaphore(BULK_CONFIG["max_concurrency"])
+
+    async def run_chunk(user_ids: List[str]) -> Dict[str, bool]:
+        async with semaphore:
+            try:
+                return await run_db(chunk_func, db, user_ids, grouped, counter_account, txid)
+            except Exception as e:
+                logger.error(f"一括処理チャンクエラー: {e}")
+                return {user_id: False for user_id in user_ids}
+
+    results = {}
+    for chunk_results in await asyncio.gather(*(run_chunk(chunk) for chunk in _chunk_bulk_users(grouped))):
+        results.update(chunk_results)
+    for user_id in results:
+        user_cache.invalidate(user_id)
+
+    succeeded = [user_id for user_id, success in results.items() if success]
+    summary = {
+        "counter_account": counter_account,
+        "users": len(results),
+        "success_count": len(succeeded),
+        "failure_count": len(results) - len(succeeded),
+        "total_amount": sum(amount for user_id in succeeded for amount, _ in grouped[user_id])
+    }
+    await run_db(KraftLedger.record_bulk_summary, txid, reason, summary, db=db)
+    logger.info(f"一括処理完了: {reason} {summary['success_count']}/{summary['users']}ユーザー "
+                f"計{summary['total_amount']}KR ({txid})")
+    return {"txid": txid, "results": results, **summary}
+
+
+# =====================================
+# XP付与
+# =====================================
+
+def _daily_xp_cap(level: int) -> int:
+    """レベルごとの日次XP上限"""
+    if level > 60:
+        return 4000
+    if level > 30:
+        return 3000
+    if level > 10:
+        return 2000
+    return 1000  # 基本上限
+
+
+@firestore.transactional
+def apply_xp(transaction, user_ref, xp_amount: int, is_exempt: bool) -> Dict[str, Any]:
+    """
+    XP追加とレベルアップ判定（最新のユーザーデータを読み取り、同じトランザクションで書き込む）
+    Returns:
+        Dict: old_level・new_level・kr_reward・daily_capped（日次上限で付与しなかった場合True）
+    """
+    user_doc = user_ref.get(transaction=transaction)
+    record = UserRecord.from_snapshot(user_doc)
+    
+    if record is None:
+        # 新規ユーザー初期化
+        record = UserRecord.new(user_ref.id)
+        record.xp = xp_amount
+        transaction.set(user_ref, record.changes())
+        return {"old_level": 1, "new_level": 1, "kr_reward": 0, "daily_capped": False}
+    
+    current_level = record.level
+    
+    # 日次XP上限チェック
+    if not is_exempt:
+        if record.daily_xp >= _daily_xp_cap(current_level):
+            return {"old_level": current_level, "new_level": current_level, "kr_reward": 0, "daily_capped": True}
+        record.daily_xp += xp_amount
+    
+    # XP追加・レベルアップ判定
+    new_xp = record.xp + xp_amount
+    new_level = current_level
+    while new_xp >= new_level * 100:
+        new_xp -= new_level * 100
+        new_level += 1
+    
+    # 変更されたフィールドのみ書き込み
+    record.level = new_level
+    record.xp = new_xp
+    if record.dirty:
+        transaction.update(user_ref, record.changes())
+    
+    # レベルアップ報酬計算
+    kr_reward = new_level * 1000 if new_level > current_level else 0
+    return {"old_level": current_level, "new_level": new_level, "kr_reward": kr_reward, "daily_capped": False}
+
+
+# =====================================
+# 称号付与
+# =====================================
+
+@firestore.transactional
+def apply_level_titles(transaction, user_ref) -> List[str]:
+    """
+    レベル系称号の判定と付与（最新の称号一覧を読み取り、同じトランザクションで追加）
+    初期称号は判定対象外（保存されている一覧が既定値と異なっても付与済みとして扱う）
+    Returns:
+        List[str]: 新しく獲得した称号（レベル順）
+    """
+    record = UserRecord.from_snapshot(user_ref.get(transaction=transaction))
+    if record is None:
+        return []
+    
+    current_titles = set(record.titles) | set(LEVEL_SYSTEM["initial_titles"])
+    new_titles = [title_name for title_name, condition in TITLE_SYSTEM_PREDICATES["level_titles"].items()
+                  if title_name not in current_titles and condition(record)]
+    
+    # 末尾に追加（ArrayUnion は未登録の要素のみ末尾に追加するため、既存の順序を維持）
+    if new_titles:
+        transaction.update(user_ref, {"titles": firestore.ArrayUnion(new_titles)})
+    return new_titles
+
+
+# =====================================
+# 複数ユーザー一括読み取り
+# =====================================
+
+MULTI_GET_CHUNK_SIZE = 1000  # 1回の一括取得で読むドキュメント数
+
+
+def _level_info(record: UserRecord) -> Dict[str, Any]:
+    """ユーザーデータからレベル情報を作成"""
+    return {
+        "level": record.level,
+        "xp": record.xp,
+        "titles": list(record.titles),
+        "balance": record.balance,
+        "daily_xp": record.daily_xp
+    }
+
+
+async def _get_users_data(user_ids: List[str],
+                          cache: Optional[Dict[str, UserRecord]] = None) -> Dict[str, UserRecord]:
+    """
+    重複を除いたユーザーIDをまとめて取得（共通キャッシュにないユーザーのみ一括読み取り）
+    Returns:
+        Dict: ユーザーIDごとのデータ（未登録ユーザーは既定値）
+    """
+    unique_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+    users = {}
+    for start in range(0, len(unique_ids), MULTI_GET_CHUNK_SIZE):
+        users.update(await user_cache.fetch_many(unique_ids[start:start + MULTI_GET_CHUNK_SIZE]))
+
+    if cache is not None:
+        cache.update({user_id: record for user_id, record in users.items() if record is not None})
+    return {user_id: record or UserRecord.new(user_id) for user_id, record in users.items()}
+
+
 class KraftAPI:
     """Bot間通信用統一APIクラス"""
     
@@ -20,7 +330,7 @@ class KraftAPI:
         Args:
             db_client: Firestoreクライアント（オプション）
         """
-        self.db = db_client or firestore.client()
+        self.db = db_client or get_db()
     
     # =====================================
     # 中央銀行API（KR管理）
@@ -29,7 +339,7 @@ class KraftAPI:
     @staticmethod
     async def add_kr(user_id: str, amount: int, reason: str) -> bool:
         """
-        中央銀行にKR追加を依頼
+        中央銀行にKR追加を依頼（残高のアトミック加算と台帳仕訳を1回のコミットで記録）
         Args:
             user_id: ユーザーID
             amount: 追加するKR
@@ -38,25 +348,8 @@ class KraftAPI:
             bool: 成功時True
         """
         try:
-            db = firestore.client()
-            user_ref = db.collection("users").document(user_id)
-            user_doc = user_ref.get()
-            
-            if user_doc.exists:
-                current_balance = user_doc.to_dict().get("balance", 0)
-                user_ref.update({"balance": current_balance + amount})
-            else:
-                # 新規ユーザー初期化
-                user_ref.set({
-                    "balance": 1000 + amount,
-                    "level": 1,
-                    "xp": 0,
-                    "titles": ["偉大なる一歩"],
-                    "created_at": datetime.datetime.utcnow().isoformat()
-                })
-            
-            # 取引ログ記録
-            await KraftAPI.log_transaction(user_id, "add_kr", amount, reason=reason)
+            await run_db(_credit_user, get_db(), user_id, amount, reason)
+            user_cache.invalidate(user_id)
             
             logger.info(f"KR付与成功: {user_id} +{amount}KR ({reason})")
             return True
@@ -68,7 +361,7 @@ class KraftAPI:
     @staticmethod
     async def subtract_kr(user_id: str, amount: int, reason: str) -> bool:
         """
-        中央銀行にKR減額を依頼
+        中央銀行にKR減額を依頼（残高確認・減額・台帳仕訳を1つのトランザクションで実行）
         Args:
             user_id: ユーザーID
             amount: 減額するKR
@@ -77,24 +370,18 @@ class KraftAPI:
             bool: 成功時True
         """
         try:
-            db = firestore.client()
+            db = get_db()
             user_ref = db.collection("users").document(user_id)
-            user_doc = user_ref.get()
+            result = await run_db(apply_debit, db.transaction(), db, user_ref, amount, SYSTEM_MINT, reason)
+            user_cache.invalidate(user_id)
             
-            if not user_doc.exists:
+            if result["balance"] is None:
                 logger.warning(f"KR減額失敗: ユーザーが存在しません ({user_id})")
                 return False
-            
-            current_balance = user_doc.to_dict().get("balance", 0)
-            if current_balance < amount:
-                logger.warning(f"KR減額失敗: 残高不足 ({user_id}, {current_balance} < {amount})")
+            if not result["success"]:
+                logger.warning(f"KR減額失敗: 残高不足 ({user_id}, {result['balance']} < {amount})")
                 return False
             
-            user_ref.update({"balance": current_balance - amount})
-            
-            # 取引ログ記録
-            await KraftAPI.log_transaction(user_id, "subtract_kr", amount, reason=reason)
-            
             logger.info(f"KR減額成功: {user_id} -{amount}KR ({reason})")
             return True
             
@@ -102,36 +389,55 @@ class KraftAPI:
             logger.error(f"KR減額エラー: {e}")
             return False
     
+    @staticmethod
+    async def add_kr_many(entries: List[Tuple[str, int, str]], reason: str = "bulk_add",
+                          counter_account: str = SYSTEM_MINT) -> Dict[str, Any]:
+        """
+        複数ユーザーへのKR一括付与（配当・イベント報酬など）
+        Args:
+            entries: (ユーザーID, 付与するKR, 理由) のリスト
+            reason: 一括処理全体の理由（サマリー記録用）
+            counter_account: 相手勘定
+        Returns:
+            Dict: txid・ユーザーごとの成否（results）・成功/失敗件数・付与総額
+        """
+        return await _run_bulk(entries, reason, counter_account, _credit_chunk)
+    
+    @staticmethod
+    async def subtract_kr_many(entries: List[Tuple[str, int, str]], reason: str = "bulk_subtract",
+                               counter_account: str = SYSTEM_MINT) -> Dict[str, Any]:
+        """
+        複数ユーザーからのKR一括減額（残高不足・未登録のユーザーは減額せず失敗として返す）
+        Args:
+            entries: (ユーザーID, 減額するKR, 理由) のリスト
+            reason: 一括処理全体の理由（サマリー記録用）
+            counter_account: 相手勘定
+        Returns:
+            Dict: txid・ユーザーごとの成否（results）・成功/失敗件数・減額総額
+        """
+        return await _run_bulk(entries, reason, counter_account, _debit_chunk)
+    
     @staticmethod
     async def get_balance(user_id: str) -> int:
         """
-        残高照会（新規ユーザー自動初期化）
+        残高照会（表示用にキャッシュから読み取り。新規ユーザー自動初期化）
         Args:
             user_id: ユーザーID
         Returns:
             int: 現在の残高
         """
         try:
-            db = firestore.client()
-            user_ref = db.collection("users").document(user_id)
-            user_doc = user_ref.get()
+            record = await user_cache.fetch(user_id)
             
-            if user_doc.exists:
-                return user_doc.to_dict().get("balance", 0)
-            else:
-                # 新規ユーザーの初期化
-                user_data = {
-                    "user_id": user_id,
-                    "balance": 1000,  # 初期残高
-                    "level": 1,
-                    "xp": 0,
-                    "total_donated": 0,
-                    "total_transferred": 0,
-                    "created_at": firestore.SERVER_TIMESTAMP
-                }
-                user_ref.set(user_data)
+            if record is not None:
+                return record.balance
+            
+            # 新規ユーザーの初期化（キャッシュ後に他のBotが作成していた場合は上書きせずに読み直す）
+            record = UserRecord.new(user_id)
+            if await user_cache.create(record):
                 logger.info(f"新規ユーザー初期化: {user_id}")
-                return 1000
+                return record.balance
+            return (await user_cache.fetch(user_id) or record).balance
             
         except Exception as e:
             logger.error(f"残高照会エラー: {e}")
@@ -152,7 +458,7 @@ class KraftAPI:
             bool: 成功時True
         """
         try:
-            db = firestore.client()
+            db = get_db()
             transaction_data = {
                 "user_id": user_id,
                 "type": transaction_type,
@@ -161,7 +467,7 @@ class KraftAPI:
                 "reason": reason,
                 "timestamp": datetime.datetime.utcnow().isoformat()
             }
-            db.collection("transactions").add(transaction_data)
+            await run_db(db.collection("transactions").add, transaction_data)
             return True
             
         except Exception as e:
@@ -185,84 +491,23 @@ class KraftAPI:
             Dict: レベルアップ情報
         """
         try:
-            db = firestore.client()
+            db = get_db()
             user_ref = db.collection("users").document(user_id)
-            user_doc = user_ref.get()
-            
-            if not user_doc.exists:
-                # 新規ユーザー初期化
-                user_data = {
-                    "level": 1,
-                    "xp": xp_amount,
-                    "titles": ["偉大なる一歩"],
-                    "created_at": datetime.datetime.utcnow().isoformat()
-                }
-                user_ref.set(user_data)
-                return {
-                    "level_up": False,
-                    "new_level": 1,
-                    "old_level": 1,
-                    "kr_reward": 0,
-                    "new_titles": []
-                }
-            
-            user_data = user_doc.to_dict()
-            current_level = user_data.get("level", 1)
-            current_xp = user_data.get("xp", 0)
-            
-            # 日次XP上限チェック
-            if not is_exempt:
-                daily_xp = user_data.get("daily_xp", 0)
-                daily_xp_cap = 1000  # 基本上限
-                if current_level > 10:
-                    daily_xp_cap = 2000
-                if current_level > 30:
-                    daily_xp_cap = 3000
-                if current_level > 60:
-                    daily_xp_cap = 4000
-                
-                if daily_xp >= daily_xp_cap:
-                    logger.info(f"日次XP上限到達: {user_id}")
-                    return {
-                        "level_up": False,
-                        "new_level": current_level,
-                        "old_level": current_level,
-                        "kr_reward": 0,
-                        "new_titles": []
-                    }
-                
-                # 日次XP更新
-                user_ref.update({"daily_xp": daily_xp + xp_amount})
-            
-            # XP追加
-            new_xp = current_xp + xp_amount
-            new_level = current_level
-            
-            # レベルアップ判定
-            while new_xp >= new_level * 100:
-                new_xp -= new_level * 100
-                new_level += 1
-            
-            # レベルアップ報酬計算
-            kr_reward = 0
-            if new_level > current_level:
-                kr_reward = new_level * 1000
+            result = await run_db(apply_xp, db.transaction(), user_ref, xp_amount, is_exempt)
+            user_cache.invalidate(user_id)
             
-            # ユーザーデータ更新
-            user_ref.update({
-                "level": new_level,
-                "xp": new_xp
-            })
+            if result["daily_capped"]:
+                logger.info(f"日次XP上限到達: {user_id}")
             
             # レベルアップ報酬のKR付与
-            if kr_reward > 0:
-                await KraftAPI.add_kr(user_id, kr_reward, f"level_up_{new_level}")
+            if result["kr_reward"] > 0:
+                await KraftAPI.add_kr(user_id, result["kr_reward"], f"level_up_{result['new_level']}")
             
             return {
-                "level_up": new_level > current_level,
-                "new_level": new_level,
-                "old_level": current_level,
-                "kr_reward": kr_reward,
+                "level_up": result["new_level"] > result["old_level"],
+                "new_level": result["new_level"],
+                "old_level": result["old_level"],
+                "kr_reward": result["kr_reward"],
                 "new_titles": []
             }
             
@@ -286,32 +531,49 @@ class KraftAPI:
             Dict: レベル情報
         """
         try:
-            db = firestore.client()
-            user_ref = db.collection("users").document(user_id)
-            user_doc = user_ref.get()
-            
-            if user_doc.exists:
-                user_data = user_doc.to_dict()
-                return {
-                    "level": user_data.get("level", 1),
-                    "xp": user_data.get("xp", 0),
-                    "titles": user_data.get("titles", ["偉大なる一歩"]),
-                    "balance": user_data.get("balance", 0),
-                    "daily_xp": user_data.get("daily_xp", 0)
-                }
-            else:
-                return {
-                    "level": 1,
-                    "xp": 0,
-                    "titles": ["偉大なる一歩"],
-                    "balance": 0,
-                    "daily_xp": 0
-                }
+            return _level_info(await user_cache.fetch(user_id) or UserRecord.new(user_id))
                 
         except Exception as e:
             logger.error(f"レベル情報取得エラー: {e}")
             return {"level": 1, "xp": 0, "titles": [], "balance": 0, "daily_xp": 0}
     
+    @staticmethod
+    async def get_balances(user_ids: List[str], cache: Optional[Dict[str, UserRecord]] = None) -> Dict[str, int]:
+        """
+        複数ユーザーの残高を一括照会（未登録ユーザーは初期残高を返し、作成はしない）
+        Args:
+            user_ids: ユーザーIDのリスト（重複可）
+            cache: 取得したユーザーデータを格納する読み取りキャッシュ（オプション）
+        Returns:
+            Dict[str, int]: ユーザーIDごとの残高
+        """
+        try:
+            records = await _get_users_data(user_ids, cache)
+            return {user_id: record.balance for user_id, record in records.items()}
+            
+        except Exception as e:
+            logger.error(f"残高一括照会エラー: {e}")
+            return {str(user_id): 0 for user_id in user_ids}
+    
+    @staticmethod
+    async def get_level_infos(user_ids: List[str], cache: Optional[Dict[str, UserRecord]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        複数ユーザーのレベル情報を一括取得
+        Args:
+            user_ids: ユーザーIDのリスト（重複可）
+            cache: 取得したユーザーデータを格納する読み取りキャッシュ（オプション）
+        Returns:
+            Dict[str, Dict]: ユーザーIDごとのレベル情報
+        """
+        try:
+            records = await _get_users_data(user_ids, cache)
+            return {user_id: _level_info(record) for user_id, record in records.items()}
+            
+        except Exception as e:
+            logger.error(f"レベル情報一括取得エラー: {e}")
+            return {str(user_id): {"level": 1, "xp": 0, "titles": [], "balance": 0, "daily_xp": 0}
+                    for user_id in user_ids}
+    
     # =====================================
     # 称号システムAPI
     # =====================================
@@ -328,14 +590,14 @@ class KraftAPI:
             bool: 成功時True
         """
         try:
-            db = firestore.client()
+            db = get_db()
             event_data = {
                 "user_id": user_id,
                 "type": event_type,
                 "data": data,
                 "timestamp": datetime.datetime.utcnow().isoformat()
             }
-            db.collection("title_events").add(event_data)
+            await run_db(db.collection("title_events").add, event_data)
             return True
             
         except Exception as e:
@@ -352,48 +614,10 @@ class KraftAPI:
             List[str]: 新しく獲得した称号のリスト
         """
         try:
-            db = firestore.client()
-            user_ref = db.collection("users").document(user_id)
-            user_doc = user_ref.get()
-            
-            if not user_doc.exists:
-                return []
-            
-            user_data = user_doc.to_dict()
-            current_titles = set(user_data.get("titles", ["偉大なる一歩"]))
-            new_titles = []
-            
-            # レベル系称号チェック
-            level = user_data.get("level", 1)
-            if level >= 5 and "新人冒険者" not in current_titles:
-                new_titles.append("新人冒険者")
-            if level >= 10 and "冒険者" not in current_titles:
-                new_titles.append("冒険者")
-            if level >= 20 and "熟練冒険者" not in current_titles:
-                new_titles.append("熟練冒険者")
-            if level >= 30 and "探求者" not in current_titles:
-                new_titles.append("探求者")
-            if level >= 40 and "賢者" not in current_titles:
-                new_titles.append("賢者")
-            if level >= 50 and "達人" not in current_titles:
-                new_titles.append("達人")
-            if level >= 60 and "英雄" not in current_titles:
-                new_titles.append("英雄")
-            if level >= 70 and "王者" not in current_titles:
-                new_titles.append("王者")
-            if level >= 80 and "守護者" not in current_titles:
-                new_titles.append("守護者")
-            if level >= 90 and "仙人" not in current_titles:
-                new_titles.append("仙人")
-            if level >= 100 and "生きる伝説" not in current_titles:
-                new_titles.append("生きる伝説")
-            
-            # 新称号がある場合、ユーザーデータを更新
+            db = get_db()
+            new_titles = await run_db(apply_level_titles, db.transaction(), db.collection("users").document(user_id))
             if new_titles:
-                user_ref.update({
-                    "titles": list(current_titles.union(new_titles))
-                })
-            
+                user_cache.invalidate(user_id)
             return new_titles
             
         except Exception as e:
@@ -414,9 +638,9 @@ class KraftAPI:
             Optional[int]: 現在の株価（存在しない場合はNone）
         """
         try:
-            db = firestore.client()
+            db = get_db()
             company_ref = db.collection("companies").document(ticker)
-            company_doc = company_ref.get()
+            company_doc = await run_db(company_ref.get)
             
             if company_doc.exists:
                 return company_doc.to_dict().get("current_price")
@@ -436,9 +660,9 @@ class KraftAPI:
             Dict: ポートフォリオ情報
         """
         try:
-            db = firestore.client()
+            db = get_db()
             portfolio_ref = db.collection("user_investments").document(user_id)
-            portfolio_doc = portfolio_ref.get()
+            portfolio_doc = await run_db(portfolio_ref.get)
             
             if portfolio_doc.exists:
                 return portfolio_doc.to_dict()
@@ -464,7 +688,7 @@ class KraftAPI:
             bool: 成功時True
         """
         try:
-            db = firestore.client()
+            db = get_db()
             transaction_data = {
                 "user_id": user_id,
                 "type": transaction_type,
@@ -474,7 +698,7 @@ class KraftAPI:
                 "fee": fee,
                 "timestamp": datetime.datetime.utcnow().isoformat()
             }
-            db.collection("stock_transactions").add(transaction_data)
+            await run_db(db.collection("stock_transactions").add, transaction_data)
             return True
             
         except Exception as e:
@@ -500,7 +724,7 @@ class KraftAPI:
             bool: 成功時True
         """
         try:
-            db = firestore.client()
+            db = get_db()
             quest_data = {
                 "user_id": user_id,
                 "type": quest_type,
@@ -510,7 +734,7 @@ class KraftAPI:
                 "status": "active",
                 "created_at": datetime.datetime.utcnow().isoformat()
             }
-            db.collection("quests").add(quest_data)
+            await run_db(db.collection("quests").add, quest_data)
             return True
             
         except Exception as e:
@@ -527,9 +751,9 @@ class KraftAPI:
             Dict: 報酬情報
         """
         try:
-            db = firestore.client()
+            db = get_db()
             quest_ref = db.collection("quests").document(quest_id)
-            quest_doc = quest_ref.get()
+            quest_doc = await run_db(quest_ref.get)
             
             if not quest_doc.exists:
                 return {"success": False, "error": "クエストが存在しません"}
@@ -553,7 +777,7 @@ class KraftAPI:
                 await KraftAPI.add_kr(user_id, reward["kr"], f"quest_{quest_id}")
             
             # クエスト状態更新
-            quest_ref.update({"status": "completed"})
+            await run_db(quest_ref.update, {"status": "completed"})
             
             return {
                 "success": True,
@@ -578,20 +802,14 @@ class KraftAPI:
             Dict: ユーザーデータ
         """
         try:
-            db = firestore.client()
-            user_ref = db.collection("users").document(user_id)
-            user_doc = user_ref.get()
+            record = await user_cache.fetch(user_id)
             
-            if not user_doc.exists:
-                return {
-                    "level": 1,
-                    "xp": 0,
-                    "titles": ["偉大なる一歩"],
-                    "balance": 0,
-                    "portfolio_value": 0
-                }
+            if record is None:
+                user_data = _level_info(UserRecord.new(user_id))
+                user_data["portfolio_value"] = 0
+                return user_data
             
-            user_data = user_doc.to_dict()
+            user_data = record.to_dict()
             
             # ポートフォリオ評価額計算
             portfolio = await KraftAPI.get_user_portfolio(user_id)
@@ -626,22 +844,13 @@ class KraftAPI:
             bool: 成功時True
         """
         try:
-            db = firestore.client()
-            user_ref = db.collection("users").document(user_id)
-            
-            user_data = {
-                "level": 1,
-                "xp": 0,
-                "titles": ["偉大なる一歩"],
-                "balance": 1000,
-                "daily_xp": 0,
-                "created_at": datetime.datetime.utcnow().isoformat()
-            }
-            
+            record = UserRecord.new(user_id)
             if username:
-                user_data["username"] = username
+                record.username = username
             
-            user_ref.set(user_data)
+            # 既に存在するユーザーは既定値で上書きせず、ユーザー名のみ更新
+            if not await user_cache.create(record) and username:
+                await user_cache.update(user_id, {"username": username})
             return True
             
         except Exception as e:
@@ -651,9 +860,13 @@ class KraftAPI:
 # 便利関数エイリアス
 add_kr = KraftAPI.add_kr
 subtract_kr = KraftAPI.subtract_kr
+add_kr_many = KraftAPI.add_kr_many
+subtract_kr_many = KraftAPI.subtract_kr_many
 get_balance = KraftAPI.get_balance
 add_xp = KraftAPI.add_xp
 get_level_info = KraftAPI.get_level_info
+get_balances = KraftAPI.get_balances
+get_level_infos = KraftAPI.get_level_infos
 log_title_event = KraftAPI.log_title_event
 check_user_titles = KraftAPI.check_user_titles
 get_stock_price = KraftAPI.get_stock_price
@@ -0,0 +1,70 @@
+# shared/kraft_db.py - Firestore接続共通管理
+# 責務: プロセス共通のFirestoreクライアントと、ブロッキング呼び出しをイベントループ外で実行するスレッドプールの提供
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# =====================================
+# 接続設定
+# =====================================
+
+DB_CONFIG = {
+    "credentials_path": "config/firebase_credentials.json",
+    "executor_workers": 16  # Firestore呼び出し専用スレッド数（gRPCチャネルは全スレッドで共有）
+}
+
+_client = None
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_db():
+    """
+    プロセス共通のFirestoreクライアントを取得（初回のみFirebase初期化）
+    Returns:
+        firestore.Client: 共有クライアント
+    """
+    global _client
+    if _client is None:
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(DB_CONFIG["credentials_path"])
+            firebase_admin.initialize_app(cred)
+        _client = firestore.client()
+    return _client
+
+
+def set_db(client):
+    """共有クライアントを差し替え（ベンチマーク・検証用）"""
+    global _client
+    _client = client
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Firestore呼び出し専用スレッドプールを取得"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=DB_CONFIG["executor_workers"],
+            thread_name_prefix="firestore"
+        )
+    return _executor
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    ブロッキングするFirestore呼び出しを専用スレッドプールで実行
+    Args:
+        func: 実行する関数（例: user_ref.get, batch.commit）
+        *args, **kwargs: 関数の引数
+    Returns:
+        関数の戻り値
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
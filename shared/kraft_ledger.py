@@ -0,0 +1,468 @@
+# shared/kraft_ledger.py - KR複式簿記台帳
+# 責務: 残高変動の追記専用記録・定期残高スナップショット・残高照合
+
+import time
+import zlib
+import random
+import logging
+import datetime
+from typing import Optional, Dict, Any, Iterator
+from firebase_admin import firestore
+from shared.kraft_db import get_db
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# =====================================
+# 台帳設定
+# =====================================
+
+LEDGER_CONFIG = {
+    "entries_collection": "ledger_entries",      # 仕訳（追記専用）
+    "snapshots_collection": "ledger_snapshots",  # 残高スナップショット
+    "system_collection": "ledger_system",        # システム勘定（シャード集計）
+    "system_shards": 10,                         # システム勘定のシャード数
+    "snapshot_chunks": 16,                       # スナップショット1回あたりの分割ドキュメント数
+    "snapshot_lag_seconds": 300,                 # 直近の仕訳はスナップショット対象外（書き込み遅延対策）
+    "opening_balance": 1000,                     # スナップショット未登録ユーザーの期首残高（新規ユーザー初期残高）
+    "page_size": 1000,                           # 仕訳読み込みのページサイズ
+    "reconcile_attempts": 3,                     # 照合時に書き込みが続いている場合の貸借確認の再試行回数
+    "bulk_collection": "ledger_bulk"             # 一括付与・一括減額のサマリー記録
+}
+
+# システム勘定（ユーザー以外の相手勘定）
+SYSTEM_MINT = "system:mint"                      # 報酬・管理者調整によるKR発行/回収
+SYSTEM_COMMUNITY_FUND = "system:community_fund"  # コミュニティ基金（寄付）
+SYSTEM_CASINO = "system:casino"                  # スロット
+SYSTEM_MARKET = "system:market"                  # 株式売買
+SYSTEM_OPENING = "system:opening"                # 台帳導入時の期首残高
+
+
+def is_system_account(account: str) -> bool:
+    """システム勘定かどうかを判定"""
+    return account.startswith("system:")
+
+
+class LedgerSequence:
+    """
+    台帳シーケンス番号（ミリ秒時刻13桁 + プロセス内カウンター4桁 + プロセスタグ8桁）
+    同一プロセス内では単調増加し、文字列比較で時刻順に並ぶ
+    """
+
+    def __init__(self):
+        self._last_ms = 0
+        self._counter = 0
+        self._tag = f"{random.getrandbits(32):08x}"
+
+    def next(self) -> str:
+        now_ms = int(time.time() * 1000)
+        if now_ms <= self._last_ms:
+            # 同一ミリ秒・時計の巻き戻りでは直前の時刻のままカウンターを進める
+            now_ms = self._last_ms
+            self._counter += 1
+        else:
+            self._counter = 0
+        self._last_ms = now_ms
+        return f"{now_ms:013d}{self._counter:04d}{self._tag}"
+
+    @staticmethod
+    def watermark(timestamp: float) -> str:
+        """指定時刻（UNIX秒）の境界値。この値以下のシーケンス番号はそれより前の仕訳"""
+        return f"{int(timestamp * 1000):013d}"
+
+
+_sequence = LedgerSequence()
+
+
+class KraftLedger:
+    """KR複式簿記台帳"""
+
+    # =====================================
+    # 仕訳記録
+    # =====================================
+
+    @staticmethod
+    def post(writer, account: str, delta: int, counter_account: str, reason: str,
+             txid: Optional[str] = None, db=None) -> str:
+        """
+        仕訳を記録（バッチ・トランザクションの書き込みに追加するだけでコミットは呼び出し側）
+        Args:
+            writer: WriteBatch または Transaction
+            account: 残高が変動するユーザーID
+            delta: 残高変動額（増加は正、減少は負）
+            counter_account: 相手勘定（ユーザーIDまたはシステム勘定）
+            reason: 変動理由
+            txid: 取引ID（複数仕訳をまとめる場合に指定）
+            db: Firestoreクライアント（オプション）
+        Returns:
+            str: 取引ID
+        """
+        db = db or get_db()
+        seq = _sequence.next()
+        txid = txid or seq
+
+        writer.set(db.collection(LEDGER_CONFIG["entries_collection"]).document(seq), {
+            "s": seq,
+            "a": account,
+            "d": delta,
+            "c": counter_account,
+            "r": reason,
+            "x": txid,
+            "t": firestore.SERVER_TIMESTAMP
+        })
+
+        # システム勘定側は競合を避けるためシャードにアトミック加算
+        if is_system_account(counter_account):
+            shard_id = f"{counter_account}_{random.randrange(LEDGER_CONFIG['system_shards'])}"
+            writer.set(db.collection(LEDGER_CONFIG["system_collection"]).document(shard_id), {
+                "account": counter_account,
+                "balance": firestore.Increment(-delta)
+            }, merge=True)
+
+        return txid
+
+    @staticmethod
+    def post_transfer(writer, from_account: str, to_account: str, amount: int, reason: str,
+                      txid: Optional[str] = None, db=None) -> str:
+        """
+        ユーザー間送金の借方・貸方仕訳を記録
+        Args:
+            writer: WriteBatch または Transaction
+            from_account: 送金者ID
+            to_account: 受取人ID
+            amount: 送金額
+            reason: 送金理由
+            txid: 取引ID（オプション）
+            db: Firestoreクライアント（オプション）
+        Returns:
+            str: 取引ID
+        """
+        txid = KraftLedger.post(writer, from_account, -amount, to_account, reason, txid=txid, db=db)
+        KraftLedger.post(writer, to_account, amount, from_account, reason, txid=txid, db=db)
+        return txid
+
+    @staticmethod
+    def post_many(writer, postings, counter_account: str, txid: str, db=None) -> int:
+        """
+        システム勘定を相手とする複数ユーザーの仕訳を記録（システム勘定側は合計を1回だけ加算）
+        Args:
+            writer: WriteBatch または Transaction
+            postings: (ユーザーID, 残高変動額, 変動理由) のリスト
+            counter_account: 相手勘定（システム勘定）
+            txid: 取引ID
+            db: Firestoreクライアント（オプション）
+        Returns:
+            int: 書き込み操作数
+        """
+        db = db or get_db()
+        total = 0
+        for account, delta, reason in postings:
+            seq = _sequence.next()
+            writer.set(db.collection(LEDGER_CONFIG["entries_collection"]).document(seq), {
+                "s": seq,
+                "a": account,
+                "d": delta,
+                "c": counter_account,
+                "r": reason,
+                "x": txid,
+                "t": firestore.SERVER_TIMESTAMP
+            })
+            total += delta
+
+        shard_id = f"{counter_account}_{random.randrange(LEDGER_CONFIG['system_shards'])}"
+        writer.set(db.collection(LEDGER_CONFIG["system_collection"]).document(shard_id), {
+            "account": counter_account,
+            "balance": firestore.Increment(-total)
+        }, merge=True)
+        return len(postings) + 1
+
+    @staticmethod
+    def record_bulk_summary(txid: str, reason: str, summary: Dict[str, Any], db=None):
+        """一括処理のサマリーを1件記録（個別の仕訳は取引IDで辿る）"""
+        db = db or get_db()
+        db.collection(LEDGER_CONFIG["bulk_collection"]).document(txid).set({
+            "txid": txid,
+            "reason": reason,
+            **summary,
+            "created_at": firestore.SERVER_TIMESTAMP
+        })
+
+    @staticmethod
+    def new_txid() -> str:
+        """仕訳に紐づける取引IDを発行"""
+        return _sequence.next()
+
+    # =====================================
+    # 仕訳読み込み
+    # =====================================
+
+    @staticmethod
+    def iter_entries(start_seq: Optional[str] = None, end_seq: Optional[str] = None,
+                     account: Optional[str] = None, db=None) -> Iterator[Dict[str, Any]]:
+        """
+        シーケンス番号範囲の仕訳をページ単位で読み込み
+        Args:
+            start_seq: この値より後の仕訳から（省略時は先頭から）
+            end_seq: この値以下の仕訳まで（省略時は末尾まで）
+            account: 特定ユーザーに限定（ユーザーID）
+            db: Firestoreクライアント（オプション）
+        Returns:
+            Iterator[Dict]: シーケンス番号順の仕訳
+        """
+        db = db or get_db()
+        query = db.collection(LEDGER_CONFIG["entries_collection"])
+        if account:
+            query = query.where("a", "==", account)
+        if start_seq:
+            query = query.where("s", ">", start_seq)
+        if end_seq:
+            query = query.where("s", "<=", end_seq)
+        query = query.order_by("s")
+
+        cursor = None
+        while True:
+            page_query = query.limit(LEDGER_CONFIG["page_size"])
+            if cursor:
+                page_query = page_query.start_after({"s": cursor})
+
+            count = 0
+            for entry_doc in page_query.stream():
+                entry = entry_doc.to_dict()
+                cursor = entry["s"]
+                count += 1
+                yield entry
+
+            if count < LEDGER_CONFIG["page_size"]:
+                return
+
+    # =====================================
+    # スナップショット
+    # =====================================
+
+    @staticmethod
+    def _chunk_index(account: str, chunks: int) -> int:
+        return zlib.crc32(account.encode("utf-8")) % chunks
+
+    @staticmethod
+    def get_latest_snapshot(db=None) -> Optional[Dict[str, Any]]:
+        """最新スナップショットのメタデータを取得"""
+        db = db or get_db()
+        query = (db.collection(LEDGER_CONFIG["snapshots_collection"])
+                 .order_by("watermark", direction=firestore.Query.DESCENDING)
+                 .limit(1))
+        for snapshot_doc in query.stream():
+            return snapshot_doc.to_dict()
+        return None
+
+    @staticmethod
+    def load_snapshot_balances(snapshot: Dict[str, Any], db=None) -> Dict[str, int]:
+        """スナップショットの全ユーザー残高を読み込み"""
+        db = db or get_db()
+        balances = {}
+        chunks_ref = (db.collection(LEDGER_CONFIG["snapshots_collection"])
+                      .document(snapshot["watermark"]).collection("chunks"))
+        for chunk_doc in chunks_ref.stream():
+            balances.update(chunk_doc.to_dict().get("balances", {}))
+        return balances
+
+    @staticmethod
+    def take_snapshot(db=None) -> Dict[str, Any]:
+        """
+        残高スナップショットを作成（前回スナップショット + 差分仕訳）
+        初回は users の残高から未反映分の仕訳を差し引いて期首残高を確定
+        Returns:
+            Dict: スナップショットのメタデータ
+        """
+        db = db or get_db()
+        watermark = LedgerSequence.watermark(time.time() - LEDGER_CONFIG["snapshot_lag_seconds"])
+        previous = KraftLedger.get_latest_snapshot(db)
+        opening_balance = LEDGER_CONFIG["opening_balance"]
+
+        if previous:
+            if previous["watermark"] >= watermark:
+                return previous
+            balances = KraftLedger.load_snapshot_balances(previous, db)
+            implicit_openings = previous.get("implicit_openings", 0)
+            for entry in KraftLedger.iter_entries(start_seq=previous["watermark"], end_seq=watermark, db=db):
+                account = entry["a"]
+                if account not in balances:
+                    balances[account] = opening_balance
+                    implicit_openings += 1
+                balances[account] += entry["d"]
+        else:
+            # 初回：現在の残高 - 境界以降の仕訳 = 境界時点の残高
+            balances = {}
+            for user_doc in db.collection("users").stream():
+                balances[user_doc.id] = user_doc.to_dict().get("balance", 0)
+            posted_total = 0
+            for entry in KraftLedger.iter_entries(db=db):
+                if entry["s"] > watermark:
+                    balances[entry["a"]] = balances.get(entry["a"], 0) - entry["d"]
+                else:
+                    posted_total += entry["d"]
+            implicit_openings = 0
+
+            # 期首残高をシステム勘定に計上（台帳全体の合計を0に保つ）
+            opening_total = sum(balances.values()) - posted_total
+            db.collection(LEDGER_CONFIG["system_collection"]).document(f"{SYSTEM_OPENING}_0").set({
+                "account": SYSTEM_OPENING,
+                "balance": firestore.Increment(-opening_total)
+            }, merge=True)
+
+        # 分割して保存
+        chunks = LEDGER_CONFIG["snapshot_chunks"]
+        chunk_balances = [{} for _ in range(chunks)]
+        for account, balance in balances.items():
+            chunk_balances[KraftLedger._chunk_index(account, chunks)][account] = balance
+
+        snapshot_ref = db.collection(LEDGER_CONFIG["snapshots_collection"]).document(watermark)
+        batch = db.batch()
+        for index, chunk in enumerate(chunk_balances):
+            batch.set(snapshot_ref.collection("chunks").document(str(index)), {"balances": chunk})
+
+        snapshot = {
+            "watermark": watermark,
+            "chunks": chunks,
+            "accounts": len(balances),
+            "implicit_openings": implicit_openings,
+            "created_at": datetime.datetime.utcnow().isoformat()
+        }
+        batch.set(snapshot_ref, snapshot)
+        batch.commit()
+
+        logger.info(f"台帳スナップショット作成: {watermark} ({len(balances)}アカウント)")
+        return snapshot
+
+    # =====================================
+    # 残高計算・照合
+    # =====================================
+
+    @staticmethod
+    def get_ledger_balance(user_id: str, db=None) -> int:
+        """
+        台帳から残高を再計算（スナップショット + 以降の仕訳）
+        Args:
+            user_id: ユーザーID
+            db: Firestoreクライアント（オプション）
+        Returns:
+            int: 台帳上の残高
+        """
+        db = db or get_db()
+        snapshot = KraftLedger.get_latest_snapshot(db)
+        balance = LEDGER_CONFIG["opening_balance"]
+        start_seq = None
+
+        if snapshot:
+            start_seq = snapshot["watermark"]
+            chunk_id = str(KraftLedger._chunk_index(user_id, snapshot["chunks"]))
+            chunk_doc = (db.collection(LEDGER_CONFIG["snapshots_collection"]).document(start_seq)
+                         .collection("chunks").document(chunk_id).get())
+            if chunk_doc.exists:
+                balance = chunk_doc.to_dict().get("balances", {}).get(user_id, balance)
+
+        for entry in KraftLedger.iter_entries(start_seq=start_seq, account=user_id, db=db):
+            balance += entry["d"]
+        return balance
+
+    @staticmethod
+    def reconcile(db=None, max_mismatches: int = 100) -> Dict[str, Any]:
+        """
+        全ユーザーの残高を台帳と照合
+        照合はシーケンス番号の境界（現在 - snapshot_lag_seconds）までの仕訳で行い、
+        users の読み取り後に境界より後の仕訳があるユーザーは照合中に残高が動いたため対象外とする
+        貸借の整合性はシステム勘定の読み取り前後で境界以降の仕訳が変わらなかった場合のみ確定
+        Args:
+            db: Firestoreクライアント（オプション）
+            max_mismatches: レポートに含める不一致件数の上限
+        Returns:
+            Dict: 照合結果
+        """
+        db = db or get_db()
+        snapshot = KraftLedger.get_latest_snapshot(db)
+        if not snapshot:
+            raise ValueError("台帳スナップショットがありません。先にスナップショットを作成してください")
+
+        opening_balance = LEDGER_CONFIG["opening_balance"]
+        watermark = max(snapshot["watermark"],
+                        LedgerSequence.watermark(time.time() - LEDGER_CONFIG["snapshot_lag_seconds"]))
+        balances = KraftLedger.load_snapshot_balances(snapshot, db)
+        implicit_openings = snapshot.get("implicit_openings", 0)
+        tail_entries = 0
+
+        # スナップショット以降、境界までの仕訳を反映
+        for entry in KraftLedger.iter_entries(start_seq=snapshot["watermark"], end_seq=watermark, db=db):
+            account = entry["a"]
+            if account not in balances:
+                balances[account] = opening_balance
+                implicit_openings += 1
+            balances[account] += entry["d"]
+            tail_entries += 1
+
+        ledger_total = sum(balances.values())
+
+        actual_balances = {}
+        for user_doc in db.collection("users").stream():
+            actual_balances[user_doc.id] = user_doc.to_dict().get("balance", 0)
+
+        # users の読み取り後に境界より後の仕訳を読み、システム勘定の読み取り前後で変化がなくなるまで再試行
+        consistent = False
+        for _ in range(LEDGER_CONFIG["reconcile_attempts"]):
+            recent = list(KraftLedger.iter_entries(start_seq=watermark, db=db))
+            system_total = 0
+            for system_doc in db.collection(LEDGER_CONFIG["system_collection"]).stream():
+                system_total += system_doc.to_dict().get("balance", 0)
+            recent_after = [entry["s"] for entry in KraftLedger.iter_entries(start_seq=watermark, db=db)]
+            if [entry["s"] for entry in recent] == recent_after:
+                consistent = True
+                break
+
+        in_flight = set()
+        for entry in recent:
+            account = entry["a"]
+            if account not in balances and account not in in_flight:
+                ledger_total += opening_balance
+                implicit_openings += 1
+            in_flight.add(account)
+            ledger_total += entry["d"]
+
+        checked = 0
+        skipped = 0
+        mismatch_count = 0
+        mismatches = []
+        for user_id, actual in actual_balances.items():
+            expected = balances.pop(user_id, opening_balance)
+            if user_id in in_flight:
+                skipped += 1
+                continue
+            checked += 1
+            if actual != expected:
+                mismatch_count += 1
+                if len(mismatches) < max_mismatches:
+                    mismatches.append({"user_id": user_id, "balance": actual, "ledger_balance": expected})
+
+        # users に存在しない台帳アカウント
+        for account, expected in balances.items():
+            if account in in_flight:
+                continue
+            mismatch_count += 1
+            if len(mismatches) < max_mismatches:
+                mismatches.append({"user_id": account, "balance": None, "ledger_balance": expected})
+
+        # 複式簿記の整合性（ユーザー勘定 + システム勘定 = 暗黙の期首残高。境界以降の仕訳を含む）
+        imbalance = ledger_total + system_total - implicit_openings * opening_balance
+
+        return {
+            "watermark": snapshot["watermark"],
+            "reconcile_watermark": watermark,
+            "checked": checked,
+            "skipped": skipped,
+            "tail_entries": tail_entries,
+            "recent_entries": len(recent),
+            "mismatch_count": mismatch_count,
+            "mismatches": mismatches,
+            "ledger_total": ledger_total,
+            "system_total": system_total,
+            "implicit_openings": implicit_openings,
+            "imbalance": imbalance,
+            "consistent": consistent
+        }
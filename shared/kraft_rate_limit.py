@@ -0,0 +1,123 @@
+# shared/kraft_rate_limit.py - 経済コマンドの頻度制限
+# 責務: ユーザー×コマンド種別ごとのトークンバケット（メモリ内で判定し、Firestoreへのアクセス前に連打を拒否）
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+from config.economic_settings import EconomicSettings
+
+# =====================================
+# 制限設定
+# =====================================
+
+# 制限対象のコマンド種別（それぞれ独立したバケットを持つ）
+RATE_LIMIT_FAMILIES = ("transfer", "slot", "donate", "trade")
+
+RATE_LIMIT_CONFIG = {
+    "max_buckets": 20000,    # 保持するバケット数の上限（超えたら最も長く使われていないバケットから破棄）
+    "prune_interval": 60     # 満タンのバケットを掃除する間隔（秒）
+}
+
+
+def get_limit_settings() -> Tuple[int, float]:
+    """
+    EconomicSettings.TRANSACTION_LIMITS から制限値を取得（調整ツールでの変更を即時反映）
+    Returns:
+        Tuple[int, float]: (時間枠内の最大取引数, 時間枠(秒))
+    """
+    limits = EconomicSettings.TRANSACTION_LIMITS
+    return max(1, int(limits["max_transactions_per_window"])), max(1.0, float(limits["transaction_window"]))
+
+
+class TokenBucketLimiter:
+    """
+    トークンバケット方式の頻度制限
+    容量 = 時間枠内の最大取引数、時間枠をかけて満タンまで回復（連続実行は容量まで、以降は平均レートに制限）
+    """
+
+    def __init__(self, capacity: int = None, window: float = None):
+        self._capacity = capacity
+        self._window = window
+        # (種別, ユーザーID) -> [残りトークン, 最終更新時刻]（最終更新時刻の古い順）
+        self._buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+        self.stats = {"allowed": 0, "rejected": 0}
+
+    def _settings(self) -> Tuple[int, float]:
+        capacity, window = get_limit_settings()
+        return self._capacity or capacity, self._window or window
+
+    def acquire(self, user_id: str, family: str) -> Tuple[bool, float]:
+        """
+        トークンを1つ消費
+        Args:
+            user_id: ユーザーID
+            family: コマンド種別（RATE_LIMIT_FAMILIES）
+        Returns:
+            Tuple[bool, float]: (実行可否, 次に実行できるまでの秒数)
+        """
+        if family not in RATE_LIMIT_FAMILIES:
+            raise ValueError(f"不明なコマンド種別: {family}")
+
+        capacity, window = self._settings()
+        rate = capacity / window
+        now = time.monotonic()
+        key = (family, str(user_id))
+
+        with self._lock:
+            if now - self._last_prune > RATE_LIMIT_CONFIG["prune_interval"]:
+                self._prune(now, capacity, rate)
+
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(capacity), now]
+                # 上限を超えたら最も長く使われていないバケットを破棄（回復が最も進んでいるため影響が最小）
+                if len(self._buckets) > RATE_LIMIT_CONFIG["max_buckets"]:
+                    self._buckets.popitem(last=False)
+            else:
+                bucket[0] = min(float(capacity), bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                self.stats["allowed"] += 1
+                return True, 0.0
+
+            self.stats["rejected"] += 1
+            return False, (1.0 - bucket[0]) / rate
+
+    def _prune(self, now: float, capacity: int, rate: float):
+        """
+        満タンまで回復したバケットを古い順に破棄（破棄しても判定結果は変わらない）
+        回復していないバケットに達したら終了するため、処理量は破棄した数に比例
+        """
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if bucket[0] + (now - bucket[1]) * rate < capacity:
+                break
+            del self._buckets[key]
+        self._last_prune = now
+
+    def reset(self, user_id: str = None):
+        """制限をリセット（user_id 省略時は全ユーザー）"""
+        with self._lock:
+            if user_id is None:
+                self._buckets.clear()
+            else:
+                for family in RATE_LIMIT_FAMILIES:
+                    self._buckets.pop((family, str(user_id)), None)
+
+
+def format_retry_after(seconds: float) -> str:
+    """待ち時間の表示"""
+    seconds = max(1, int(seconds + 0.999))
+    if seconds < 60:
+        return f"{seconds}秒"
+    return f"{seconds // 60}分{seconds % 60}秒" if seconds % 60 else f"{seconds // 60}分"
+
+
+# プロセス共通のリミッター
+rate_limiter = TokenBucketLimiter()
@@ -0,0 +1,88 @@
+# shared/kraft_slot.py - スロットエンジン
+# 責務: EconomicSettings.GAMBLING_SETTINGS から配当表を事前計算し、複数スピンをまとめて抽選・集計
+
+import random
+from typing import Dict, Any, List, Tuple
+from config.economic_settings import EconomicSettings
+
+# 配当表に記載のない3つ揃いの既定倍率（設定ファイルに three_match がない場合）
+DEFAULT_THREE_MATCH = 3.0
+
+
+class SlotPayoutTable:
+    """
+    全出目（絵柄数^3通り）の倍率を事前計算した配当表
+    出目はリール3本の絵柄番号を1つの整数にまとめたもの（a * n^2 + b * n + c）
+    """
+
+    def __init__(self, symbols: List[str], payouts: Dict[str, float], house_edge: float):
+        self.symbols = list(symbols)
+        self.house_edge = house_edge
+        n = len(self.symbols)
+        self.outcomes = range(n ** 3)
+        self.multipliers: List[float] = []
+        for outcome in self.outcomes:
+            reels = (self.symbols[outcome // (n * n)], self.symbols[outcome // n % n], self.symbols[outcome % n])
+            distinct = len(set(reels))
+            if distinct == 1:
+                multiplier = payouts.get("".join(reels), payouts.get("three_match", DEFAULT_THREE_MATCH))
+            elif distinct == 2:
+                multiplier = payouts.get("two_match", 0)
+            else:
+                multiplier = 0
+            self.multipliers.append(multiplier * (1 - house_edge))
+
+    @classmethod
+    def from_settings(cls) -> "SlotPayoutTable":
+        settings = EconomicSettings.GAMBLING_SETTINGS
+        return cls(settings["slot_symbols"], settings["slot_payouts"], settings["slot_house_edge"])
+
+    def reels(self, outcome: int) -> List[str]:
+        """出目を絵柄に変換"""
+        n = len(self.symbols)
+        return [self.symbols[outcome // (n * n)], self.symbols[outcome // n % n], self.symbols[outcome % n]]
+
+    def payout(self, outcome: int, bet: int) -> int:
+        """1スピンの払い戻し額（控除率適用済み）"""
+        return int(bet * self.multipliers[outcome])
+
+    @property
+    def return_to_player(self) -> float:
+        """理論上の還元率"""
+        return sum(self.multipliers) / len(self.multipliers)
+
+
+_table_cache: Tuple[Any, SlotPayoutTable] = (None, None)
+
+
+def get_payout_table() -> SlotPayoutTable:
+    """配当表を取得（設定が変わった場合のみ再計算）"""
+    global _table_cache
+    settings = EconomicSettings.GAMBLING_SETTINGS
+    key = (tuple(settings["slot_symbols"]), tuple(sorted(settings["slot_payouts"].items())), settings["slot_house_edge"])
+    if _table_cache[0] != key:
+        _table_cache = (key, SlotPayoutTable.from_settings())
+    return _table_cache[1]
+
+
+def spin(bet: int, spins: int = 1, rng: random.Random = None) -> Dict[str, Any]:
+    """
+    スロットを回す（全スピンの出目を1回の抽選でまとめて決定）
+    Args:
+        bet: 1スピンあたりのベット額
+        spins: スピン回数
+        rng: 乱数生成器（省略時はモジュール共通）
+    Returns:
+        Dict: 各スピンの結果・合計ベット額・合計払い戻し額・差引
+    """
+    table = get_payout_table()
+    outcomes = (rng or random).choices(table.outcomes, k=spins)
+    results = [{"reels": table.reels(outcome), "win": table.payout(outcome, bet)} for outcome in outcomes]
+    total_bet = bet * spins
+    total_win = sum(result["win"] for result in results)
+    return {
+        "results": results,
+        "total_bet": total_bet,
+        "total_win": total_win,
+        "net": total_win - total_bet
+    }
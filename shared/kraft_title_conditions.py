@@ -0,0 +1,247 @@
+# shared/kraft_title_conditions.py - 称号条件コンパイラ
+# 責務: 称号条件の文字列を起動時に1回だけ構文解析し、UserRecordを直接参照する判定関数へ変換（evalは使わない）
+
+import ast
+import datetime
+import operator
+from typing import Dict, Any, Callable, FrozenSet, Iterable, List, Optional, Tuple
+from shared.kraft_config import TITLE_SYSTEM
+
+# =====================================
+# 条件式で参照できるフィールド
+# =====================================
+
+
+def _count(value) -> int:
+    """リストで保存されているフィールドは件数として扱う"""
+    return len(value) if isinstance(value, (list, tuple, set)) else (value or 0)
+
+
+def month_key(now: datetime.datetime = None) -> str:
+    """月次アクティビティのキー（UTCの "YYYY-MM"。月が変わるとキーが変わるためリセット処理は不要）"""
+    return (now or datetime.datetime.utcnow()).strftime("%Y-%m")
+
+
+def _legacy_month(record) -> Optional[str]:
+    """旧形式（トップレベルの monthly_messages / active_channels）の集計月。last_monthly_reset の月に属する"""
+    last_reset = record.get("last_monthly_reset")
+    if isinstance(last_reset, str):
+        try:
+            last_reset = datetime.datetime.fromisoformat(last_reset)
+        except ValueError:
+            return None
+    return month_key(last_reset) if isinstance(last_reset, datetime.datetime) else None
+
+
+def _current_activity(record) -> Dict[str, Any]:
+    month = month_key()
+    activity = (record.monthly_activity or {}).get(month, {})
+    # 移行前に旧形式で記録された今月分は、旧フィールドが更新されないため月次集計に合算する
+    if _legacy_month(record) != month:
+        return activity
+    channels = set(activity.get("channels") or []) | set(record.get("active_channels") or [])
+    return {
+        "messages": activity.get("messages", 0) + (record.get("monthly_messages") or 0),
+        "channels": list(channels)
+    }
+
+
+# 条件式の変数名 -> UserRecordからの取得関数
+CONDITION_FIELDS: Dict[str, Callable[[Any], Any]] = {
+    "level": operator.attrgetter("level"),
+    "monthly_messages": lambda record: _current_activity(record).get("messages", 0),
+    "active_channels": lambda record: _count(_current_activity(record).get("channels")),
+    "completed_quests": operator.attrgetter("completed_quests"),
+    "consecutive_quest_failures": operator.attrgetter("consecutive_quest_failures"),
+    "donation_total": operator.attrgetter("donation_total"),
+    "transfer_total": operator.attrgetter("transfer_total"),
+    "investment_profit": operator.attrgetter("investment_profit"),
+    "became_zero_by_donation": operator.attrgetter("became_zero_by_donation"),
+    "became_zero_by_investment": operator.attrgetter("became_zero_by_investment"),
+    "became_zero_by_transfer": operator.attrgetter("became_zero_by_transfer")
+}
+
+# Firestoreのフィールドをそのまま比較できる変数（範囲クエリで対象ユーザーを絞り込める）
+QUERYABLE_FIELDS = frozenset({
+    "level", "completed_quests", "consecutive_quest_failures", "donation_total", "transfer_total",
+    "investment_profit", "became_zero_by_donation", "became_zero_by_investment", "became_zero_by_transfer"
+})
+
+# 比較演算子 -> Firestoreクエリの演算子
+_QUERY_OPS = {
+    ast.GtE: ">=",
+    ast.Gt: ">",
+    ast.LtE: "<=",
+    ast.Lt: "<",
+    ast.Eq: "==",
+    ast.NotEq: "!="
+}
+
+_COMPARE_OPS = {
+    ast.GtE: operator.ge,
+    ast.Gt: operator.gt,
+    ast.LtE: operator.le,
+    ast.Lt: operator.lt,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne
+}
+
+
+class TitleConditionError(ValueError):
+    """称号条件に使用できない構文・変数が含まれている"""
+
+
+class CompiledCondition:
+    """コンパイル済みの称号条件（呼び出すとUserRecordに対する判定結果を返す）"""
+
+    __slots__ = ("source", "fields", "comparison", "_evaluate")
+
+    def __init__(self, source: str, fields: FrozenSet[str], evaluate: Callable[[Any], bool],
+                 comparison: Optional[Tuple[str, str, Any]] = None):
+        self.source = source
+        self.fields = fields
+        self.comparison = comparison  # 「変数 比較 定数」の条件は (フィールド, クエリ演算子, 値)
+        self._evaluate = evaluate
+
+    def __call__(self, record) -> bool:
+        return bool(self._evaluate(record))
+
+    def __repr__(self):
+        return f"CompiledCondition({self.source!r})"
+
+
+# =====================================
+# コンパイラ
+# =====================================
+
+
+def _compile_node(node: ast.AST, fields: set) -> Callable[[Any], Any]:
+    """許可された構文（比較・and/or/not・変数・数値/真偽値定数）のみを関数に変換"""
+    if isinstance(node, ast.Name):
+        getter = CONDITION_FIELDS.get(node.id)
+        if getter is None:
+            raise TitleConditionError(f"使用できない変数です: {node.id}")
+        fields.add(node.id)
+        return getter
+
+    if isinstance(node, ast.Constant):
+        if not isinstance(node.value, (bool, int, float)):
+            raise TitleConditionError(f"使用できない定数です: {node.value!r}")
+        value = node.value
+        return lambda record: value
+
+    if isinstance(node, ast.Compare):
+        ops = []
+        for op in node.ops:
+            func = _COMPARE_OPS.get(type(op))
+            if func is None:
+                raise TitleConditionError(f"使用できない比較演算子です: {type(op).__name__}")
+            ops.append(func)
+        operands = [_compile_node(node.left, fields)] + [_compile_node(c, fields) for c in node.comparators]
+
+        # よく使う「変数 比較 定数」は1回の関数呼び出しで判定
+        if len(ops) == 1 and isinstance(node.comparators[0], ast.Constant):
+            getter, op, value = operands[0], ops[0], node.comparators[0].value
+            return lambda record: op(getter(record), value)
+
+        def compare(record):
+            left = operands[0](record)
+            for op, operand in zip(ops, operands[1:]):
+                right = operand(record)
+                if not op(left, right):
+                    return False
+                left = right
+            return True
+        return compare
+
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile_node(value, fields) for value in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda record: all(part(record) for part in parts)
+        return lambda record: any(part(record) for part in parts)
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        operand = _compile_node(node.operand, fields)
+        return lambda record: not operand(record)
+
+    raise TitleConditionError(f"使用できない構文です: {type(node).__name__}")
+
+
+def compile_condition(source: str) -> CompiledCondition:
+    """
+    称号条件の文字列をコンパイル
+    Args:
+        source: 条件式（例: "level >= 5", "became_zero_by_donation == True"）
+    Returns:
+        CompiledCondition: 判定関数
+    Raises:
+        TitleConditionError: 構文エラー・許可されていない構文や変数
+    """
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise TitleConditionError(f"条件式の構文エラー: {source} ({e.msg})") from e
+    fields = set()
+    evaluate = _compile_node(tree.body, fields)
+
+    comparison = None
+    body = tree.body
+    if (isinstance(body, ast.Compare) and len(body.ops) == 1 and isinstance(body.left, ast.Name)
+            and isinstance(body.comparators[0], ast.Constant)):
+        comparison = (body.left.id, _QUERY_OPS[type(body.ops[0])], body.comparators[0].value)
+    return CompiledCondition(source, frozenset(fields), evaluate, comparison)
+
+
+def compile_title_conditions(conditions: Dict[str, Dict[str, Any]]) -> Dict[str, CompiledCondition]:
+    """
+    称号設定（称号名 -> {"condition": 条件式, ...}）をまとめてコンパイル
+    Returns:
+        Dict: 称号名ごとの判定関数（定義順を維持）
+    """
+    return {title_name: compile_condition(title_info["condition"]) for title_name, title_info in conditions.items()}
+
+
+def compile_title_system(title_system: Dict[str, Dict[Any, Any]]) -> Dict[str, Dict[str, CompiledCondition]]:
+    """
+    shared/kraft_config.py の TITLE_SYSTEM をコンパイル
+    level_titles（レベル -> 称号名）は "level >= N" の条件として扱う
+    Returns:
+        Dict: 称号種別 -> 称号名 -> 判定関数
+    """
+    compiled = {}
+    for title_type, titles in title_system.items():
+        if title_type == "level_titles":
+            compiled[title_type] = {title_name: compile_condition(f"level >= {int(level)}")
+                                    for level, title_name in sorted(titles.items())}
+        else:
+            compiled[title_type] = compile_title_conditions(titles)
+    return compiled
+
+
+def build_field_index(predicates: Dict[str, CompiledCondition]) -> Dict[str, Tuple[str, ...]]:
+    """
+    フィールド -> そのフィールドを参照する称号名 の索引を作成
+    Args:
+        predicates: 称号名ごとの判定関数
+    Returns:
+        Dict: フィールド名ごとの称号名（predicates の定義順）
+    """
+    index = {}
+    for title_name, condition in predicates.items():
+        for field in condition.fields:
+            index.setdefault(field, []).append(title_name)
+    return {field: tuple(title_names) for field, title_names in index.items()}
+
+
+def titles_for_fields(predicates: Dict[str, CompiledCondition],
+                      field_index: Dict[str, Tuple[str, ...]],
+                      fields: Iterable[str]) -> List[str]:
+    """変更されたフィールドに依存する称号のみを定義順で返す"""
+    affected = set()
+    for field in fields:
+        affected.update(field_index.get(field, ()))
+    return [title_name for title_name in predicates if title_name in affected]
+
+
+# shared/kraft_config.py の称号定義（起動時に1回だけコンパイル）
+TITLE_SYSTEM_PREDICATES = compile_title_system(TITLE_SYSTEM)
@@ -0,0 +1,275 @@
+# shared/kraft_user_cache.py - ユーザーデータ共通キャッシュ
+# 責務: users/{id} の読み取りキャッシュ（LRU・TTL・任意のスナップショットリスナーによる更新）と書き込みスルー
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+from google.api_core.exceptions import AlreadyExists
+from google.cloud.firestore_v1 import transforms
+from shared.kraft_db import get_db, run_db
+from shared.kraft_user_record import UserRecord
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# =====================================
+# キャッシュ設定
+# =====================================
+
+USER_CACHE_CONFIG = {
+    "max_size": 5000,  # キャッシュするユーザー数の上限（超えたら最も古く使われたものから破棄）
+    "ttl": 30,         # キャッシュの有効期間（秒）
+    # users 全体のスナップショットリスナー（開始時に全ユーザー分、以降は他のBotの書き込みごとに読み取りが課金されるため既定は無効。
+    # 無効時は他のBotによる更新はTTL経過後に反映）
+    "listener": False
+}
+
+
+def _can_apply_locally(fields: Dict[str, Any]) -> bool:
+    """書き込み内容をキャッシュへそのまま反映できるか（サーバー側変換・ネスト・ドット記法は不可）"""
+    for key, value in fields.items():
+        if "." in key or isinstance(value, dict):
+            return False
+        if type(value).__module__ == transforms.__name__:
+            return False
+    return True
+
+
+class UserRecordCache:
+    """users コレクションの読み取りキャッシュ"""
+
+    def __init__(self, max_size: int = None, ttl: float = None, db=None):
+        self.max_size = max_size or USER_CACHE_CONFIG["max_size"]
+        self.ttl = ttl if ttl is not None else USER_CACHE_CONFIG["ttl"]
+        self._db = db
+        self._entries = OrderedDict()  # user_id -> (UserRecord（未登録はNone）, 取得時刻)
+        self._lock = threading.Lock()
+        self._watch = None
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @property
+    def db(self):
+        return self._db or get_db()
+
+    # =====================================
+    # キャッシュ操作
+    # =====================================
+
+    def _lookup(self, user_id: str):
+        """有効なキャッシュを返す（見つからない場合は (False, None)）"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                self.stats["misses"] += 1
+                return False, None
+            self._entries.move_to_end(user_id)
+            self.stats["hits"] += 1
+            return True, entry[0]
+
+    def store(self, user_id: str, record: Optional[UserRecord]):
+        """取得したデータをキャッシュ（未登録ユーザーはNone）"""
+        with self._lock:
+            self._entries[user_id] = (record, time.monotonic())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        """キャッシュを破棄（次回読み取りでFirestoreから取得）"""
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def record_write(self, user_id: str, fields: Dict[str, Any], merge: bool = True):
+        """
+        コミット済みの書き込みをキャッシュへ反映（反映できない内容の場合は破棄）
+        Args:
+            user_id: ユーザーID
+            fields: 書き込んだフィールド
+            merge: set(merge=True) / update 相当ならTrue、ドキュメント全体の置き換えならFalse
+        """
+        if not _can_apply_locally(fields):
+            self.invalidate(user_id)
+            return
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if merge and (entry is None or entry[0] is None):
+                # 書き込み前の状態が分からないため破棄
+                self._entries.pop(user_id, None)
+                return
+            if merge:
+                record = entry[0].copy()
+                record.apply(fields)
+            else:
+                record = UserRecord.from_dict(user_id, fields)
+            self._entries[user_id] = (record, entry[1] if entry else time.monotonic())
+            self._entries.move_to_end(user_id)
+
+    def record_saved(self, record: UserRecord):
+        """UserRecord の差分を保存した後にキャッシュへ反映（サーバー側加算を含む場合は破棄）"""
+        if record.has_increments:
+            self.invalidate(record.user_id)
+        else:
+            saved = record.copy()
+            saved.mark_saved()
+            self.store(record.user_id, saved)
+
+    # =====================================
+    # 読み取り
+    # =====================================
+
+    def get(self, user_id: str) -> Optional[UserRecord]:
+        """
+        ユーザーデータを取得（キャッシュになければFirestoreから読み取り）
+        Returns:
+            Optional[UserRecord]: ユーザーデータのコピー（未登録ユーザーはNone）
+        """
+        user_id = str(user_id)
+        hit, record = self._lookup(user_id)
+        if not hit:
+            record = UserRecord.from_snapshot(self.db.collection("users").document(user_id).get())
+            self.store(user_id, record)
+        return record.copy() if record is not None else None
+
+    def get_many(self, user_ids: List[str]) -> Dict[str, Optional[UserRecord]]:
+        """複数ユーザーを取得（キャッシュにないユーザーのみ1回の一括取得で読み取り）"""
+        unique_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+        results = {}
+        missing = []
+        for user_id in unique_ids:
+            hit, record = self._lookup(user_id)
+            if hit:
+                results[user_id] = record
+            else:
+                missing.append(user_id)
+
+        if missing:
+            refs = [self.db.collection("users").document(user_id) for user_id in missing]
+            for user_doc in self.db.get_all(refs):
+                record = UserRecord.from_snapshot(user_doc)
+                self.store(user_doc.id, record)
+                results[user_doc.id] = record
+
+        return {user_id: results[user_id].copy() if results.get(user_id) is not None else None
+                for user_id in unique_ids}
+
+    async def fetch(self, user_id: str) -> Optional[UserRecord]:
+        """get の非同期版（キャッシュヒット時はスレッドを使わずに返す）"""
+        hit, record = self._lookup(str(user_id))
+        if hit:
+            return record.copy() if record is not None else None
+        return await run_db(self.get, user_id)
+
+    async def fetch_many(self, user_ids: List[str]) -> Dict[str, Optional[UserRecord]]:
+        """get_many の非同期版"""
+        return await run_db(self.get_many, user_ids)
+
+    # =====================================
+    # 型付きゲッター
+    # =====================================
+
+    async def get_balance(self, user_id: str) -> int:
+        return (await self.fetch(user_id) or UserRecord.new(user_id)).balance
+
+    async def get_level(self, user_id: str) -> int:
+        return (await self.fetch(user_id) or UserRecord.new(user_id)).level
+
+    async def get_titles(self, user_id: str) -> List[str]:
+        return list((await self.fetch(user_id) or UserRecord.new(user_id)).titles)
+
+    # =====================================
+    # 書き込みスルー
+    # =====================================
+
+    def write(self, user_id: str, fields: Dict[str, Any], merge: bool = True):
+        """Firestoreへ書き込み、キャッシュへ反映"""
+        user_id = str(user_id)
+        self.db.collection("users").document(user_id).set(fields, merge=merge)
+        self.record_write(user_id, fields, merge=merge)
+
+    async def update(self, user_id: str, fields: Dict[str, Any], merge: bool = True):
+        """write の非同期版"""
+        await run_db(self.write, user_id, fields, merge)
+
+    def save_record(self, record: UserRecord) -> bool:
+        """
+        UserRecord の変更差分だけを書き込み（変更がなければ書き込まない）
+        代入したフィールドは絶対値で書き込むため、キャッシュから読んだ値をもとに計算した値の保存には使わない
+        （TTLの間に他のBotが加算した値を上書きする。読み取りと書き込みはトランザクションか加算で行う）
+        """
+        if not record.dirty:
+            return False
+        self.db.collection("users").document(record.user_id).set(record.changes(), merge=True)
+        self.record_saved(record)
+        record.mark_saved()
+        return True
+
+    async def save(self, record: UserRecord) -> bool:
+        """save_record の非同期版"""
+        if not record.dirty:
+            return False
+        return await run_db(self.save_record, record)
+
+    def create_record(self, record: UserRecord) -> bool:
+        """
+        未登録ユーザーを既定値で作成（キャッシュ上は未登録でも既に存在する場合は書き込まない）
+        Returns:
+            bool: 作成した場合True、既に存在した場合False
+        """
+        try:
+            self.db.collection("users").document(record.user_id).create(record.changes())
+        except AlreadyExists:
+            return False
+        finally:
+            self.invalidate(record.user_id)
+        record.mark_saved()
+        return True
+
+    async def create(self, record: UserRecord) -> bool:
+        """create_record の非同期版"""
+        return await run_db(self.create_record, record)
+
+    # =====================================
+    # スナップショットリスナー
+    # =====================================
+
+    def _on_snapshot(self, docs, changes, read_time):
+        for change in changes:
+            user_id = change.document.id
+            with self._lock:
+                cached = user_id in self._entries
+            if not cached:
+                continue
+            if change.type.name == "REMOVED":
+                self.store(user_id, None)
+            else:
+                self.store(user_id, UserRecord.from_snapshot(change.document))
+
+    def start_listener(self) -> bool:
+        """
+        users コレクションの変更を監視し、キャッシュ済みユーザーを最新の内容に置き換える
+        （他のBotによる更新をTTLを待たずに反映。USER_CACHE_CONFIG["listener"] が有効な場合のみ）
+        Returns:
+            bool: リスナーを開始した（開始済みを含む）場合True
+        """
+        if not USER_CACHE_CONFIG["listener"]:
+            return False
+        if self._watch is None:
+            self._watch = self.db.collection("users").on_snapshot(self._on_snapshot)
+            logger.info("ユーザーキャッシュのスナップショットリスナーを開始しました")
+        return True
+
+    def stop_listener(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+
+# プロセス共通のキャッシュ
+user_cache = UserRecordCache()
@@ -0,0 +1,182 @@
+# shared/kraft_user_record.py - ユーザーデータ型
+# 責務: users/{id} の共通スキーマ・既定値・Firestore dictとの相互変換・変更差分の追跡
+
+import copy
+from typing import Optional, Dict, Any
+from firebase_admin import firestore
+
+# =====================================
+# スキーマ（全Bot共通の既定値）
+# =====================================
+
+USER_DEFAULTS = {
+    "user_id": "",
+    "username": None,
+    # 経済
+    "balance": 1000,                   # 初期残高
+    # レベル
+    "level": 1,
+    "xp": 0,
+    "total_xp": 0,
+    "daily_xp": 0,
+    "messages_count": 0,
+    "last_message_xp": None,
+    # 称号
+    "titles": ["偉大なる一歩"],
+    # コミュニティ
+    "donations_made": 0,
+    "donations_received": 0,
+    "quests_completed": 0,
+    # 称号判定用の行動データ
+    "monthly_activity": {},            # 月("YYYY-MM") -> {"messages": 発言数, "channels": [チャンネルID]}
+    "completed_quests": 0,
+    "consecutive_quest_failures": 0,
+    "donation_total": 0,
+    "transfer_total": 0,
+    "investment_profit": 0,
+    "became_zero_by_transfer": False,
+    "became_zero_by_investment": False,
+    "became_zero_by_donation": False,
+    "created_at": None
+}
+
+USER_FIELDS = tuple(USER_DEFAULTS)
+_FIELD_SET = frozenset(USER_FIELDS)
+_MUTABLE_DEFAULTS = frozenset(field for field, value in USER_DEFAULTS.items() if isinstance(value, (list, dict)))
+
+
+def _default(field: str):
+    value = USER_DEFAULTS[field]
+    return copy.copy(value) if field in _MUTABLE_DEFAULTS else value
+
+
+class UserRecord:
+    """
+    ユーザーデータ（スキーマ外のフィールドは extra に保持）
+    フィールドへの代入と increment() を記録し、changes() で書き込む差分だけを返す
+    """
+
+    __slots__ = USER_FIELDS + ("exists", "_extra", "_changed", "_increments")
+
+    def __init__(self, user_id: str):
+        for field in USER_FIELDS:
+            object.__setattr__(self, field, _default(field))
+        object.__setattr__(self, "user_id", str(user_id))
+        object.__setattr__(self, "exists", False)
+        object.__setattr__(self, "_extra", None)
+        object.__setattr__(self, "_changed", set())
+        object.__setattr__(self, "_increments", None)
+
+    def __setattr__(self, name: str, value):
+        if name in _FIELD_SET and getattr(self, name) != value:
+            self._changed.add(name)
+        object.__setattr__(self, name, value)
+
+    def __repr__(self):
+        return f"UserRecord({self.user_id!r}, level={self.level}, balance={self.balance})"
+
+    # =====================================
+    # 変換
+    # =====================================
+
+    @classmethod
+    def new(cls, user_id: str) -> "UserRecord":
+        """未登録ユーザー（保存時は既定値つきで作成される）"""
+        return cls(user_id)
+
+    @classmethod
+    def from_dict(cls, user_id: str, data: Dict[str, Any]) -> "UserRecord":
+        """Firestoreのドキュメントから作成"""
+        record = cls.__new__(cls)
+        for field in USER_FIELDS:
+            object.__setattr__(record, field, data[field] if field in data else _default(field))
+        object.__setattr__(record, "user_id", str(user_id))
+        object.__setattr__(record, "exists", True)
+        extra = {key: value for key, value in data.items() if key not in _FIELD_SET}
+        object.__setattr__(record, "_extra", extra or None)
+        object.__setattr__(record, "_changed", set())
+        object.__setattr__(record, "_increments", None)
+        return record
+
+    @classmethod
+    def from_snapshot(cls, user_doc) -> Optional["UserRecord"]:
+        """DocumentSnapshotから作成（ドキュメントが存在しない場合はNone）"""
+        if not user_doc.exists:
+            return None
+        return cls.from_dict(user_doc.id, user_doc.to_dict())
+
+    def to_dict(self) -> Dict[str, Any]:
+        """全フィールドをdictに変換"""
+        data = {field: getattr(self, field) for field in USER_FIELDS}
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def copy(self) -> "UserRecord":
+        record = UserRecord.__new__(UserRecord)
+        for field in USER_FIELDS:
+            value = getattr(self, field)
+            object.__setattr__(record, field, copy.copy(value) if isinstance(value, (list, dict)) else value)
+        object.__setattr__(record, "exists", self.exists)
+        object.__setattr__(record, "_extra", dict(self._extra) if self._extra else None)
+        object.__setattr__(record, "_changed", set(self._changed))
+        object.__setattr__(record, "_increments", dict(self._increments) if self._increments else None)
+        return record
+
+    def get(self, key: str, default=None):
+        """dict互換の参照（スキーマ外のフィールドも参照可能）"""
+        if key in _FIELD_SET:
+            return getattr(self, key)
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        return default
+
+    # =====================================
+    # 変更追跡
+    # =====================================
+
+    def increment(self, field: str, amount):
+        """数値フィールドをサーバー側でアトミックに加算（ローカル値も更新）"""
+        object.__setattr__(self, field, getattr(self, field) + amount)
+        if self._increments is None:
+            object.__setattr__(self, "_increments", {})
+        self._increments[field] = self._increments.get(field, 0) + amount
+
+    @property
+    def dirty(self) -> bool:
+        return not self.exists or bool(self._changed) or bool(self._increments)
+
+    @property
+    def has_increments(self) -> bool:
+        return bool(self._increments)
+
+    def changes(self) -> Dict[str, Any]:
+        """
+        書き込む差分（set(merge=True) / update 用）
+        未登録ユーザーは全フィールドを返す（加算もローカル値で確定）
+        """
+        if not self.exists:
+            data = {field: value for field, value in self.to_dict().items() if value is not None}
+            data["created_at"] = self.created_at or firestore.SERVER_TIMESTAMP
+            return data
+
+        data = {field: getattr(self, field) for field in self._changed}
+        for field, amount in (self._increments or {}).items():
+            data[field] = firestore.Increment(amount)
+        return data
+
+    def mark_saved(self):
+        """差分を書き込んだ後に呼び出す"""
+        object.__setattr__(self, "exists", True)
+        self._changed.clear()
+        object.__setattr__(self, "_increments", None)
+
+    def apply(self, fields: Dict[str, Any]):
+        """コミット済みの書き込み内容を反映（変更としては記録しない）"""
+        for key, value in fields.items():
+            if key in _FIELD_SET:
+                object.__setattr__(self, key, value)
+            else:
+                if self._extra is None:
+                    object.__setattr__(self, "_extra", {})
+                self._extra[key] = value